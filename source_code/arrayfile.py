@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script reads and writes a compact binary file of named numpy arrays. The file starts with a small json header
+which describes the arrays, followed by the raw array data aligned to 64 bytes, so the arrays can be memory-mapped
+directly from the file without any parsing or copying.
+
+"""
+
+__author__ = 'vivek'
+
+import os
+import json
+import mmap
+import struct
+import numpy as np
+
+MAGIC = b'NRSA'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+
+def pad_length(length):
+
+    return (ALIGNMENT - length % ALIGNMENT) % ALIGNMENT
+
+
+def write_arrays(path, arrays, meta=None):
+    """
+    Write the arrays into the file. The file is written next to the target and renamed, so readers never see a
+    partially written file.
+    :param path: path of the file
+    :param arrays: dict of (name, numpy array)
+    :param meta: json serializable dict stored in the header
+    """
+
+    names = sorted(arrays.keys())
+    # np.ascontiguousarray would turn a 0-d array into a 1-d one.
+    arrays = dict((name, np.require(arrays[name], requirements='C')) for name in names)
+
+    specs = list()
+    offset = 0
+
+    for name in names:
+        array = arrays[name]
+        specs.append({'name': name, 'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset})
+        offset += array.nbytes + pad_length(array.nbytes)
+
+    header = json.dumps({'meta': meta or dict(), 'arrays': specs}, sort_keys=True).encode('utf-8')
+    prefix_length = len(MAGIC) + struct.calcsize('<IQ') + len(header)
+    data_start = prefix_length + pad_length(prefix_length)
+
+    tmp_path = path + '.tmp'
+
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<IQ', FORMAT_VERSION, len(header)))
+        f.write(header)
+        f.write(b'\0' * (data_start - prefix_length))
+
+        for name in names:
+            array = arrays[name]
+            f.write(array.tobytes())
+            f.write(b'\0' * pad_length(array.nbytes))
+
+    if os.name == 'nt' and os.path.exists(path):
+        os.remove(path)
+    os.rename(tmp_path, path)
+
+
+def read_arrays(path, use_mmap=True):
+    """
+    Read the arrays from the file.
+    :param path: path of the file
+    :param use_mmap: memory-map the file instead of reading it. The arrays are read only in both cases.
+    :return: meta dict, and dict of (name, numpy array)
+    """
+
+    with open(path, 'rb') as f:
+        if use_mmap and os.path.getsize(path) > 0:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            buf = f.read()
+
+    if buf[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not an array file: " + path)
+
+    version, header_length = struct.unpack('<IQ', buf[len(MAGIC):len(MAGIC) + struct.calcsize('<IQ')])
+
+    if version != FORMAT_VERSION:
+        raise ValueError("Unsupported array file version {}: {}".format(version, path))
+
+    header_start = len(MAGIC) + struct.calcsize('<IQ')
+    header = json.loads(buf[header_start:header_start + header_length].decode('utf-8'))
+    prefix_length = header_start + header_length
+    data_start = prefix_length + pad_length(prefix_length)
+
+    arrays = dict()
+
+    for spec in header['arrays']:
+        dtype = np.dtype(str(spec['dtype']))
+        shape = tuple(spec['shape'])
+        count = int(np.prod(shape)) if shape else 1
+        array = np.frombuffer(buf, dtype=dtype, count=count, offset=data_start + spec['offset'])
+        arrays[str(spec['name'])] = array.reshape(shape)
+
+    return header['meta'], arrays
+
+
+def pack_strings(strings):
+    """
+    Pack the strings into a single utf-8 byte array.
+    :param strings: list of strings
+    :return: offsets array of length n + 1, and bytes array
+    """
+
+    encoded = [s.encode('utf-8') if not isinstance(s, bytes) else s for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(s) for s in encoded]) if encoded else 0
+
+    return offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+
+def unpack_strings(offsets, blob):
+    """
+    Inverse of pack_strings.
+    :return: list of native strings
+    """
+
+    data = blob.tobytes()
+    strings = list()
+
+    for i in range(len(offsets) - 1):
+        s = data[offsets[i]:offsets[i + 1]]
+        strings.append(s if str is bytes else s.decode('utf-8'))
+
+    return strings
@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script implements a packed store of the article texts, so the documents do not have to keep the text of every
+article in memory only to display one now and then. The raw bytes of all the articles are appended one after the other
+to a single data file, and an offset index (an array file, see arrayfile.py) maps the id of every article, e.g.
+'tech/001.txt', to its span in the data file. The data file is memory-mapped, so fetching the title or the text of an
+article by its id only reads the pages of that article, and the operating system, not the python heap, caches them.
+
+New articles are appended to the end of the data file, and the index is written again when the store is saved. The
+index keeps the sha1 digest of every article, and an article whose content changed is appended again, its id then
+refers to the new copy and the old bytes stay unused in the data file. Bytes after the last indexed article, e.g. of a
+run which stopped before it saved the index, are overwritten by the next append.
+
+"""
+
+__author__ = 'vivek'
+
+import os
+import io
+import mmap
+import hashlib
+import numpy as np
+from arrayfile import read_arrays, write_arrays, pack_strings, unpack_strings
+from document import decode_lines
+
+STORE_VERSION = 1
+
+
+class ArticleStore(object):
+
+    def __init__(self, path):
+        """
+        Open the store, or create an empty one if the data file does not exist.
+        :param path: path of the data file, the index is the file path + '.index'
+        """
+
+        self.path = path
+        self.index_path = path + '.index'
+
+        # stores (article id, article number)
+        self.rows = dict()
+        self.ids = list()
+        # (start, end) in the data file and sha1 digests of the stored articles, and of the articles added in this run.
+        self.spans = np.zeros((0, 2), dtype=np.int64)
+        self.digests = np.zeros((0, 20), dtype=np.uint8)
+        self.new_spans = list()
+        self.new_digests = list()
+        # end of the last appended article, where the next one is appended.
+        self.size = 0
+        # set when articles were added or updated since the index was saved.
+        self.changed = False
+
+        self.buf = None
+        self.writer = None
+
+        if os.path.exists(self.index_path) and os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+
+        return len(self.ids)
+
+    def __contains__(self, a_id):
+
+        return a_id in self.rows
+
+    def load(self):
+
+        meta, arrays = read_arrays(self.index_path)
+
+        if meta.get('version') != STORE_VERSION:
+            raise ValueError("Unsupported article store version {}: {}".format(meta.get('version'), self.index_path))
+
+        self.ids = unpack_strings(arrays['id_offsets'], arrays['id_blob'])
+        self.rows = dict((self.ids[i], i) for i in range(len(self.ids)))
+        self.spans = arrays['spans']
+        # an updated article is appended after the others, so the last row is not always the last article.
+        self.size = int(self.spans[:, 1].max()) if len(self.spans) else 0
+
+        if os.path.getsize(self.path) < self.size:
+            raise ValueError("The article store is shorter than its index: " + self.path)
+
+        self.digests = arrays['digests']
+
+    def span(self, row):
+
+        stored = len(self.spans)
+
+        if row >= stored:
+            return self.new_spans[row - stored]
+
+        start, end = self.spans[row]
+
+        return int(start), int(end)
+
+    def digest(self, row):
+
+        stored = len(self.digests)
+
+        if row >= stored:
+            return self.new_digests[row - stored]
+
+        return bytes(bytearray(self.digests[row]))
+
+    def update(self, row, span, digest):
+        """
+        Point the row at the new copy of its article.
+        """
+
+        stored = len(self.spans)
+
+        if row >= stored:
+            self.new_spans[row - stored] = span
+            self.new_digests[row - stored] = digest
+            return
+
+        # the arrays of a loaded index are memory-mapped read-only.
+        if not self.spans.flags.writeable:
+            self.spans, self.digests = np.array(self.spans), np.array(self.digests)
+
+        self.spans[row] = span
+        self.digests[row] = np.frombuffer(digest, dtype=np.uint8)
+
+    def append(self, a_id, data):
+        """
+        Append an article to the data file, unless it is stored with the same content. The article can be read at once,
+        but it is in the index only after save().
+        :param a_id: id of the article, e.g. 'tech/001.txt'
+        :param data: raw bytes of the article
+        :return: True if the article was added or its content changed, False if it is stored with the same content.
+        """
+
+        digest = hashlib.sha1(data).digest()
+        row = self.rows.get(a_id)
+
+        if row is not None and self.digest(row) == digest:
+            return False
+
+        if self.writer is None:
+            self.writer = io.open(self.path, 'ab')
+            # drop the bytes after the last indexed article.
+            self.writer.truncate(self.size)
+
+        self.writer.write(data)
+        span = (self.size, self.size + len(data))
+
+        if row is None:
+            self.rows[a_id] = len(self.ids)
+            self.ids.append(a_id)
+            self.new_spans.append(span)
+            self.new_digests.append(digest)
+        else:
+            self.update(row, span, digest)
+
+        self.size += len(data)
+        self.changed = True
+
+        return True
+
+    def add_articles(self, articles):
+        """
+        :param articles: iterable of (id, raw bytes) of articles, e.g. corpus.iter_articles
+        :return: number of added or updated articles
+        """
+
+        added = 0
+
+        for a_id, data in articles:
+            added += self.append(a_id, data)
+
+        return added
+
+    def save(self):
+        """
+        Flush the appended articles and write the index, if any article was added or updated.
+        """
+
+        if not self.changed:
+            return
+
+        if self.writer is not None:
+            self.writer.flush()
+
+        id_offsets, id_blob = pack_strings(self.ids)
+        spans = np.concatenate([self.spans, np.array(self.new_spans, dtype=np.int64).reshape(-1, 2)])
+        digests = np.concatenate([self.digests, np.array([bytearray(digest) for digest in self.new_digests],
+                                                         dtype=np.uint8).reshape(-1, 20)])
+
+        arrays = {'spans': spans, 'digests': digests, 'id_offsets': id_offsets, 'id_blob': id_blob}
+        write_arrays(self.index_path, arrays, {'version': STORE_VERSION})
+
+        self.spans, self.digests = spans, digests
+        self.new_spans, self.new_digests = list(), list()
+        self.changed = False
+
+    def close(self):
+
+        self.save()
+
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+        if self.buf is not None:
+            self.buf.close()
+            self.buf = None
+
+    def buffer(self, end):
+        """
+        :return: memory map of the data file which covers the bytes up to end. The file is mapped again when articles
+        were appended after it was mapped.
+        """
+
+        if self.buf is None or len(self.buf) < end:
+            if self.writer is not None:
+                self.writer.flush()
+
+            if self.buf is not None:
+                self.buf.close()
+
+            with open(self.path, 'rb') as f:
+                self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        return self.buf
+
+    def read(self, a_id):
+        """
+        :return: raw bytes of the article
+        """
+
+        start, end = self.span(self.rows[a_id])
+
+        if start == end:
+            return b''
+
+        return self.buffer(end)[start:end]
+
+    def content(self, a_id):
+        """
+        :return: lines of the article, the same lines document.read_lines reads from its file.
+        """
+
+        return decode_lines(self.read(a_id))
+
+    def title(self, a_id):
+        """
+        :return: first line of the article. Only the bytes up to the first line break are read.
+        """
+
+        start, end = self.span(self.rows[a_id])
+
+        if start == end:
+            return ''
+
+        buf = self.buffer(end)
+        title_end = buf.find(b'\n', start, end)
+
+        return decode_lines(buf[start:title_end + 1 if title_end >= 0 else end])[0]
+
+    def text(self, a_id):
+        """
+        :return: body of the article, its lines after the title joined like Document.text.
+        """
+
+        return ' '.join(self.content(a_id)[1:])
@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script benchmarks every stage of the system separately: reading the articles, document construction, the
+tfidf/tfidfie index, training and classification of each classifier, the latency of the knn search and of the
+recommendations, and the recall of the approximate knn searches. It runs on the BBC corpus and on synthetic corpora
+scaled up from it, and writes the results as JSON, so that runs of different versions and machines can be compared.
+
+A synthetic corpus of scale s has s articles for every article of the corpus. Each copy keeps the topic and mixes the
+paragraphs of the article with random paragraphs of other articles of the same topic, so the vocabulary and the term
+statistics of the topics stay realistic.
+
+"""
+
+__author__ = 'vivek'
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import numpy as np
+from corpus import list_corpus
+from document import Document, CompactDocument, TokenPipeline, read_lines
+from tfidf import Index, SparseIndex
+from classifiers import create_classifiers
+from knn import KNN
+from lsh import LSHIndex, recall_at_k
+from recommender import Recommender
+from util import init_confusion_matrix, update_confusion_matrix, cal_stats
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def peak_memory():
+    """
+    :return: peak resident memory of the process in MB, None if it is not available on the platform.
+    """
+
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # linux reports KB, mac os bytes.
+    return peak / 1024.0 / 1024.0 if sys.platform == 'darwin' else peak / 1024.0
+
+
+def percentiles(values):
+    """
+    :return: dict of the mean, the 50th, 90th and 99th percentiles and the maximum of the values, in milliseconds
+    """
+
+    if not values:
+        return dict()
+
+    values = np.array(values) * 1000.0
+
+    return {
+        'count': len(values),
+        'mean': float(values.mean()),
+        'p50': float(np.percentile(values, 50)),
+        'p90': float(np.percentile(values, 90)),
+        'p99': float(np.percentile(values, 99)),
+        'max': float(values.max())
+    }
+
+
+def read_articles(t_path):
+    """
+    :return: list of topics, and list of (file path, topic, lines) of all the articles
+    """
+
+    topic_list, file_list = list_corpus(t_path)
+
+    return topic_list, [(f_path, topic, read_lines(f_path)) for f_path, topic in file_list]
+
+
+def scale_articles(articles, scale, seed=0):
+    """
+    Create the synthetic corpus of the given scale.
+    :param articles: list of (file path, topic, lines)
+    :param scale: number of articles per original article, 1 returns the articles
+    :param seed: seed of the random paragraphs
+    :return: list of (file path, topic, lines). The file paths of the copies do not exist.
+    """
+
+    if scale <= 1:
+        return list(articles)
+
+    rand = random.Random(seed)
+
+    # pool of the paragraphs of every topic.
+    paragraphs = dict()
+    for f_path, topic, lines in articles:
+        paragraphs.setdefault(topic, []).extend(line for line in lines[1:] if line.strip())
+
+    scaled = list()
+
+    for f_path, topic, lines in articles:
+        scaled.append((f_path, topic, lines))
+        name, ext = os.path.splitext(f_path)
+
+        for j in range(1, scale):
+            body = [line if not line.strip() or rand.random() < 0.5 else rand.choice(paragraphs[topic])
+                    for line in lines[1:]]
+            scaled.append(("{}-{}{}".format(name, j, ext), topic, lines[:1] + body))
+
+    return scaled
+
+
+def split_docs(docs, test_fraction=0.1, seed=0):
+    """
+    :return: train docs and test docs, the last test_fraction of the docs of every topic after a shuffle.
+    """
+
+    rand = random.Random(seed)
+    topic_docs = dict()
+    for doc in docs:
+        topic_docs.setdefault(doc.topic, []).append(doc)
+
+    train_docs, test_docs = list(), list()
+
+    for topic in sorted(topic_docs.keys()):
+        value = topic_docs[topic]
+        rand.shuffle(value)
+        test_len = max(int(len(value) * test_fraction), 1)
+        train_docs += value[:-test_len]
+        test_docs += value[-test_len:]
+
+    return train_docs, test_docs
+
+
+def approximate_recall(factory, topic_docs, knn_dict, query_docs, k):
+    """
+    Measure an approximate nearest neighbour search against the exact KNN of every topic.
+    :param factory: function which creates the index of a list of docs
+    :return: dict of the build time of the indexes, and the means of lsh.recall_at_k over the queries
+    """
+
+    start_time = time.time()
+    indexes = dict((topic, factory(docs)) for topic, docs in topic_docs.items())
+    result = {'build_time': time.time() - start_time}
+
+    totals = dict()
+
+    for topic in sorted(indexes.keys()):
+        targets = [doc for doc in query_docs if doc.topic == topic]
+
+        if targets:
+            for key, value in recall_at_k(indexes[topic], targets, k, knn_dict[topic]).items():
+                totals[key] = totals.get(key, 0.0) + value * len(targets)
+
+    for key, value in totals.items():
+        result[key] = value / len(query_docs)
+
+    return result
+
+
+def run(articles, topic_list, scale, index_backend='dict', kmeans_backend='loop', normalize='lemmatize', compact=False,
+        workers=1, queries=200, k=5, seed=0, max_terms=20, max_postings=100, lsh_tables=16, lsh_bits=6, lsh_probes=2):
+    """
+    Benchmark all the stages on one corpus.
+    :return: dict of the results
+    """
+
+    stages = dict()
+    result = {'scale': scale, 'stages': stages}
+
+    start_time = time.time()
+    articles = scale_articles(articles, scale, seed)
+    stages['scale'] = time.time() - start_time
+
+    pipeline = TokenPipeline(normalize)
+    doc_class = CompactDocument if compact else Document
+
+    start_time = time.time()
+    docs = [doc_class(f_path, topic, None, pipeline, content=lines) for f_path, topic, lines in articles]
+    stages['documents'] = time.time() - start_time
+
+    result['docs'] = len(docs)
+    result['tokens'] = sum(len(doc.text_tokens) + len(doc.title_tokens) for doc in docs)
+
+    train_docs, test_docs = split_docs(docs, seed=seed)
+    result['train_docs'], result['test_docs'] = len(train_docs), len(test_docs)
+
+    start_time = time.time()
+    index = SparseIndex(train_docs) if index_backend == 'csr' else Index(train_docs)
+    stages['index'] = time.time() - start_time
+
+    for doc in train_docs:
+        doc.vector = doc.tfidfie
+
+    for doc in test_docs:
+        doc.vector = doc.tf
+
+    test_topics = [doc.topic for doc in test_docs]
+    classifiers = dict()
+    classifier_list = create_classifiers(topic_list, kmeans_backend, workers=workers)
+
+    for classifier in classifier_list:
+        timings = dict()
+
+        start_time = time.time()
+        classifier.train(train_docs)
+        timings['train'] = time.time() - start_time
+
+        start_time = time.time()
+        predictions = classifier.classify(test_docs)
+        timings['classify'] = time.time() - start_time
+        timings['classify_per_doc'] = timings['classify'] / len(test_docs)
+
+        confusion_matrix, c_dict = init_confusion_matrix(topic_list)
+        confusion_matrix = update_confusion_matrix(test_topics, predictions, confusion_matrix, c_dict)
+        classifier.stats = cal_stats(confusion_matrix)
+        timings['f_measure'] = classifier.stats['f_measure']
+
+        classifiers[type(classifier).__name__] = timings
+
+    result['classifiers'] = classifiers
+
+    topic_docs = dict()
+    for doc in docs:
+        topic_docs.setdefault(doc.topic, []).append(doc)
+
+    start_time = time.time()
+    knn_dict = dict((topic, KNN(topic_docs[topic])) for topic in topic_list)
+    stages['knn_index'] = time.time() - start_time
+
+    query_docs = random.Random(seed).sample(test_docs, min(queries, len(test_docs)))
+
+    latencies = list()
+    for doc in query_docs:
+        start_time = time.time()
+        knn_dict[doc.topic].find_k_neighbours(doc, k)
+        latencies.append(time.time() - start_time)
+
+    result['knn_latency'] = percentiles(latencies)
+
+    approximate = {
+        'pruned': lambda docs: KNN(docs, max_terms=max_terms, max_postings=max_postings),
+        'lsh': lambda docs: LSHIndex(docs, n_tables=lsh_tables, n_bits=lsh_bits, probes=lsh_probes, seed=seed)
+    }
+
+    result['approximate_knn'] = dict((name, approximate_recall(factory, topic_docs, knn_dict, query_docs, k))
+                                     for name, factory in approximate.items())
+
+    start_time = time.time()
+    recommender = Recommender(topic_docs, classifier_list, pipeline)
+    stages['recommender'] = time.time() - start_time
+
+    latencies = list()
+    for doc in query_docs:
+        start_time = time.time()
+        recommender.recommend(doc, k)
+        latencies.append(time.time() - start_time)
+
+    result['recommend_latency'] = percentiles(latencies)
+
+    start_time = time.time()
+    recommender.recommend_batch(query_docs, k)
+    stages['recommend_batch'] = time.time() - start_time
+
+    result['peak_memory_mb'] = peak_memory()
+
+    return result
+
+
+def main(t_path="../dataset/bbc/", scales=(1, 10), output=None, **options):
+
+    start_time = time.time()
+    topic_list, articles = read_articles(t_path)
+    read_time = time.time() - start_time
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'options': dict(options, corpus=t_path, scales=list(scales)),
+        'read_time': read_time,
+        'runs': []
+    }
+
+    for scale in scales:
+        print("Benchmarking scale {}...".format(scale))
+        report['runs'].append(run(articles, topic_list, scale, **options))
+
+    data = json.dumps(report, indent=2, sort_keys=True)
+
+    if output:
+        with open(output, 'w') as f:
+            f.write(data)
+    else:
+        print(data)
+
+    return report
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Benchmark of the news recommendation system.")
+    parser.add_argument('--corpus', default="../dataset/bbc/",
+                        help="path of the corpus directory.")
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10],
+                        help="scales of the synthetic corpora, 1 is the corpus itself.")
+    parser.add_argument('--output', default=None,
+                        help="file of the JSON results, printed if not given.")
+    parser.add_argument('--index', dest='index_backend', choices=['dict', 'csr'], default='dict',
+                        help="backend of the tfidf/tfidfie index.")
+    parser.add_argument('--kmeans', dest='kmeans_backend', choices=['loop', 'sparse', 'minibatch'], default='loop',
+                        help="k-means implementation.")
+    parser.add_argument('--normalize', choices=TokenPipeline.modes, default='lemmatize',
+                        help="token normalization.")
+    parser.add_argument('--compact', action='store_true',
+                        help="use the memory lean documents, recommended for the large scales.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of processes of the rank classifier and the mini-batch k-means.")
+    parser.add_argument('--queries', type=int, default=200,
+                        help="number of test docs used to measure the search latencies.")
+    parser.add_argument('--k', type=int, default=5,
+                        help="number of neighbours searched.")
+    parser.add_argument('--max-terms', type=int, default=20,
+                        help="number of target terms scored by the pruned knn search.")
+    parser.add_argument('--max-postings', type=int, default=100,
+                        help="number of postings kept per term by the pruned knn search.")
+    parser.add_argument('--lsh-tables', type=int, default=16,
+                        help="number of lsh hash tables.")
+    parser.add_argument('--lsh-bits', type=int, default=6,
+                        help="number of hyperplanes of a lsh hash table.")
+    parser.add_argument('--lsh-probes', type=int, default=2,
+                        help="number of neighbouring lsh buckets searched per table.")
+    parser.add_argument('--seed', type=int, default=0,
+                        help="seed of the synthetic corpora, the split and the queries.")
+    args = parser.parse_args()
+
+    main(args.corpus, args.scales, args.output, index_backend=args.index_backend, kmeans_backend=args.kmeans_backend,
+         normalize=args.normalize, compact=args.compact, workers=args.workers, queries=args.queries, k=args.k,
+         seed=args.seed, max_terms=args.max_terms, max_postings=args.max_postings, lsh_tables=args.lsh_tables,
+         lsh_bits=args.lsh_bits, lsh_probes=args.lsh_probes)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script implements a bounded cache with least recently used eviction, and optional expiry of the entries after a
+time to live.
+
+"""
+
+__author__ = 'vivek'
+
+import time
+from collections import OrderedDict
+
+
+class LRUCache(object):
+
+    def __init__(self, maxsize=1024, ttl=None, clock=time.time):
+        """
+        :param maxsize: maximum number of entries
+        :param ttl: seconds an entry stays valid after it was put, None keeps the entries until they are evicted.
+        :param clock: function which returns the current time in seconds
+        """
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        # stores (key, value), or (key, (expiry time, value)) when a ttl is set.
+        self.data = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+
+        return len(self.data)
+
+    def __contains__(self, key):
+
+        if self.ttl is not None and key in self.data:
+            return self.data[key][0] > self.clock()
+
+        return key in self.data
+
+    def get(self, key, default=None):
+        """
+        :return: cached value of the key, or default. A found key becomes the most recently used one.
+        """
+
+        try:
+            value = self.data.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+
+        if self.ttl is not None and value[0] <= self.clock():
+            self.expirations += 1
+            self.misses += 1
+            return default
+
+        self.data[key] = value
+        self.hits += 1
+
+        return value[1] if self.ttl is not None else value
+
+    def put(self, key, value):
+        """
+        Cache the value, evicting the least recently used key if the cache is full.
+        """
+
+        if self.ttl is not None:
+            value = (self.clock() + self.ttl, value)
+
+        self.data.pop(key, None)
+        self.data[key] = value
+
+        if len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+
+        self.data.clear()
+
+    def stats(self):
+        """
+        :return: dict of the size and the counters of the cache
+        """
+
+        lookups = self.hits + self.misses
+
+        return {
+            'size': len(self.data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_rate': float(self.hits) / lookups if lookups else 0.0
+        }
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script creates the classifiers of the system, so that the main script, the benchmark and the cross-validation
+all train and compare the same models, in the same order, with the same options.
+
+"""
+
+__author__ = 'vivek'
+
+from nb import NaiveBayes
+from rank_classifier import RankClassifier
+from kmeans import KMeans, SparseKMeans, MiniBatchKMeans
+
+
+def create_classifiers(topic_list, kmeans_backend='loop', hasher=None, workers=1):
+    """
+    Create untrained instances of all the classifiers.
+    :param topic_list: list of topics, the clusters of k-means
+    :param kmeans_backend: k-means implementation, 'loop', 'sparse' or 'minibatch'
+    :param hasher: FeatureHasher of the token pipeline, None if the terms are not hashed
+    :param workers: number of processes of the rank classifier and the mini-batch k-means
+    :return: list of the rank classifier, naive bayes and k-means
+    """
+
+    if kmeans_backend == 'sparse':
+        kmeans = SparseKMeans(topic_list)
+    elif kmeans_backend == 'minibatch':
+        kmeans = MiniBatchKMeans(topic_list, workers=workers)
+    else:
+        kmeans = KMeans(topic_list)
+
+    return [RankClassifier(workers, hasher), NaiveBayes(hasher), kmeans]
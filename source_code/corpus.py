@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script reads the corpus, which is a directory with one subdirectory of articles per topic, into document objects.
+Documents can be tokenized in parallel by a pool of worker processes. The corpus can also be streamed one document at a
+time, from the directory or directly from a zip archive of it (e.g. data_set/bbc.zip), so that it does not have to fit
+into memory. The raw articles can be added to an article store (see article_store.py), and the documents of the stored
+articles read their text from the store instead of keeping it in memory.
+
+"""
+
+__author__ = 'vivek'
+
+import os
+import zipfile
+from multiprocessing import Pool
+from collections import defaultdict
+from document import Document, CompactDocument, TokenPipeline, decode_lines, article_id
+
+
+def list_corpus(t_path):
+    """
+    List the articles of the corpus in a deterministic order.
+    :param t_path: path of the corpus directory
+    :return: list of topics, and list of (file path, topic) pairs
+    """
+
+    topic_list = sorted(os.listdir(t_path))
+    file_list = list()
+
+    for topic in topic_list:
+        d_path = os.path.join(t_path, topic)
+
+        for f in sorted(os.listdir(d_path)):
+            file_list.append((os.path.join(d_path, f), topic))
+
+    return topic_list, file_list
+
+
+def init_worker(mode, cache_size):
+    """
+    Create the token pipeline of a worker process.
+    """
+
+    Document.pipeline = TokenPipeline(mode, cache_size)
+
+
+def tokenize_file(f_path):
+    """
+    Tokenize one article. This runs in the worker processes.
+    :param f_path: path of the article
+    :return: title tokens and text tokens, each joined into a single string to keep the payload small.
+    """
+
+    doc = Document(f_path)
+
+    return ' '.join(doc.title_tokens), ' '.join(doc.text_tokens)
+
+
+def read_file(f_path):
+
+    with open(f_path, 'rb') as f:
+        return f.read()
+
+
+def list_zip(archive):
+    """
+    List the articles of a zip archive of the corpus in a deterministic order. The topic of an article is the name of
+    its directory.
+    :param archive: ZipFile
+    :return: list of topics, and list of (member name, topic) pairs
+    """
+
+    file_list = list()
+
+    for name in archive.namelist():
+        parts = name.split('/')
+
+        if len(parts) >= 2 and parts[-1] and not parts[-1].startswith('.'):
+            file_list.append((parts[-2], name))
+
+    file_list.sort()
+
+    return sorted(set(topic for topic, name in file_list)), [(name, topic) for topic, name in file_list]
+
+
+def list_topics(t_path):
+    """
+    :return: sorted list of the topics of a corpus directory or of a zip archive of it
+    """
+
+    if not zipfile.is_zipfile(t_path):
+        return sorted(os.listdir(t_path))
+
+    archive = zipfile.ZipFile(t_path)
+
+    try:
+        return list_zip(archive)[0]
+    finally:
+        archive.close()
+
+
+def iter_articles(t_path):
+    """
+    Stream the raw articles of a corpus directory or of a zip archive of it, in the order of list_corpus or list_zip.
+    :return: generator of (article id, raw bytes), e.g. to fill an ArticleStore
+    """
+
+    if not zipfile.is_zipfile(t_path):
+        for f_path, topic in list_corpus(t_path)[1]:
+            yield article_id(topic, f_path), read_file(f_path)
+
+        return
+
+    archive = zipfile.ZipFile(t_path)
+
+    try:
+        for name, topic in list_zip(archive)[1]:
+            yield article_id(topic, name), archive.read(name)
+    finally:
+        archive.close()
+
+
+def create_document(f_path, topic, data, pipeline=None, cache=None, compact=False, store=None):
+    """
+    Create the document of an article from its raw bytes.
+    :param cache: TokenCache of already tokenized articles, updated with the article if it is not cached.
+    :param store: ArticleStore the document reads its text from, if the article is stored.
+    """
+
+    tokens = cache.get(data) if cache is not None else None
+    doc_class = CompactDocument if compact else Document
+
+    doc = doc_class(f_path, topic, tokens, pipeline, content=decode_lines(data), store=store)
+
+    if cache is not None and tokens is None:
+        cache.put(data, doc.title_tokens, doc.text_tokens)
+
+    return doc
+
+
+def iter_directory(t_path, pipeline=None, cache=None, compact=False, store=None):
+    """
+    Stream the documents of a corpus directory, in the order of list_corpus. Only one document is read at a time.
+    :param t_path: path of the corpus directory
+    :param pipeline: TokenPipeline of the documents, Document.pipeline by default
+    :param cache: TokenCache of already tokenized articles, saved once the stream is consumed.
+    :param compact: create CompactDocument objects instead of Document objects
+    :param store: ArticleStore of the articles
+    :return: generator of documents
+    """
+
+    topic_list, file_list = list_corpus(t_path)
+
+    for f_path, topic in file_list:
+        yield create_document(f_path, topic, read_file(f_path), pipeline, cache, compact, store)
+
+    if cache is not None:
+        cache.save()
+
+
+def iter_zip(z_path, pipeline=None, cache=None, compact=False, store=None):
+    """
+    Stream the documents of a zip archive of the corpus without extracting it. The path of a document is the path of
+    its member inside the archive, e.g. bbc.zip/bbc/tech/001.txt, so the text of a CompactDocument can not be read
+    from it again, unless the article is in the store.
+    :param z_path: path of the zip archive
+    :return: generator of documents
+    """
+
+    archive = zipfile.ZipFile(z_path)
+
+    try:
+        topic_list, file_list = list_zip(archive)
+
+        for name, topic in file_list:
+            yield create_document(os.path.join(z_path, name), topic, archive.read(name), pipeline, cache, compact,
+                                  store)
+    finally:
+        archive.close()
+
+    if cache is not None:
+        cache.save()
+
+
+def iter_corpus(t_path, pipeline=None, cache=None, compact=False, store=None):
+    """
+    Stream the documents of a corpus directory or of a zip archive of it.
+    """
+
+    if zipfile.is_zipfile(t_path):
+        return iter_zip(t_path, pipeline, cache, compact, store)
+
+    return iter_directory(t_path, pipeline, cache, compact, store)
+
+
+def read_corpus(t_path, workers=1, chunk_size=16, cache=None, pipeline=None, compact=False, store=None):
+    """
+    Read all the articles of the corpus.
+    :param t_path: path of the corpus directory, or of a zip archive of it, which is read serially.
+    :param workers: number of worker processes used to tokenize the articles. 1 reads them serially.
+    :param chunk_size: number of articles sent to a worker at once
+    :param cache: TokenCache of already tokenized articles, updated with the newly tokenized ones
+    :param pipeline: TokenPipeline of the documents, Document.pipeline by default
+    :param compact: create memory lean CompactDocument objects instead of Document objects
+    :param store: ArticleStore of the articles. The documents of the stored articles read their text from the store.
+    :return: dict of (topic, list of documents), and list of topics
+    """
+
+    if pipeline is None:
+        pipeline = Document.pipeline
+
+    all_docs = defaultdict(lambda: list())
+
+    if zipfile.is_zipfile(t_path):
+        for doc in iter_zip(t_path, pipeline, cache, compact, store):
+            all_docs[doc.topic].append(doc)
+
+        return all_docs, sorted(all_docs.keys())
+
+    topic_list, file_list = list_corpus(t_path)
+    doc_class = CompactDocument if compact else Document
+
+    tokens = [None] * len(file_list)
+    raw = [None] * len(file_list)
+
+    if cache is not None:
+        for i in range(len(file_list)):
+            raw[i] = read_file(file_list[i][0])
+            tokens[i] = cache.get(raw[i])
+
+    missing = [i for i in range(len(file_list)) if tokens[i] is None]
+    missing_set = set(missing)
+
+    if workers > 1 and missing:
+        pool = Pool(workers, init_worker, (pipeline.mode, pipeline.cache_size))
+
+        try:
+            # imap returns the results in the order of the files, so the corpus is the same for every run.
+            payloads = pool.imap(tokenize_file, [file_list[i][0] for i in missing], chunk_size)
+
+            for i, (title_tokens, text_tokens) in zip(missing, payloads):
+                tokens[i] = (title_tokens.split(), text_tokens.split())
+        finally:
+            pool.close()
+            pool.join()
+
+    for i in range(len(file_list)):
+        f_path, topic = file_list[i]
+        doc = doc_class(f_path, topic, tokens[i], pipeline, store=store)
+        all_docs[topic].append(doc)
+
+        if cache is not None and i in missing_set:
+            cache.put(raw[i], doc.title_tokens, doc.text_tokens)
+
+    if cache is not None:
+        cache.save()
+
+    return all_docs, topic_list
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script evaluates the classifiers with k-fold cross-validation. The docs of every topic are shuffled and dealt into
+k folds, and every fold is the test set of one run, which indexes the other k - 1 folds and trains and tests all the
+classifiers on them. The folds run concurrently in a pool of forked processes. The tokenized docs are put into a module
+global before the pool is created, so the workers share them copy-on-write instead of receiving a pickled copy per
+task, and only the fold number goes to a worker and only the confusion matrices come back.
+
+The confusion matrices of the folds are summed into the aggregate statistics of every classifier, and the statistics
+of the folds give their mean and standard deviation.
+
+"""
+
+__author__ = 'vivek'
+
+import time
+import random
+import multiprocessing
+import numpy as np
+from tfidf import Index, SparseIndex
+from classifiers import create_classifiers
+from util import init_confusion_matrix, update_confusion_matrix, cal_stats, print_table
+
+# docs, fold of every doc, topics and options of the running cross-validation, inherited by the forked workers.
+shared = None
+
+
+def assign_folds(all_docs, topic_list, fold_count=10, seed=None):
+    """
+    Deal the shuffled docs of every topic into the folds, so every fold has about the same share of every topic.
+    :param all_docs: dict of (topic, list of documents)
+    :return: list of all the docs, and the list of their folds
+    """
+
+    rand = random.Random(seed)
+    docs, folds = list(), list()
+
+    for topic in topic_list:
+        topic_docs = list(all_docs[topic])
+        rand.shuffle(topic_docs)
+
+        for i in range(len(topic_docs)):
+            docs.append(topic_docs[i])
+            folds.append(i % fold_count)
+
+    return docs, folds
+
+
+def run_fold(fold):
+    """
+    Index the docs of the other folds, and train and test the classifiers on them. This runs in the workers.
+    :return: fold, list of (classifier name, confusion matrix) and the run time in seconds
+    """
+
+    start_time = time.time()
+    docs, folds, topic_list, options = shared
+
+    train_docs = [docs[i] for i in range(len(docs)) if folds[i] != fold]
+    test_docs = [docs[i] for i in range(len(docs)) if folds[i] == fold]
+    test_topics = [doc.topic for doc in test_docs]
+
+    if options['index_backend'] == 'csr':
+        SparseIndex(train_docs)
+    else:
+        Index(train_docs)
+
+    for doc in train_docs:
+        doc.vector = doc.tfidfie
+
+    for doc in test_docs:
+        doc.vector = doc.tf
+
+    results = list()
+
+    # one process per classifier, the workers of a pool can not start processes of their own.
+    for classifier in create_classifiers(topic_list, options['kmeans_backend'], options['hasher'], workers=1):
+        classifier.train(train_docs)
+
+        confusion_matrix, c_dict = init_confusion_matrix(topic_list)
+        confusion_matrix = update_confusion_matrix(test_topics, classifier.classify(test_docs), confusion_matrix,
+                                                   c_dict)
+
+        results.append((type(classifier).__name__, confusion_matrix))
+
+    return fold, results, time.time() - start_time
+
+
+def merge_results(topic_list, fold_results):
+    """
+    :param fold_results: list of the results of run_fold
+    :return: dict of (classifier name, dict of the summed confusion matrix, its statistics, and the mean and standard
+    deviation of the statistics of the folds)
+    """
+
+    report = dict()
+
+    for fold, results, run_time in sorted(fold_results):
+        for name, confusion_matrix in results:
+            if name not in report:
+                report[name] = {'confusion_matrix': init_confusion_matrix(topic_list)[0], 'folds': list()}
+
+            total = report[name]['confusion_matrix']
+            for i in range(len(total)):
+                for j in range(len(total)):
+                    total[i][j] += confusion_matrix[i][j]
+
+            report[name]['folds'].append(dict(cal_stats(confusion_matrix)))
+
+    for name, result in report.items():
+        result['stats'] = dict(cal_stats(result['confusion_matrix']))
+
+        measures = sorted(result['stats'].keys())
+        result['mean'] = dict((m, float(np.mean([s[m] for s in result['folds']]))) for m in measures)
+        result['std'] = dict((m, float(np.std([s[m] for s in result['folds']]))) for m in measures)
+
+    return report
+
+
+def cross_validate(all_docs, topic_list, fold_count=10, workers=1, seed=None, index_backend='dict',
+                   kmeans_backend='loop', hasher=None):
+    """
+    Run the k-fold cross-validation of all the classifiers.
+    :param all_docs: dict of (topic, list of documents)
+    :param fold_count: number of folds k
+    :param workers: number of processes which run the folds, 1 runs them one after the other.
+    :param seed: seed of the folds
+    :param hasher: FeatureHasher of the docs, if they are hashed
+    :return: report of merge_results, and the list of the run times of the folds
+    """
+
+    global shared
+
+    docs, folds = assign_folds(all_docs, topic_list, fold_count, seed)
+    options = {'index_backend': index_backend, 'kmeans_backend': kmeans_backend, 'hasher': hasher}
+    shared = (docs, folds, topic_list, options)
+
+    try:
+        if workers > 1:
+            # the workers must be forked to inherit the docs, python 3 may default to spawning them.
+            context = multiprocessing.get_context('fork') if hasattr(multiprocessing, 'get_context') else \
+                multiprocessing
+            pool = context.Pool(min(workers, fold_count))
+
+            try:
+                fold_results = pool.map(run_fold, range(fold_count), 1)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            fold_results = [run_fold(fold) for fold in range(fold_count)]
+    finally:
+        shared = None
+
+    return merge_results(topic_list, fold_results), [run_time for fold, results, run_time in sorted(fold_results)]
+
+
+def print_report(report):
+
+    for name in sorted(report.keys()):
+        result = report[name]
+
+        print("\n" + name + "\n")
+
+        print("Confusion Matrix\n")
+        for item in result['confusion_matrix']:
+            print(item)
+
+        print("\nStatistics\n")
+
+        table = [["Measure", "Value", "Fold Mean", "Fold Std"]]
+        for measure in sorted(result['stats'].keys()):
+            table.append([measure, str(result['stats'][measure]), "{:.4f}".format(result['mean'][measure]),
+                          "{:.4f}".format(result['std'][measure])])
+
+        print_table(table)
@@ -10,43 +10,166 @@ This script defines the structure of a document object. The data is tokenized an
 
 __author__ = 'vivek'
 
-from nltk.stem.porter import *
+import io
+import os
+import re
+from array import array
+from nltk.stem.porter import PorterStemmer
 from nltk.stem.wordnet import WordNetLemmatizer
 from nltk.corpus import stopwords
 from collections import defaultdict
 from collections import Counter
+from cache import LRUCache
+from sparse import Vocabulary
 
 
-class Document(object):
+def read_lines(f_path):
+    """
+    Read the lines of an article. The articles are latin-1 encoded, python 2 keeps them as byte strings.
+    """
 
-    stop_words = stopwords.words('english')
+    if str is bytes:
+        with open(f_path, 'r') as f:
+            return f.readlines()
 
-    def __init__(self, f_path, topic=None):
+    with open(f_path, 'r', encoding='latin-1') as f:
+        return f.readlines()
 
-        self.content = open(f_path, 'r').readlines()
-        self.title = self.content[0]
-        self.text = ' '.join(self.content[1:])
-        self.topic = topic
 
-        """
-        # No stemmer or lemmatizer.
-        self.title_tokens = self.tokenize(self.title)
-        self.text_tokens = self.tokenize(self.text)
+def decode_lines(data):
+    """
+    Split the raw bytes of an article into lines, the same lines read_lines reads from its file.
+    """
+
+    if str is bytes:
+        return io.BytesIO(data).readlines()
+
+    return io.StringIO(data.decode('latin-1'), newline=None).readlines()
+
+
+def article_id(topic, f_path):
+    """
+    :return: id of an article, 'topic/file name', e.g. 'tech/001.txt'
+    """
+
+    return topic + '/' + os.path.basename(f_path)
+
+
+def stored(store, f_path, topic):
+    """
+    :return: True if the article of the file is in the store
+    """
+
+    return store is not None and f_path is not None and topic is not None and article_id(topic, f_path) in store
+
+
+class TokenPipeline(object):
+    """
+    Tokenizer with stop word removal and optional stemming and/or lemmatization. The normalized form of every token is
+    kept in a bounded LRU cache, since the same words appear again and again in the documents. With a hasher, the term
+    counts of the documents are keyed on hashed features instead of the tokens.
+    """
+
+    modes = ('none', 'stem', 'lemmatize', 'both')
+
+    token_pattern = re.compile(r"\w+(?:[-']\w+)*")
 
-        # Only stemmer.
-        self.title_tokens = self.stem(self.tokenize(self.title))
-        self.text_tokens = self.stem(self.tokenize(self.text))
+    def __init__(self, mode='lemmatize', cache_size=100000, hasher=None):
 
+        if mode not in self.modes:
+            raise ValueError("Unknown normalization mode: " + mode)
+
+        self.mode = mode
+        self.cache_size = cache_size
+        self.stop_words = frozenset(stopwords.words('english'))
+
+        # the stemmer and lemmatizer instances are shared by all the documents.
+        self.stemmer = PorterStemmer() if mode in ('stem', 'both') else None
+        self.lemmatizer = WordNetLemmatizer() if mode in ('lemmatize', 'both') else None
+        self.cache = LRUCache(cache_size)
+        self.hasher = hasher
+
+        # describes the tokenization, cached tokens are reused only for the same configuration. The tokens are cached
+        # before hashing, so the hasher is not a part of it.
+        self.config = "pattern=\\w+(?:[-']\\w+)*;min_length=3;stop_words=english;normalize=" + mode
+
+    def __call__(self, data):
+
+        return self.normalize(self.tokenize(data))
+
+    def tokenize_article(self, lines):
         """
-        # Only lemmatizer.
-        self.title_tokens = self.lemmatize(self.tokenize(self.title))
-        self.text_tokens = self.lemmatize(self.tokenize(self.text))
+        :param lines: lines of an article, the first one is its title
+        :return: title tokens and text tokens
         """
 
-        # Both stemmer and lemmatizer.
-        self.title_tokens = self.stem(self.lemmatize(self.tokenize(self.title)))
-        self.text_tokens = self.stem(self.lemmatize(self.tokenize(self.text)))
+        return self(lines[0]), self(' '.join(lines[1:]))
+
+    def tokenize(self, data):
+
+        stop_words = self.stop_words
+
+        return [t.lower() for t in self.token_pattern.findall(data) if t not in stop_words and len(t) > 2]
+
+    def normalize(self, tokens):
+
+        if self.mode == 'none':
+            return tokens
+
+        cache = self.cache
+        normal_tokens = list()
+
+        for token in tokens:
+            word = cache.get(token)
+
+            if word is None:
+                word = token
+
+                # lemmatizer runs before the stemmer when both are selected.
+                if self.lemmatizer is not None:
+                    word = self.lemmatizer.lemmatize(word)
+                if self.stemmer is not None:
+                    word = self.stemmer.stem(word)
+
+                cache.put(token, word)
+
+            normal_tokens.append(word)
+
+        return normal_tokens
+
+
+class Document(object):
+
+    # pipeline of the documents which are not given one. Only lemmatizer by default.
+    pipeline = TokenPipeline('lemmatize')
+
+    stop_words = pipeline.stop_words
+
+    def __init__(self, f_path, topic=None, tokens=None, pipeline=None, content=None, store=None):
         """
+        :param store: ArticleStore of the article. If the article is stored, its text is read from the store when it is
+        asked for instead of kept in memory. The document is always made from the content given or read from the file,
+        not from the store.
+        """
+
+        self.f_path = f_path
+        self.topic = topic
+        self.store = store if stored(store, f_path, topic) else None
+
+        if content is None:
+            content = read_lines(f_path)
+
+        self.lines = content
+        self.title = content[0]
+
+        if pipeline is not None:
+            self.pipeline = pipeline
+
+        # tokens are provided when the document is already tokenized by a worker process.
+        if tokens is not None:
+            self.title_tokens, self.text_tokens = tokens
+        else:
+            self.title_tokens, self.text_tokens = self.tokenize_content()
 
         self.tf = self.tf_index(self.text_tokens)
 
@@ -54,33 +177,71 @@ class Document(object):
         self.tfidfie = None
         self.vector = None
         self.term_count()
-    
+
+        if self.store is not None:
+            self.lines = None
+
+    @classmethod
+    def from_text(cls, text, topic=None, pipeline=None):
+        """
+        Create a document which is not stored in a file, e.g. an article given by a user. The first line is the title.
+        """
+
+        doc = cls(None, topic, pipeline=pipeline, content=text.splitlines(True) or [''])
+        doc.vector = doc.tf
+
+        return doc
+
+    @property
+    def content(self):
+
+        if self.lines is not None:
+            return self.lines
+
+        return self.store.content(article_id(self.topic, self.f_path))
+
+    @property
+    def text(self):
+
+        return ' '.join(self.content[1:])
+
+    def tokenize_content(self):
+        """
+        Tokenize the title and the text.
+        :return: title tokens and text tokens
+        """
+
+        return self.pipeline.tokenize_article(self.content)
+
     def document_terms(self):
 
         return self.terms
-    
+
     def term_count(self):
-        
+
         self.terms = Counter()
-        
+
         for token in self.title_tokens:
             self.terms[token] += 1
         for token in self.text_tokens:
             self.terms[token] += 1
-            
+
+        if self.pipeline.hasher is not None:
+            self.terms = Counter(self.pipeline.hasher.transform(self.terms))
+
     def tokenize(self, data):
-        # return [t.lower() for t in re.findall(r"\w+(?:[-']\w+)*", data) if t not in self.stop_words]
-        return [t.lower() for t in re.findall(r"\w+(?:[-']\w+)*", data) if t not in self.stop_words and len(t) > 2]
+
+        return self.pipeline.tokenize(data)
 
     def stem(self, tokens):
 
-        stemmer = PorterStemmer()
+        stemmer = self.pipeline.stemmer or PorterStemmer()
 
         return [stemmer.stem(token) for token in tokens]
 
     def lemmatize(self, tokens):
 
-        lemmatizer = WordNetLemmatizer()
+        lemmatizer = self.pipeline.lemmatizer or WordNetLemmatizer()
 
         return [lemmatizer.lemmatize(token) for token in tokens]
 
@@ -91,4 +252,132 @@ class Document(object):
         for token in token_list:
             tf[token] = tf[token] + 1
 
-        return tf
\ No newline at end of file
+        if self.pipeline.hasher is not None:
+            return self.pipeline.hasher.transform(tf)
+
+        return tf
+
+
+class CompactDocument(object):
+    """
+    Memory lean document. Tokens are stored as ids of the shared vocabulary in array('I') buffers, the text tf is the
+    only term count kept, and the article text is read from the file, or from the article store, only when it is asked
+    for. With a hasher, the tf is stored as hashed features and signed counts.
+    """
+
+    __slots__ = ('f_path', 'title', 'topic', 'title_ids', 'text_ids', 'tf_ids', 'tf_counts', 'tfidf', 'tfidfie',
+                 'vector', 'hasher', 'store')
+
+    # vocabulary shared by all the compact documents.
+    vocab = Vocabulary()
+
+    pipeline = Document.pipeline
+
+    def __init__(self, f_path, topic=None, tokens=None, pipeline=None, content=None, store=None):
+
+        pipeline = pipeline or self.pipeline
+
+        self.f_path = f_path
+        self.topic = topic
+        self.hasher = pipeline.hasher
+        self.store = store if stored(store, f_path, topic) else None
+
+        if content is None:
+            content = read_lines(f_path)
+
+        self.title = content[0]
+
+        if tokens is None:
+            tokens = pipeline.tokenize_article(content)
+
+        self.set_tokens(tokens[0], tokens[1])
+
+        self.tfidf = None
+        self.tfidfie = None
+        self.vector = None
+
+    @classmethod
+    def from_document(cls, doc):
+
+        compact_doc = cls.__new__(cls)
+        compact_doc.f_path = doc.f_path
+        compact_doc.title = doc.title
+        compact_doc.topic = doc.topic
+        compact_doc.hasher = doc.pipeline.hasher
+        compact_doc.store = doc.store
+        compact_doc.set_tokens(doc.title_tokens, doc.text_tokens)
+        compact_doc.tfidf = doc.tfidf
+        compact_doc.tfidfie = doc.tfidfie
+        compact_doc.vector = doc.vector
+
+        return compact_doc
+
+    def set_tokens(self, title_tokens, text_tokens):
+
+        vocab = self.vocab
+        self.title_ids = array('I', vocab.ids(title_tokens, add=True))
+        self.text_ids = array('I', vocab.ids(text_tokens, add=True))
+
+        if self.hasher is not None:
+            tf = self.hasher.transform(Counter(text_tokens))
+            self.tf_ids = array('I', tf.keys())
+            self.tf_counts = array('i', tf.values())
+            return
+
+        tf = Counter(self.text_ids)
+        self.tf_ids = array('I', tf.keys())
+        self.tf_counts = array('I', tf.values())
+
+    @property
+    def content(self):
+
+        if self.store is not None:
+            return self.store.content(article_id(self.topic, self.f_path))
+
+        return read_lines(self.f_path)
+
+    @property
+    def text(self):
+
+        return ' '.join(self.content[1:])
+
+    @property
+    def title_tokens(self):
+
+        terms = self.vocab.terms
+
+        return [terms[i] for i in self.title_ids]
+
+    @property
+    def text_tokens(self):
+
+        terms = self.vocab.terms
+
+        return [terms[i] for i in self.text_ids]
+
+    @property
+    def tf(self):
+
+        if self.hasher is not None:
+            return dict(zip(self.tf_ids, self.tf_counts))
+
+        terms = self.vocab.terms
+
+        return dict((terms[i], c) for i, c in zip(self.tf_ids, self.tf_counts))
+
+    @property
+    def terms(self):
+
+        if self.hasher is not None:
+            return Counter(self.hasher.transform(Counter(self.title_tokens + self.text_tokens)))
+
+        terms = Counter(self.tf)
+
+        for token in self.title_tokens:
+            terms[token] += 1
+
+        return terms
+
+    def document_terms(self):
+
+        return self.terms
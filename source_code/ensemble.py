@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script implements the ensemble which predicts the topic of the articles by a vote of the trained classifiers. The
+classifiers run in the order of their f_measure, and a document is decided as soon as a majority of them agree, so the
+remaining classifiers only classify the documents which are still open. Optionally the classifiers run concurrently,
+each in its own thread, with a latency budget, and the documents which are not decided within the budget get the
+prediction of the best classifier. The budget bounds the wait for a majority, the best classifier is always waited for,
+since there is no answer without it. Counters record which path decided every document.
+
+"""
+
+__author__ = 'vivek'
+
+import time
+from collections import Counter
+from multiprocessing.pool import ThreadPool
+
+try:
+    from queue import Queue, Empty
+except ImportError:
+    from Queue import Queue, Empty
+
+
+def vote(prediction_list):
+    """
+    :param prediction_list: predictions of the classifiers, in the order of the classifiers
+    :return: the topic predicted by the most classifiers, or by the best classifier if they all differ.
+    """
+
+    top_prediction = Counter(prediction_list).most_common(1)
+
+    if top_prediction[0][1] > 1:
+        return top_prediction[0][0]
+
+    return prediction_list[0]
+
+
+def classify(i, classifier, docs):
+    """
+    Classify the docs in a worker thread.
+    :return: position of the classifier, its predictions and the exception it raised, if any.
+    """
+
+    try:
+        return i, classifier.classify(docs), None
+    except Exception as e:
+        return i, None, e
+
+
+class EnsemblePredictor(object):
+
+    # paths which decide a document: a majority before all the classifiers ran, a vote of all the classifiers, the best
+    # classifier when they all differ or busy classifiers sat out, and the best classifier when the latency budget ran
+    # out.
+    paths = ('short_circuit', 'vote', 'best', 'budget')
+
+    def __init__(self, classifier_list, concurrent=False, budget=None):
+        """
+        :param classifier_list: trained classifiers with their stats
+        :param concurrent: run the classifiers concurrently, each in its own thread
+        :param budget: seconds a concurrent prediction waits for a majority, None waits for all the classifiers. The
+        best classifier is waited for even when the budget ran out.
+        """
+
+        # classifiers are sorted according to their f_measure in decreasing order. It helps when all
+        # three classifiers differ in their predictions.
+        self.classifier_list = sorted(classifier_list, key=lambda cl: cl.stats['f_measure'], reverse=True)
+        self.majority = len(self.classifier_list) // 2 + 1
+        self.concurrent = concurrent
+        self.budget = budget
+        # a thread per classifier, so the best classifier never waits behind the others.
+        self.pools = [ThreadPool(1) for classifier in self.classifier_list] if concurrent else None
+        # set while a classifier is classifying in its thread. A prediction which ran out of budget leaves the slower
+        # classifiers running.
+        self.busy = [False] * len(self.classifier_list)
+
+        self.path_counts = Counter()
+        # documents classified by every classifier.
+        self.classified_counts = Counter()
+        # predictions in which a classifier raised an exception.
+        self.error_counts = Counter()
+
+    def close(self):
+
+        if self.pools is not None:
+            for pool in self.pools:
+                pool.close()
+                pool.join()
+
+            self.pools = None
+
+    def decided(self, votes):
+        """
+        :param votes: predictions of the document so far
+        :return: the topic of the majority, None if there is no majority yet.
+        """
+
+        if not votes:
+            return None
+
+        topic, count = Counter(votes).most_common(1)[0]
+
+        return topic if count >= self.majority else None
+
+    def count_vote(self, votes):
+        """
+        Count the path of a document decided by the vote of all the classifiers.
+        """
+
+        self.path_counts['vote' if Counter(votes).most_common(1)[0][1] > 1 else 'best'] += 1
+
+    def predict(self, doc):
+
+        return self.predict_batch([doc])[0]
+
+    def predict_batch(self, docs):
+        """
+        :param docs: list of documents
+        :return: list of the predicted topics
+        """
+
+        if not docs:
+            return []
+
+        if self.concurrent:
+            return self.predict_concurrent(docs)
+
+        return self.predict_sequential(docs)
+
+    def predict_sequential(self, docs):
+        """
+        Run the classifiers one after the other, every one on the documents which are not decided yet.
+        """
+
+        votes = [list() for doc in docs]
+        topics = [None] * len(docs)
+        open_docs = list(range(len(docs)))
+        last = len(self.classifier_list) - 1
+
+        for j in range(len(self.classifier_list)):
+            classifier = self.classifier_list[j]
+            predictions = classifier.classify([docs[i] for i in open_docs])
+            self.classified_counts[type(classifier).__name__] += len(open_docs)
+
+            still_open = list()
+
+            for i, prediction in zip(open_docs, predictions):
+                votes[i].append(prediction)
+                topic = self.decided(votes[i])
+
+                if topic is not None:
+                    topics[i] = topic
+                    self.path_counts['short_circuit' if j < last else 'vote'] += 1
+                elif j == last:
+                    topics[i] = vote(votes[i])
+                    self.count_vote(votes[i])
+                else:
+                    still_open.append(i)
+
+            open_docs = still_open
+
+            if not open_docs:
+                break
+
+        return topics
+
+    def finished(self, results):
+        """
+        :return: callback of a classifier thread, which marks the classifier as free and puts its result in the queue
+        """
+
+        def callback(result):
+            self.busy[result[0]] = False
+            results.put(result)
+
+        return callback
+
+    def collect(self, result, predictions, doc_count):
+        """
+        Record the result of a classifier thread. An exception of the best classifier is raised, another classifier
+        which raised one only drops out of the vote.
+        :return: True if the classifier predicted the documents
+        """
+
+        j, classifier_predictions, error = result
+        name = type(self.classifier_list[j]).__name__
+
+        if error is not None:
+            if j == 0:
+                raise error
+
+            self.error_counts[name] += 1
+            return False
+
+        predictions[j] = classifier_predictions
+        self.classified_counts[name] += doc_count
+
+        return True
+
+    def predict_concurrent(self, docs):
+        """
+        Run the classifiers at once in their threads, and decide the documents as the predictions come in. When the
+        budget runs out, the open documents get the prediction of the best classifier. The classifiers which have not
+        finished are not interrupted, their predictions are dropped, and they sit out the predictions which start before
+        they finish, so their documents never pile up in their threads.
+        """
+
+        results = Queue()
+        running = list()
+
+        for j in range(len(self.classifier_list)):
+            if self.busy[j] and j > 0:
+                continue
+
+            self.busy[j] = True
+            running.append(j)
+            self.pools[j].apply_async(classify, (j, self.classifier_list[j], docs), callback=self.finished(results))
+
+        predictions = [None] * len(self.classifier_list)
+        topics = [None] * len(docs)
+        open_docs = set(range(len(docs)))
+        deadline = time.time() + self.budget if self.budget is not None else None
+        finished = 0
+        expired = False
+
+        while open_docs and finished < len(running):
+            timeout = max(deadline - time.time(), 0) if deadline is not None else None
+
+            try:
+                result = results.get(True, timeout)
+            except Empty:
+                expired = True
+                break
+
+            finished += 1
+
+            if not self.collect(result, predictions, len(docs)):
+                continue
+
+            for i in list(open_docs):
+                votes = [p[i] for p in predictions if p is not None]
+                topic = self.decided(votes)
+
+                if topic is not None:
+                    topics[i] = topic
+                    open_docs.discard(i)
+                    self.path_counts['short_circuit' if finished < len(running) else 'vote'] += 1
+
+        if not open_docs:
+            return topics
+
+        if finished == len(self.classifier_list):
+            for i in open_docs:
+                votes = [p[i] for p in predictions if p is not None]
+                topics[i] = vote(votes)
+                self.count_vote(votes)
+
+            return topics
+
+        # the budget ran out, or busy classifiers sat out, the best classifier is waited for if it has not finished yet.
+        while predictions[0] is None:
+            self.collect(results.get(), predictions, len(docs))
+
+        for i in open_docs:
+            topics[i] = predictions[0][i]
+            self.path_counts['budget' if expired else 'best'] += 1
+
+        return topics
+
+    def stats(self):
+        """
+        :return: dict of the number of documents decided by every path and classified by every classifier, and of the
+        number of predictions in which a classifier raised an exception
+        """
+
+        return {
+            'paths': dict((path, self.path_counts[path]) for path in self.paths),
+            'classified': dict(self.classified_counts),
+            'errors': dict(self.error_counts)
+        }
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script implements the hashing trick. Every token is mapped to one of 2^n_bits integer features by a crc32 hash,
+instead of being interned into a vocabulary, so the models trained on the hashed term counts never grow beyond
+2^n_bits terms however many new names, typos and numbers the articles bring in, and processes which read separate
+parts of the corpus agree on the features without sharing a vocabulary. With signed hashing another bit of the hash
+gives every token a sign, so the tokens which collide in a feature tend to cancel out instead of adding up, and the
+dot products of the hashed vectors stay unbiased.
+
+"""
+
+__author__ = 'vivek'
+
+import zlib
+from collections import defaultdict
+
+
+class FeatureHasher(object):
+
+    def __init__(self, n_bits=18, signed=True, cache_size=100000):
+        """
+        :param n_bits: number of bits of the features, from 1 to 30. There are 2^n_bits features.
+        :param signed: give every token a sign
+        :param cache_size: number of token hashes kept, the cache is cleared once it is full.
+        """
+
+        if not 0 < n_bits <= 30:
+            raise ValueError("n_bits must be from 1 to 30: {}".format(n_bits))
+
+        self.n_bits = n_bits
+        self.signed = signed
+        self.mask = (1 << n_bits) - 1
+        self.cache_size = cache_size
+        # stores (token, hash), the same tokens are hashed again and again.
+        self.cache = dict()
+
+        self.config = "hash=crc32;bits={};signed={}".format(n_bits, int(signed))
+
+    def __len__(self):
+
+        return 1 << self.n_bits
+
+    def hash(self, token):
+
+        value = self.cache.get(token)
+
+        if value is None:
+            value = zlib.crc32(token if isinstance(token, bytes) else token.encode('utf-8')) & 0xffffffff
+
+            if len(self.cache) >= self.cache_size:
+                self.cache.clear()
+
+            self.cache[token] = value
+
+        return value
+
+    def feature(self, token):
+        """
+        :return: feature of the token, and its sign
+        """
+
+        value = self.hash(token)
+
+        # the highest bit of the hash is independent of the low bits of the feature.
+        return value & self.mask, -1 if self.signed and value >> 31 else 1
+
+    def features(self, tokens):
+        """
+        :return: list of the features of the tokens, without their signs
+        """
+
+        mask = self.mask
+
+        return [self.hash(token) & mask for token in tokens]
+
+    def transform(self, counts):
+        """
+        :param counts: dict of (token, count), e.g. the tf of a document
+        :return: dict of (feature, sum of the signed counts of its tokens). Features whose counts cancel out are dropped.
+        """
+
+        hashed = defaultdict(lambda: 0)
+        mask, signed = self.mask, self.signed
+
+        for token, count in counts.items():
+            value = self.hash(token)
+            hashed[value & mask] += -count if signed and value >> 31 else count
+
+        for feature in [feature for feature, count in hashed.items() if count == 0]:
+            del hashed[feature]
+
+        return hashed
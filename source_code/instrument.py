@@ -0,0 +1,398 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script instruments the hot paths of the system: tokenization, the index stages, training and classification of
+the classifiers, and the knn searches. install() wraps the methods with timers, and a few of them with counters, e.g.
+of the tokenized documents and the cache hits, so nothing is measured, and nothing costs any time, until it is called,
+and uninstall() puts the original methods back. Only the calls of this process are measured, the articles tokenized
+by the worker processes of read_corpus are neither timed nor counted. The timings, call counts and
+memory gauges can be printed as a table, or exported as JSON or in the Prometheus text format. Optionally the whole
+run is profiled with cProfile, and the memory allocated by every stage is traced with tracemalloc (python 3).
+
+"""
+
+__author__ = 'vivek'
+
+import json
+import time
+import functools
+import importlib
+from util import print_table
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+clock = getattr(time, 'perf_counter', time.time)
+
+# methods which are instrumented by default, as 'module.Class.method'.
+default_targets = [
+    'document.TokenPipeline.__call__',
+    'tfidf.Index.create_tf_index',
+    'tfidf.Index.count_doc_frequencies',
+    'tfidf.Index.create_tfidf_index',
+    'tfidf.Index.count_topic_doc_frequencies',
+    'tfidf.Index.cal_information_entropy',
+    'tfidf.Index.create_tfidfie_index',
+    'tfidf.Index.normalize_vector_list',
+    'tfidf.SparseIndex.create_tfidf_index',
+    'tfidf.SparseIndex.cal_information_entropy',
+    'tfidf.SparseIndex.create_tfidfie_index',
+    'nb.NaiveBayes.train',
+    'nb.NaiveBayes.classify',
+    'rank_classifier.RankClassifier.train',
+    'rank_classifier.RankClassifier.classify',
+    'kmeans.KMeans.train',
+    'kmeans.KMeans.classify',
+    'kmeans.SparseKMeans.train',
+    'kmeans.SparseKMeans.classify',
+    'kmeans.MiniBatchKMeans.train',
+    'knn.KNN.find_k_neighbours',
+    'lsh.LSHIndex.find_k_neighbours',
+    'neighbours.NeighbourTable.build',
+    'neighbours.NeighbourTable.refresh',
+    'recommender.Recommender.recommend_batch'
+]
+
+
+def cache_counters(prefix, attribute=None):
+    """
+    :param attribute: attribute of the instance which is the cache, the instance itself is the cache if None
+    :return: function which returns the hits and the misses of the cache of an instance
+    """
+
+    def counters(obj):
+        cache = getattr(obj, attribute) if attribute is not None else obj
+
+        if cache is None:
+            return dict()
+
+        return {prefix + '_hits': cache.hits, prefix + '_misses': cache.misses}
+
+    return counters
+
+
+# counters which are incremented by default, as ('module.Class.method', counter). The counter is either a name, which
+# is incremented once per call, or a function which returns the counters of the instance, e.g. the hits of its cache,
+# and they are incremented by how much they grew during the call.
+default_counters = [
+    ('document.TokenPipeline.tokenize_article', 'documents_tokenized'),
+    ('knn.KNN.find_k_neighbours', 'knn_searches'),
+    ('lsh.LSHIndex.find_k_neighbours', 'knn_searches'),
+    ('neighbours.NeighbourTable.lookup', 'neighbour_lookups'),
+    ('token_cache.TokenCache.get', cache_counters('token_cache')),
+    ('recommender.Recommender.predict_batch', cache_counters('prediction_cache', 'prediction_cache')),
+    ('recommender.Recommender.recommend_batch', cache_counters('recommendation_cache', 'recommendation_cache'))
+]
+
+
+class Stage(object):
+
+    __slots__ = ('calls', 'total', 'max', 'memory_peak')
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        # highest traced memory peak of a call in bytes, None if the memory is not traced.
+        self.memory_peak = None
+
+
+class Registry(object):
+    """
+    Timers of the instrumented stages, counters and gauges.
+    """
+
+    def __init__(self):
+        self.stages = dict()
+        self.counters = dict()
+        self.gauges = dict()
+
+        # (class, method name, original function) of the installed wrappers.
+        self.patches = list()
+        self.profiler = None
+        self.trace_memory = False
+        self.depth = 0
+
+    def record(self, name, elapsed, memory_peak=None):
+
+        stage = self.stages.get(name)
+
+        if stage is None:
+            stage = self.stages[name] = Stage()
+
+        stage.calls += 1
+        stage.total += elapsed
+        stage.max = max(stage.max, elapsed)
+
+        if memory_peak is not None:
+            stage.memory_peak = max(stage.memory_peak or 0, memory_peak)
+
+    def increment(self, name, value=1):
+
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+
+        self.gauges[name] = value
+
+    def reset(self):
+
+        self.stages.clear()
+        self.counters.clear()
+        self.gauges.clear()
+
+    def timed(self, name, func):
+        """
+        :return: function which calls func and records its time under the name
+        """
+
+        registry = self
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start_time = clock()
+
+            try:
+                return func(*args, **kwargs)
+            finally:
+                registry.record(name, clock() - start_time)
+
+        return wrapper
+
+    def traced(self, name, func):
+        """
+        :return: function which calls func and records its time and its traced memory peak under the name. The peak is
+        recorded only for the outermost instrumented call, the nested calls would reset the peak of the outer one.
+        """
+
+        registry = self
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            outermost = registry.depth == 0
+            registry.depth += 1
+
+            if outermost:
+                start_memory = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+
+            start_time = clock()
+
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = clock() - start_time
+                registry.depth -= 1
+                memory_peak = tracemalloc.get_traced_memory()[1] - start_memory if outermost else None
+                registry.record(name, elapsed, memory_peak)
+
+        return wrapper
+
+    def counted(self, counter, func):
+        """
+        :param counter: name of a counter, or function of the instance which returns its counters
+        :return: function which calls func and increments the counter once, or by how much the counters of the
+        instance grew during the call
+        """
+
+        registry = self
+
+        if not callable(counter):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                registry.increment(counter)
+
+                return func(*args, **kwargs)
+
+            return wrapper
+
+        @functools.wraps(func)
+        def wrapper(obj, *args, **kwargs):
+            before = counter(obj)
+
+            try:
+                return func(obj, *args, **kwargs)
+            finally:
+                for name, value in counter(obj).items():
+                    registry.increment(name, value - before.get(name, 0))
+
+        return wrapper
+
+    def patch(self, target, wrap):
+        """
+        Replace the method with the function wrap returns for it.
+        :param target: 'module.Class.method' name
+        :param wrap: function of the name of the method and the method
+        """
+
+        module_name, class_name, method_name = target.rsplit('.', 2)
+        cls = getattr(importlib.import_module(module_name), class_name)
+        # only the methods defined by the class itself, an inherited one is instrumented with its own class.
+        func = cls.__dict__[method_name]
+
+        if isinstance(func, (classmethod, staticmethod)):
+            # the function of a class or static method is wrapped, and the wrapper is made one again.
+            wrapper = type(func)(wrap(class_name + '.' + method_name, func.__func__))
+        else:
+            wrapper = wrap(class_name + '.' + method_name, func)
+
+        setattr(cls, method_name, wrapper)
+        self.patches.append((cls, method_name, func))
+
+    def install(self, targets=None, profile=False, trace_memory=False, counters=None):
+        """
+        Wrap the target methods with timers, and the counted methods with counters.
+        :param targets: list of 'module.Class.method' names, default_targets by default
+        :param profile: profile the run with cProfile until uninstall()
+        :param trace_memory: trace the memory peaks of the stages with tracemalloc, python 3.9 or later
+        :param counters: list of ('module.Class.method', counter), default_counters by default
+        """
+
+        if self.patches:
+            self.uninstall()
+
+        if trace_memory and (tracemalloc is None or not hasattr(tracemalloc, 'reset_peak')):
+            raise ValueError("Memory tracing requires python 3.9 or later.")
+
+        self.trace_memory = trace_memory
+        wrap = self.traced if trace_memory else self.timed
+
+        for target in targets or default_targets:
+            self.patch(target, wrap)
+
+        for target, counter in counters or default_counters:
+            self.patch(target, lambda name, func, counter=counter: self.counted(counter, func))
+
+        if trace_memory:
+            tracemalloc.start()
+
+        if profile:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def uninstall(self):
+        """
+        Put the original methods back, and stop the profiler and the memory tracing.
+        """
+
+        for cls, method_name, func in reversed(self.patches):
+            setattr(cls, method_name, func)
+
+        self.patches = list()
+
+        if self.profiler is not None:
+            self.profiler.disable()
+
+        if self.trace_memory:
+            tracemalloc.stop()
+            self.trace_memory = False
+
+    def update_gauges(self):
+
+        if resource is not None:
+            # linux reports KB.
+            self.set_gauge('peak_rss_bytes', resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+
+        if self.trace_memory:
+            self.set_gauge('traced_memory_bytes', tracemalloc.get_traced_memory()[0])
+
+    def to_dict(self):
+
+        self.update_gauges()
+
+        stages = dict()
+        for name, stage in self.stages.items():
+            stages[name] = {
+                'calls': stage.calls,
+                'total_seconds': stage.total,
+                'mean_seconds': stage.total / stage.calls if stage.calls else 0.0,
+                'max_seconds': stage.max,
+                'memory_peak_bytes': stage.memory_peak
+            }
+
+        return {'stages': stages, 'counters': dict(self.counters), 'gauges': dict(self.gauges)}
+
+    def to_json(self):
+
+        return json.dumps(self.to_dict(), indent=2, sort_keys=True)
+
+    def to_prometheus(self, prefix='nrs'):
+        """
+        :return: the metrics in the Prometheus text exposition format
+        """
+
+        data = self.to_dict()
+        lines = list()
+
+        def add(name, metric_type, samples):
+            lines.append("# TYPE {}_{} {}".format(prefix, name, metric_type))
+            for labels, value in samples:
+                lines.append("{}_{}{} {!r}".format(prefix, name, labels, float(value)))
+
+        stages = sorted(data['stages'].items())
+        add('stage_calls_total', 'counter', [('{stage="%s"}' % name, s['calls']) for name, s in stages])
+        add('stage_seconds_total', 'counter', [('{stage="%s"}' % name, s['total_seconds']) for name, s in stages])
+        add('stage_seconds_max', 'gauge', [('{stage="%s"}' % name, s['max_seconds']) for name, s in stages])
+
+        memory = [('{stage="%s"}' % name, s['memory_peak_bytes']) for name, s in stages
+                  if s['memory_peak_bytes'] is not None]
+        if memory:
+            add('stage_memory_peak_bytes', 'gauge', memory)
+
+        for name, value in sorted(data['counters'].items()):
+            add(name + '_total', 'counter', [('', value)])
+
+        for name, value in sorted(data['gauges'].items()):
+            add(name, 'gauge', [('', value)])
+
+        return '\n'.join(lines) + '\n'
+
+    def save(self, path):
+        """
+        Write the metrics to the file, in the Prometheus format if the file name ends with .prom, as JSON otherwise.
+        """
+
+        with open(path, 'w') as f:
+            f.write(self.to_prometheus() if path.endswith('.prom') else self.to_json())
+
+    def save_profile(self, path):
+        """
+        Dump the cProfile statistics to the file, which can be read with pstats.
+        """
+
+        if self.profiler is None:
+            raise ValueError("The profiler is not installed.")
+
+        self.profiler.dump_stats(path)
+
+    def print_summary(self):
+
+        table = [['Stage', 'Calls', 'Total s', 'Mean ms', 'Max ms', 'Peak MB']]
+
+        for name, stage in sorted(self.stages.items(), key=lambda x: x[1].total, reverse=True):
+            peak = "{:.1f}".format(stage.memory_peak / 1048576.0) if stage.memory_peak is not None else '-'
+            table.append([name, str(stage.calls), "{:.3f}".format(stage.total),
+                          "{:.3f}".format(1000.0 * stage.total / stage.calls), "{:.3f}".format(1000.0 * stage.max),
+                          peak])
+
+        print_table(table)
+
+        if self.counters:
+            print_table([['Counter', 'Value']] + [[name, str(value)] for name, value in sorted(self.counters.items())])
+
+
+registry = Registry()
+
+install = registry.install
+uninstall = registry.uninstall
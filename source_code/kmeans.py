@@ -5,6 +5,11 @@ Created on Mar 30, 2016
 
 from collections import Counter
 from collections import defaultdict
+from multiprocessing import Pool
+from sparse import Vocabulary, CsrMatrix
+from model_io import save_model, load_model, stats_to_meta, dicts_to_matrix, matrix_to_dicts
+from util import batched
+import numpy as np
 import math
 
 
@@ -14,6 +19,9 @@ class KMeans(object):
         self.topics = topics
         self.k = len(topics)
         self.confusion_matrix = None
+
+        # incremented whenever the model changes, so results cached for an older model are not used.
+        self.version = 0
         
     def prune_terms(self,docs, min_df=3):
         """
@@ -46,6 +54,7 @@ class KMeans(object):
     
     def train(self,docs):
         
+        self.version += 1
         self.k_cluster = defaultdict(lambda: [])
         self.doc_norm = defaultdict(lambda: 0.0)
         
@@ -184,4 +193,347 @@ class KMeans(object):
                     print(buf.decode('utf-8'))
                     count += 1
                 if count == n:
-                    break
\ No newline at end of file
+                    break
+
+    def mean_matrix(self):
+        """
+        :return: vocabulary and (k, vocab) array of the cluster means
+        """
+
+        vocab = Vocabulary()
+        for topic in self.topics:
+            for term in self.mean_vectors[topic]:
+                vocab.add(term)
+
+        return vocab, dicts_to_matrix([self.mean_vectors[topic] or dict() for topic in self.topics], vocab)
+
+    def set_mean_matrix(self, vocab, means):
+
+        self.mean_vectors = defaultdict(lambda: [])
+        self.mean_norms = defaultdict(lambda: 0.0)
+        mean_dicts = matrix_to_dicts(means, vocab.terms)
+
+        for i in range(self.k):
+            self.mean_vectors[self.topics[i]] = Counter(mean_dicts[i])
+            self.mean_norms[self.topics[i]] = self.sqnorm(self.mean_vectors[self.topics[i]])
+
+    def save(self, path, fingerprint=None):
+        """
+        Save the cluster means into a model file.
+        :param fingerprint: fingerprint of the training documents, see model_io.fingerprint
+        """
+
+        vocab, means = self.mean_matrix()
+        stats = getattr(self, 'stats', None)
+
+        save_model(path, type(self).__name__, {'means': means}, {'stats': stats_to_meta(stats)},
+                   {'topics': self.topics, 'terms': vocab.terms}, fingerprint)
+
+    @classmethod
+    def load(cls, path, fingerprint=None):
+        """
+        Load a model saved by save() of the same class.
+        :param fingerprint: fingerprint of the training documents, ModelMismatchError is raised if the model was trained
+        on others.
+        """
+
+        meta, arrays, strings = load_model(path, cls.__name__, fingerprint=fingerprint)
+
+        model = cls(strings['topics'])
+        model.set_mean_matrix(Vocabulary(strings['terms']), arrays['means'])
+        model.stats = meta['stats']
+
+        return model
+
+
+class SparseKMeans(KMeans):
+    """
+    Vectorized k-means. Documents are rows of a CSR matrix, all the document to mean distances of an iteration are
+    computed by one sparse matrix product with precomputed squared norms, the means are updated by a segment sum, and
+    training stops once the assignments (or the means) do not change any more.
+    """
+
+    def __init__(self, topics, max_iter=100, tol=1e-6):
+        KMeans.__init__(self, topics)
+        self.max_iter = max_iter
+        self.tol = tol
+
+    def train(self, docs):
+
+        self.version += 1
+        documents = self.doc_to_terms(docs)
+
+        all_docs = []
+        labels = []
+        for i in range(self.k):
+            topic_docs = self.prune_terms(documents[self.topics[i]], 2)
+            all_docs += topic_docs
+            labels += [i] * len(topic_docs)
+
+        self.vocab = Vocabulary()
+        self.documents = all_docs
+        self.matrix = CsrMatrix.from_rows(all_docs, self.vocab)
+        self.doc_norms = self.matrix.row_sums(self.matrix.data ** 2)
+        self.labels = np.array(labels, dtype=np.int64)
+
+        self.means = self.compute_mean_matrix(self.matrix, self.labels)
+        self.iterations = 0
+        self.inertia_history = []
+
+        for j in range(self.max_iter):
+            labels, distances = self.nearest_means(self.matrix, self.doc_norms)
+            means = self.compute_mean_matrix(self.matrix, labels, self.means)
+
+            shift = ((means - self.means) ** 2).sum()
+            changed = (labels != self.labels).sum()
+
+            self.labels, self.means = labels, means
+            self.iterations = j + 1
+            self.inertia_history.append(float(distances.sum()))
+
+            if changed == 0 or shift <= self.tol:
+                break
+
+        self.k_cluster = defaultdict(lambda: [])
+        for doc_id in range(len(self.labels)):
+            self.k_cluster[self.topics[self.labels[doc_id]]].append(doc_id)
+
+    def compute_mean_matrix(self, matrix, labels, previous=None):
+        """
+        Means of the clusters as a dense (k, vocab) array. A cluster without documents keeps its previous mean.
+        """
+
+        vocab_size = matrix.shape[1]
+        cells = labels[matrix.row_ids()] * vocab_size + matrix.indices
+        sums = np.bincount(cells, weights=matrix.data, minlength=self.k * vocab_size).reshape(self.k, vocab_size)
+        counts = np.bincount(labels, minlength=self.k).astype(np.float64)
+
+        means = sums / np.maximum(counts, 1)[:, None]
+
+        if previous is not None:
+            means[counts == 0] = previous[counts == 0]
+
+        return means
+
+    def nearest_means(self, matrix, doc_norms):
+        """
+        :return: index of the nearest mean of every row, and the distances to it.
+        """
+
+        return assign_rows((matrix.data, matrix.indices, matrix.indptr, matrix.shape, doc_norms, self.means, None))
+
+    def mean_matrix(self):
+
+        return self.vocab, self.means[:, :len(self.vocab)]
+
+    def set_mean_matrix(self, vocab, means):
+
+        self.vocab = vocab
+        self.means = means
+
+    def classify(self, test_docs):
+
+        rows = [doc.document_terms() for doc in test_docs]
+        matrix = CsrMatrix.from_rows(rows, self.vocab, add=False)
+        # the norm counts the terms which are not in the vocabulary as well.
+        doc_norms = np.array([self.sqnorm(row) for row in rows])
+
+        labels = self.nearest_means(matrix, doc_norms)[0]
+
+        return [self.topics[i] for i in labels]
+
+    def error(self, documents=None):
+        """
+        Sum of the distances of the training documents to the means of their clusters.
+        """
+
+        mean_norms = (self.means ** 2).sum(axis=1)
+        products = self.matrix.dot(self.means.T)[np.arange(len(self.labels)), self.labels]
+        sq_distances = self.doc_norms + mean_norms[self.labels] - 2.0 * products
+
+        return float(np.sqrt(np.maximum(sq_distances, 0.0)).sum())
+
+
+def assign_rows(args):
+    """
+    Assign the rows of a CSR matrix to their nearest means. This runs in the worker processes.
+    :param args: data, indices and indptr arrays, shape, squared row norms, the means, and a boolean array of the means
+    which rows can be assigned to, None for all of them
+    :return: nearest mean of every row, and the distances to it
+    """
+
+    data, indices, indptr, shape, doc_norms, means, active = args
+    matrix = CsrMatrix(data, indices, indptr, shape)
+
+    mean_norms = (means ** 2).sum(axis=1)
+    sq_distances = doc_norms[:, None] + mean_norms[None, :] - 2.0 * matrix.dot(means.T)
+
+    if active is not None:
+        sq_distances[:, ~active] = np.inf
+    labels = np.argmin(sq_distances, axis=1)
+    distances = np.sqrt(np.maximum(sq_distances[np.arange(len(labels)), labels], 0.0))
+
+    return labels, distances
+
+
+class MiniBatchKMeans(SparseKMeans):
+    """
+    Mini-batch k-means for corpora which do not fit in memory. Documents are streamed in batches, every batch is
+    assigned to the nearest means (optionally split over a process pool), and each mean moves towards its batch
+    documents with its own learning rate, n / N for n batch documents and N documents assigned to it so far, so every
+    mean is the running mean of its documents. A cluster is seeded by the first documents of its topic, documents are
+    not assigned to the clusters which are not seeded yet, so the batches may come sorted by topic. Telemetry of every
+    batch is kept in self.batch_stats.
+    """
+
+    def __init__(self, topics, batch_size=256, epochs=1, tol=1e-4, workers=1):
+        SparseKMeans.__init__(self, topics, tol=tol)
+        self.batch_size = batch_size
+        self.epochs = epochs
+        self.workers = workers
+        # documents assigned to every cluster while training, None for a loaded model, whose means are all used.
+        self.cluster_counts = None
+
+    def train(self, docs):
+        """
+        :param docs: iterable of labeled documents. A generator is read once, a list is read up to self.epochs times.
+        The first batch initializes the means with the mean of each topic.
+        """
+
+        self.reset()
+
+        pool = Pool(self.workers) if self.workers > 1 else None
+
+        try:
+            for epoch in range(self.epochs):
+                for batch in batched(docs, self.batch_size):
+                    self.partial_fit(batch, pool)
+
+                    if self.converged:
+                        return
+
+                if not isinstance(docs, (list, tuple)):
+                    break
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    def reset(self):
+        """
+        Forget the means, the next batch of partial_fit() initializes them again.
+        """
+
+        self.vocab = Vocabulary()
+        self.means = None
+        self.cluster_counts = np.zeros(self.k)
+        self.batch_stats = []
+        self.converged = False
+
+    def partial_fit(self, batch, pool=None):
+        """
+        Update the means with one batch of documents.
+        """
+
+        self.version += 1
+        rows = [doc.document_terms() for doc in batch]
+        matrix = CsrMatrix.from_rows(rows, self.vocab)
+        doc_norms = matrix.row_sums(matrix.data ** 2)
+        self.grow_means(len(self.vocab))
+
+        topic_labels = np.array([self.topics.index(doc.topic) for doc in batch], dtype=np.int64)
+
+        if self.cluster_counts.sum() == 0:
+            labels, distances = topic_labels, np.zeros(len(batch))
+        else:
+            labels, distances = self.assign(matrix, doc_norms, pool)
+
+            # a cluster which has no documents yet is seeded with the documents of its topic.
+            unseeded = (self.cluster_counts == 0)[topic_labels]
+            labels[unseeded] = topic_labels[unseeded]
+
+        previous = self.means.copy()
+
+        vocab_size = self.means.shape[1]
+        cells = labels[matrix.row_ids()] * vocab_size + matrix.indices
+        sums = np.bincount(cells, weights=matrix.data, minlength=self.k * vocab_size).reshape(self.k, vocab_size)
+        batch_counts = np.bincount(labels, minlength=self.k).astype(np.float64)
+
+        # m = m + (sum - n * m) / N, which is the running mean of all the documents assigned to the cluster so far.
+        self.cluster_counts += batch_counts
+        updated = batch_counts > 0
+        rates = batch_counts[updated] / self.cluster_counts[updated]
+        self.means[updated] = (self.means[updated] * (1 - rates)[:, None] +
+                               sums[updated] / self.cluster_counts[updated][:, None])
+
+        shift = float(((self.means - previous) ** 2).sum())
+
+        self.batch_stats.append({
+            'batch': len(self.batch_stats),
+            'size': len(batch),
+            'inertia': float(distances.sum()),
+            'center_shift': shift,
+            'batch_cluster_sizes': dict(zip(self.topics, batch_counts.astype(int).tolist())),
+            'cluster_sizes': dict(zip(self.topics, self.cluster_counts.astype(int).tolist()))
+        })
+
+        self.converged = len(self.batch_stats) > 1 and shift <= self.tol
+
+    def grow_means(self, vocab_size):
+        """
+        Add zero columns for the new terms, doubling the capacity when needed.
+        """
+
+        if self.means is None:
+            self.means = np.zeros((self.k, max(vocab_size, 1)))
+        elif vocab_size > self.means.shape[1]:
+            grown = np.zeros((self.k, max(vocab_size, 2 * self.means.shape[1])))
+            grown[:, :self.means.shape[1]] = self.means
+            self.means = grown
+
+    def nearest_means(self, matrix, doc_norms):
+
+        return self.assign(matrix, doc_norms)
+
+    def assign(self, matrix, doc_norms, pool=None):
+        """
+        :return: index of the nearest seeded mean of every row, and the distances to it.
+        """
+
+        # the means of the clusters without documents are zero, they would attract the short documents.
+        seeded = self.cluster_counts > 0 if self.cluster_counts is not None else None
+
+        if pool is None or self.workers < 2:
+            return assign_rows((matrix.data, matrix.indices, matrix.indptr, matrix.shape, doc_norms, self.means,
+                                seeded))
+
+        tasks = []
+        step = int(math.ceil(matrix.shape[0] * 1.0 / self.workers))
+
+        for start in range(0, matrix.shape[0], step):
+            end = min(start + step, matrix.shape[0])
+            lo, hi = matrix.indptr[start], matrix.indptr[end]
+            tasks.append((matrix.data[lo:hi], matrix.indices[lo:hi], matrix.indptr[start:end + 1] - lo,
+                          (end - start, matrix.shape[1]), doc_norms[start:end], self.means, seeded))
+
+        results = pool.map(assign_rows, tasks)
+
+        return np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results])
+
+    def error(self, documents=None):
+        """
+        Sum of the distances of the documents to their nearest means. Without documents, the inertia of the last batch.
+        """
+
+        if documents is None:
+            return self.batch_stats[-1]['inertia'] if self.batch_stats else 0.0
+
+        error = 0.0
+
+        for batch in batched(documents, self.batch_size):
+            rows = [doc.document_terms() for doc in batch]
+            matrix = CsrMatrix.from_rows(rows, self.vocab, add=False)
+            doc_norms = np.array([self.sqnorm(row) for row in rows])
+            error += float(self.assign(matrix, doc_norms)[1].sum())
+
+        return error
@@ -5,45 +5,111 @@
 Problem Definition :
 
 This script implements KNN algorithm which provides methods to find k closest documents to the given document.
+The search can be made approximate by pruning the index (see lsh.py for an approximate alternative based on hashing).
 
 """
 
 __author__ = 'vivek'
 
 from tfidf import *
+import heapq
 
 
 class KNN(object):
 
-    def __init__(self, docs):
+    def __init__(self, docs, max_terms=None, max_postings=None):
+        """
+        :param docs: list of docs
+        :param max_terms: score only the target terms with the highest possible contribution to a score. None
+        scores all of them.
+        :param max_postings: keep only the postings with the highest weights of every term. None keeps all of them.
+        """
+
         self.docs = docs
+        self.max_terms = max_terms
+        self.max_postings = max_postings
+        self.index = self.create_index(self.docs)
+
+    def create_index(self, docs):
+        """
+        Create an inverted index in which each postings list contains (doc position, weight) pairs.
+        :param docs: list of docs
+        :return: A dict mapping from a term to its postings list.
+        """
+
+        index = defaultdict(lambda: list())
+
+        for i in range(len(docs)):
+            for term, weight in docs[i].vector.items():
+                if weight != 0:
+                    index[term].append((i, weight))
+
+        if self.max_postings is not None:
+            for term, postings in index.items():
+                postings.sort(key=lambda x: abs(x[1]), reverse=True)
+                del postings[self.max_postings:]
+
+        # the highest weight of the postings bounds the contribution of a term to any score.
+        if self.max_terms is not None:
+            self.max_weights = dict((term, max(abs(weight) for i, weight in postings))
+                                    for term, postings in index.items())
+
+        return index
+
+    def search_terms(self, target):
+        """
+        :return: list of the (term, weight) pairs of the target which are scored
+        """
+
+        index = self.index
+        terms = [(term, weight) for term, weight in target.vector.items() if weight != 0 and term in index]
+
+        if self.max_terms is None or len(terms) <= self.max_terms:
+            return terms
+
+        max_weights = self.max_weights
+
+        return heapq.nlargest(self.max_terms, terms, key=lambda x: abs(x[1]) * max_weights[x[0]])
+
+    def candidates(self, target):
+        """
+        :return: set of the positions of the docs which are scored for the target
+        """
+
+        index = self.index
+
+        return set(i for term, weight in self.search_terms(target) for i, doc_weight in index[term])
 
     def find_k_neighbours(self, target, k):
         """
         Find K nearest neighbours of given doc
-        :param docs: list of docs
         :param target: source doc
         :param k: parameter k
         :return: list of k nearest docs.
         """
-        distance_list = list()
-
-        # for each doc, find the similarity and update the distance list.
         docs = self.docs
-        if target in docs:
-            docs.remove(target)
+        index = self.index
+        scores = defaultdict(lambda: 0.0)
 
-        for i in range(len(docs)):
-            doc = docs[i]
-            distance_list.append((i, cosine_similarity(doc, target)))
+        # accumulate the similarity only for the docs which share at least one term with the target.
+        for term, weight in self.search_terms(target):
+            for i, doc_weight in index[term]:
+                scores[i] += weight * doc_weight
+
+        candidates = [(i, score) for i, score in scores.items() if docs[i] is not target]
 
-        # sort the list and pick top k results.
-        sorted_dist_list = sorted(distance_list, key=lambda x: x[1], reverse=True)
+        # pick top k results, ties are broken by the position of the doc.
+        top_k = heapq.nlargest(k, candidates, key=lambda x: (x[1], -x[0]))
 
-        k_neighbours = list()
+        k_neighbours = [docs[i] for i, score in top_k]
 
-        for i in range(k):
-            k_neighbours.append(docs[sorted_dist_list[i][0]])
+        # docs without any common term have zero similarity, fill the rest of the list with them in order.
+        if len(k_neighbours) < k:
+            for i in range(len(docs)):
+                if len(k_neighbours) == k:
+                    break
+                if i not in scores and docs[i] is not target:
+                    k_neighbours.append(docs[i])
 
         return k_neighbours
 
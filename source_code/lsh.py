@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script implements an approximate alternative of KNN, with random hyperplane locality sensitive hashing. Every
+table hashes a document vector to the signs of its projections on n_bits random hyperplanes, so documents with a small
+angle between them tend to fall into the same bucket. Only the documents in the buckets of the target (and in the
+neighbouring buckets, with probes) are scored exactly. More tables and probes find more of the true neighbours, more
+bits make the buckets smaller and the search faster.
+
+"""
+
+__author__ = 'vivek'
+
+import time
+import heapq
+import numpy as np
+from collections import defaultdict
+from sparse import Vocabulary
+from knn import KNN
+
+
+def dot(v1, v2):
+    """
+    :return: dot product of two sparse vectors, term weight dicts.
+    """
+
+    # iterate the vector with less terms.
+    if len(v2) < len(v1):
+        v1, v2 = v2, v1
+
+    return sum(weight * v2.get(term, 0) for term, weight in v1.items())
+
+
+class LSHIndex(object):
+
+    def __init__(self, docs, n_tables=16, n_bits=6, probes=2, seed=0):
+        """
+        :param docs: list of docs, their vectors are indexed.
+        :param n_tables: number of hash tables. More tables find more neighbours, at the cost of more candidates.
+        :param n_bits: number of hyperplanes per table, at most 62. More bits make smaller buckets.
+        :param probes: number of neighbouring buckets searched per table. The neighbours differ in one of the bits
+        whose projections are closest to zero.
+        :param seed: seed of the random hyperplanes
+        """
+
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.probes = probes
+        self.random = np.random.RandomState(seed)
+
+        # a random normal component of every hyperplane for every term, rows are drawn as new terms are seen. The first
+        # plane_count rows are drawn, the others are the spare capacity. Only the signs of the projections are used, so
+        # the rows are stored in single precision.
+        self.vocab = Vocabulary()
+        self.planes = np.zeros((0, n_tables * n_bits), dtype=np.float32)
+        self.plane_count = 0
+        self.bit_values = 1 << np.arange(n_bits, dtype=np.int64)
+
+        self.docs = list()
+        self.tables = [defaultdict(lambda: list()) for i in range(n_tables)]
+
+        self.add_documents(docs)
+
+    def add_documents(self, docs):
+        """
+        Add the docs to the index. Unlike KNN, nothing is rebuilt.
+        """
+
+        for doc in docs:
+            keys = self.hash_keys(self.projections(doc.vector, add=True))
+
+            for table, key in zip(self.tables, keys):
+                table[key].append(len(self.docs))
+
+            self.docs.append(doc)
+
+    def projections(self, vector, add=False):
+        """
+        :param vector: term weight dict
+        :param add: add the unknown terms to the vocabulary. Otherwise they are skipped, they do not change the
+        similarity to any indexed doc.
+        :return: array of the projections of the vector on all the hyperplanes
+        """
+
+        terms = [term for term, weight in vector.items() if weight != 0]
+        ids = self.vocab.ids(terms, add=add)
+
+        if add:
+            self.grow_planes(len(self.vocab))
+        else:
+            terms = [term for term in terms if term in self.vocab]
+
+        weights = np.array([vector[term] for term in terms], dtype=np.float64)
+
+        return weights.dot(self.planes[ids]) if ids else np.zeros(self.planes.shape[1])
+
+    def grow_planes(self, size):
+        """
+        Draw the rows of the new terms. The capacity is doubled when it is full, so the rows are not copied for every
+        new term.
+        """
+
+        if size <= self.plane_count:
+            return
+
+        if size > len(self.planes):
+            grown = np.zeros((max(size, 2 * len(self.planes)), self.planes.shape[1]), dtype=np.float32)
+            grown[:self.plane_count] = self.planes[:self.plane_count]
+            self.planes = grown
+
+        rows = self.random.standard_normal((size - self.plane_count, self.planes.shape[1]))
+        self.planes[self.plane_count:size] = rows
+        self.plane_count = size
+
+    def hash_keys(self, projections):
+        """
+        :return: bucket key of every table
+        """
+
+        bits = (projections > 0).reshape(self.n_tables, self.n_bits)
+
+        return bits.dot(self.bit_values).tolist()
+
+    def probe_keys(self, projections):
+        """
+        :return: bucket keys of every table to search, the key of the target first.
+        """
+
+        keys = self.hash_keys(projections)
+
+        if not self.probes:
+            return [[key] for key in keys]
+
+        # the bits with the smallest projections are the most likely to differ for a close doc.
+        margins = np.abs(projections).reshape(self.n_tables, self.n_bits)
+        flips = np.argsort(margins, axis=1)[:, :self.probes]
+
+        return [[keys[i]] + [keys[i] ^ int(self.bit_values[bit]) for bit in flips[i]] for i in range(self.n_tables)]
+
+    def candidates(self, target):
+        """
+        :return: set of the positions of the docs which share a probed bucket with the target
+        """
+
+        candidates = set()
+
+        for table, keys in zip(self.tables, self.probe_keys(self.projections(target.vector))):
+            for key in keys:
+                if key in table:
+                    candidates.update(table[key])
+
+        return candidates
+
+    def find_k_neighbours(self, target, k):
+        """
+        Find approximately K nearest neighbours of given doc
+        :param target: source doc
+        :param k: parameter k
+        :return: list of k nearest docs.
+        """
+
+        docs = self.docs
+        vector = target.vector
+
+        scores = [(i, dot(vector, docs[i].vector)) for i in self.candidates(target) if docs[i] is not target]
+
+        # pick top k results, ties are broken by the position of the doc, like KNN.
+        top_k = heapq.nlargest(k, scores, key=lambda x: (x[1], -x[0]))
+
+        k_neighbours = [docs[i] for i, score in top_k]
+
+        # fill the rest of the list with the other docs in order, when there are not enough candidates.
+        if len(k_neighbours) < k:
+            found = set(i for i, score in scores)
+
+            for i in range(len(docs)):
+                if len(k_neighbours) == k:
+                    break
+                if i not in found and docs[i] is not target:
+                    k_neighbours.append(docs[i])
+
+        return k_neighbours
+
+    def stats(self):
+        """
+        :return: dict of the number of docs, buckets and the mean bucket size
+        """
+
+        buckets = sum(len(table) for table in self.tables)
+
+        return {
+            'docs': len(self.docs),
+            'buckets': buckets,
+            'mean_bucket_size': float(len(self.docs) * self.n_tables) / buckets if buckets else 0.0
+        }
+
+
+def recall_at_k(index, targets, k, exact=None):
+    """
+    Measure the recall of an approximate index against the exact KNN.
+    :param index: LSHIndex, or a pruned KNN
+    :param targets: list of docs to search for
+    :param k: parameter k
+    :param exact: KNN of the same docs, created if not given
+    :return: dict of the mean recall@k, the mean number of scored candidates and the mean search times in seconds
+    """
+
+    if exact is None:
+        exact = KNN(index.docs)
+
+    recall, candidate_count, index_time, exact_time = 0.0, 0, 0.0, 0.0
+
+    for target in targets:
+        start_time = time.time()
+        approximate = index.find_k_neighbours(target, k)
+        index_time += time.time() - start_time
+
+        start_time = time.time()
+        true_neighbours = exact.find_k_neighbours(target, k)
+        exact_time += time.time() - start_time
+
+        # docs are compared by identity, the same doc may be in the list of both.
+        true_ids = set(id(doc) for doc in true_neighbours)
+        recall += float(sum(1 for doc in approximate if id(doc) in true_ids)) / max(len(true_neighbours), 1)
+        candidate_count += len(index.candidates(target))
+
+    n = max(len(targets), 1)
+
+    return {
+        'recall': recall / n,
+        'candidates': float(candidate_count) / n,
+        'index_time': index_time / n,
+        'exact_time': exact_time / n
+    }
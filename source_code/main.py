@@ -12,20 +12,32 @@ where 'n' and 'm' are user selected.
 
 __author__ = 'vivek'
 
-import time
 import os
+import time
+import argparse
+import functools
 from nb import NaiveBayes
-from rank_classifier import RankClassifier
+from classifiers import create_classifiers
+from recommender import Recommender
 from knn import KNN
+from lsh import LSHIndex
+from neighbours import NeighbourTable
 import random
-from document import Document
-from tfidf import Index
-from kmeans import KMeans
+from corpus import read_corpus, iter_corpus, list_topics, iter_articles
+from article_store import ArticleStore
+from token_cache import TokenCache
+from document import TokenPipeline, article_id
+from model_io import ModelMismatchError, fingerprint
+from hashing import FeatureHasher
+from tfidf import Index, SparseIndex
+from kmeans import MiniBatchKMeans
 from util import *
-from collections import defaultdict, Counter
+import instrument
+import crossval
 
 
-def recommendation(all_docs, test_docs, classifier_list):
+def recommendation(all_docs, test_docs, classifier_list, pipeline=None, knn_factory=KNN, concurrent=False, budget=None,
+                   neighbour_table=None, index=None):
 
     print("Recommendation System")
     print("---------------------")
@@ -49,6 +61,10 @@ def recommendation(all_docs, test_docs, classifier_list):
         print("Invalid Choice.. By default selected 5.")
         k_n = 5
 
+    # the same articles are often selected again, their recommendations are cached.
+    recommender = Recommender(all_docs, classifier_list, pipeline, index, cache_size=1024, knn_factory=knn_factory,
+                              concurrent=concurrent, budget=budget, neighbour_table=neighbour_table)
+
     end = False
 
     # run the loop until user quits.
@@ -84,25 +100,8 @@ def recommendation(all_docs, test_docs, classifier_list):
                     continue
                 selected_doc = user_docs[user_choice]
 
-                # classifiers are sorted according to their f_measure in decreasing order. It helps when all
-                # three classifiers differ in their predictions.
-                classifier_list = sorted(classifier_list, key=lambda cl: cl.stats['f_measure'], reverse=True)
-
-                prediction_list = list()
-                for classifier in classifier_list:
-                    prediction_list.append(classifier.classify([selected_doc])[0])
-
-                prediction_count = Counter(prediction_list)
-                top_prediction = prediction_count.most_common(1)
-
-                if top_prediction[0][1] > 1:
-                    prediction = top_prediction[0][0]
-                else:
-                    prediction = prediction_list[0]
-
-                # create knn instance using documents of predicted topic. and find k closest documents.
-                knn = KNN(all_docs[prediction])
-                k_neighbours = knn.find_k_neighbours(selected_doc, k_n)
+                # predict the topic of the document, and find k closest documents of that topic.
+                k_neighbours = recommender.recommend(selected_doc, k_n)
 
                 while True:
                     print("\nRecommended Articles for : " + selected_doc.title)
@@ -131,44 +130,105 @@ def recommendation(all_docs, test_docs, classifier_list):
                         print("\nArticle Text for recommended title : " + k_neighbours[n_choice].title)
                         print(text)
 
+    recommender.ensemble.close()
 
-def main():
+    # how the topics of the selected articles were decided by the ensemble.
+    paths = recommender.ensemble.stats()['paths']
+    print("\nEnsemble: " + ", ".join("{} {}".format(path, paths[path]) for path in recommender.ensemble.paths))
 
-    start_time = time.time()
 
-    # Read documents, divide according to the topics and separate train and test data-set.
+def create_hasher(hash_bits, signed_hash=True):
+    """
+    :return: FeatureHasher of hash_bits bits, None if hash_bits is not set.
+    """
 
-    t_path = "../dataset/bbc/"
+    return FeatureHasher(hash_bits, signed_hash) if hash_bits else None
 
-    all_docs = defaultdict(lambda: list())
 
-    topic_list = list()
+def model_path(model_dir, name):
+    """
+    :return: path of the model file in the model directory, None if models are not saved.
+    """
 
-    print("Reading all the documents...\n")
+    if not model_dir:
+        return None
+
+    if not os.path.isdir(model_dir):
+        os.makedirs(model_dir)
+
+    return os.path.join(model_dir, name + '.model')
 
-    for topic in os.listdir(t_path):
-        d_path = t_path + topic + '/'
-        topic_list.append(topic)
-        temp_docs = list()
 
-        for f in os.listdir(d_path):
-            f_path = d_path + f
-            temp_docs.append(Document(f_path, topic))
+def open_article_store(path, t_path):
+    """
+    Open the article store, and append the articles of the corpus which are not stored yet, or whose content changed.
+    :return: ArticleStore, to be closed by the caller
+    """
 
-        all_docs[topic] = temp_docs[:]
+    store = ArticleStore(path)
+    added = store.add_articles(iter_articles(t_path))
+
+    if added:
+        print("Added or updated {} articles in the article store.\n".format(added))
+        store.save()
+
+    return store
+
+
+def prepare_models(index_backend='dict', workers=1, chunk_size=16, seed=None, token_cache=None, normalize='lemmatize',
+                   compact=False, kmeans_backend='loop', model_dir=None, t_path="../dataset/bbc/", hash_bits=None,
+                   signed_hash=True, article_store=None):
+    """
+    Read the documents, index them, and train and test the classifiers, or load them from the model directory.
+    :param t_path: path of the corpus directory, or of a zip archive of it
+    :param hash_bits: hash the terms into 2^hash_bits features, None keeps the terms
+    :param signed_hash: give the hashed terms signs
+    :param article_store: ArticleStore the documents read their text from, see open_article_store. None keeps the text
+    in memory.
+    :return: dict of (topic, list of documents), list of test documents, list of classifiers, the token pipeline, the
+    index of the training documents and their fingerprint
+    """
+
+    random.seed(seed)
+
+    # Read documents, divide according to the topics and separate train and test data-set.
+
+    print("Reading all the documents...\n")
+
+    pipeline = TokenPipeline(normalize, hasher=create_hasher(hash_bits, signed_hash))
+    cache = TokenCache(token_cache, pipeline.config) if token_cache else None
+    all_docs, topic_list = read_corpus(t_path, workers, chunk_size, cache, pipeline, compact, article_store)
 
     fold_count = 10
 
     train_docs, test_docs = list(), list()
 
-    for key, value in all_docs.items():
+    for topic in topic_list:
+        value = all_docs[topic]
         random.shuffle(value)
         test_len = int(len(value)/fold_count)
         train_docs += value[:-test_len]
         test_docs += value[-test_len:]
 
+    # the saved models are loaded only for the same training docs in the same order.
+    train_fingerprint = fingerprint([article_id(doc.topic, doc.f_path) for doc in train_docs], seed)
+
     # Create tfidf and tfidfie index of training docs, and store into the docs.
-    index = Index(train_docs)
+    index_class = SparseIndex if index_backend == 'csr' else Index
+    index_path = model_path(model_dir, index_class.__name__)
+    index = None
+
+    if index_path and os.path.exists(index_path):
+        try:
+            index = index_class.load(index_path, train_docs, train_fingerprint)
+        except ModelMismatchError as e:
+            print(str(e) + ", indexing again.\n")
+
+    if index is None:
+        index = index_class(train_docs)
+
+        if index_path:
+            index.save(index_path, train_fingerprint)
 
     print("Train Document Count: " + str(len(train_docs)))
     print("Test  Document Count: " + str(len(test_docs)))
@@ -182,23 +242,32 @@ def main():
         doc.vector = doc.tf
 
     # create classifier instances.
-    nb = NaiveBayes()
-    rc = RankClassifier()
-    kmeans = KMeans(topic_list)
-    
-    classifier_list = [rc, nb, kmeans]
+    classifier_list = create_classifiers(topic_list, kmeans_backend, pipeline.hasher, workers)
 
     for i in range(len(classifier_list)):
 
         print("\nClassifier #" + str(i+1) + "\n")
 
         classifier = classifier_list[i]
+        classifier_path = model_path(model_dir, type(classifier).__name__)
 
-        classifier.confusion_matrix, c_dict = init_confusion_matrix(topic_list)
+        loaded = False
+
+        if classifier_path and os.path.exists(classifier_path):
+            print("Loading the trained model...\n")
+
+            try:
+                classifier = classifier_list[i] = type(classifier).load(classifier_path, train_fingerprint)
+                loaded = True
+            except ModelMismatchError as e:
+                print(str(e) + ".\n")
 
-        print("Training...\n")
+        if not loaded:
+            print("Training...\n")
 
-        classifier.train(train_docs)
+            classifier.train(train_docs)
+
+        classifier.confusion_matrix, c_dict = init_confusion_matrix(topic_list)
 
         print("Testing... Classifying the test docs...\n")
 
@@ -217,11 +286,333 @@ def main():
         print("\nStatistics\n")
         print_table(get_stats_table(classifier.stats))
 
-    print("Run time...{} secs \n".format(round(time.time() - start_time, 4)))
+        # the model is saved with its statistics, which order the classifiers of the recommender.
+        if classifier_path and not loaded:
+            classifier.save(classifier_path, train_fingerprint)
+
+    return all_docs, test_docs, classifier_list, pipeline, index, train_fingerprint
+
+
+def train_stream(t_path="../dataset/bbc/", token_cache=None, normalize='lemmatize', compact=False, batch_size=256,
+                 model_dir=None, hash_bits=None, signed_hash=True):
+    """
+    Train and test the classifiers which learn incrementally, naive bayes and mini-batch k-means, in two passes over
+    the stream of documents. Only one batch of documents is in memory at a time. Every 10th document is held out for
+    testing.
+    :param batch_size: number of documents per batch
+    :return: list of the classifiers
+    """
+
+    fold_count = 10
+
+    pipeline = TokenPipeline(normalize, hasher=create_hasher(hash_bits, signed_hash))
+    cache = TokenCache(token_cache, pipeline.config) if token_cache else None
+
+    topic_list = list_topics(t_path)
+
+    nb = NaiveBayes(pipeline.hasher)
+    kmeans = MiniBatchKMeans(topic_list, batch_size)
+    kmeans.reset()
+
+    print("Training...\n")
+
+    for batch in batched(enumerate(iter_corpus(t_path, pipeline, cache, compact)), batch_size):
+        train_docs = [doc for i, doc in batch if i % fold_count != 0]
+
+        nb.partial_fit(train_docs)
+        kmeans.partial_fit(train_docs)
+
+    print("Train Document Count: " + str(nb.doc_count))
+    print("Term Count: " + str(nb.vocab_count))
+
+    print("\nTesting... Classifying the test docs...\n")
+
+    classifier_list = [nb, kmeans]
+    confusion_matrices = [init_confusion_matrix(topic_list)[0] for classifier in classifier_list]
+    c_dict = init_confusion_matrix(topic_list)[1]
 
-    # call recommendation system once classifiers are ready.
-    recommendation(all_docs, test_docs, classifier_list)
+    for batch in batched(enumerate(iter_corpus(t_path, pipeline, cache, compact)), batch_size):
+        test_docs = [doc for i, doc in batch if i % fold_count == 0]
+        test_topics = [doc.topic for doc in test_docs]
+
+        for classifier, confusion_matrix in zip(classifier_list, confusion_matrices):
+            update_confusion_matrix(test_topics, classifier.classify(test_docs), confusion_matrix, c_dict)
+
+    for classifier, confusion_matrix in zip(classifier_list, confusion_matrices):
+        print("\n" + type(classifier).__name__ + "\n")
+
+        classifier.confusion_matrix = confusion_matrix
+        classifier.stats = cal_stats(confusion_matrix)
+
+        print("Confusion Matrix\n")
+        for item in classifier.confusion_matrix:
+            print(item)
+
+        print("\nStatistics\n")
+        print_table(get_stats_table(classifier.stats))
+
+        classifier_path = model_path(model_dir, type(classifier).__name__)
+
+        if classifier_path:
+            classifier.save(classifier_path)
+
+    return classifier_list
+
+
+def cross_validation(fold_count=10, index_backend='dict', workers=1, chunk_size=16, seed=None, token_cache=None,
+                     normalize='lemmatize', compact=False, kmeans_backend='loop', t_path="../dataset/bbc/",
+                     hash_bits=None, signed_hash=True):
+    """
+    Read the documents, and run the k-fold cross-validation of the classifiers, with the folds in parallel processes.
+    :return: report of crossval.cross_validate
+    """
+
+    print("Reading all the documents...\n")
+
+    pipeline = TokenPipeline(normalize, hasher=create_hasher(hash_bits, signed_hash))
+    cache = TokenCache(token_cache, pipeline.config) if token_cache else None
+
+    all_docs, topic_list = read_corpus(t_path, workers, chunk_size, cache, pipeline, compact)
+
+    print("Running {} folds in {} processes...".format(fold_count, min(workers, fold_count)))
+
+    start_time = time.time()
+    report, fold_times = crossval.cross_validate(all_docs, topic_list, fold_count, workers, seed, index_backend,
+                                                 kmeans_backend, pipeline.hasher)
+
+    crossval.print_report(report)
+
+    print("\nRun time...{} secs, {} secs per fold \n".format(round(time.time() - start_time, 4),
+                                                              round(sum(fold_times) / len(fold_times), 4)))
+
+    return report
+
+
+def prepare_neighbours(all_docs, path, k=20, workers=1, train_fingerprint=None):
+    """
+    Load the neighbour table from the file and add the new documents to it, or compute it and save it into the file.
+    :param train_fingerprint: fingerprint of the training documents which weighed the vectors, the table is computed
+    again if it was saved for others.
+    :return: NeighbourTable
+    """
+
+    if os.path.exists(path):
+        try:
+            table = NeighbourTable.load(path, train_fingerprint)
+        except ModelMismatchError as e:
+            print(str(e) + ", computing the neighbour table again.\n")
+            table = None
+
+        if table is not None and table.k == k:
+            added = table.refresh(all_docs, workers)
+
+            if added:
+                print("Updated {} documents of the neighbour table.\n".format(added))
+                table.save(path, train_fingerprint)
+
+            return table
+
+    print("Computing the neighbour table...\n")
+
+    table = NeighbourTable.build(all_docs, k, workers=workers)
+    table.save(path, train_fingerprint)
+
+    return table
+
+
+def main(knn_factory=KNN, concurrent=False, budget=None, neighbour_path=None, neighbour_k=20, article_store=None,
+         **options):
+
+    start_time = time.time()
+
+    store = open_article_store(article_store, options['t_path']) if article_store else None
+
+    try:
+        all_docs, test_docs, classifier_list, pipeline, index, train_fingerprint = prepare_models(article_store=store,
+                                                                                                  **options)
+
+        table = prepare_neighbours(all_docs, neighbour_path, neighbour_k, options.get('workers', 1),
+                                   train_fingerprint) if neighbour_path else None
+
+        print("Run time...{} secs \n".format(round(time.time() - start_time, 4)))
+
+        # call recommendation system once classifiers are ready.
+        recommendation(all_docs, test_docs, classifier_list, pipeline, knn_factory, concurrent, budget, table, index)
+    finally:
+        if store is not None:
+            store.close()
+
+
+def add_model_arguments(parser):
+    """
+    Add the options of prepare_models to the argument parser.
+    """
+
+    parser.add_argument('--corpus', default="../dataset/bbc/",
+                        help="path of the corpus directory, or of a zip archive of it like ../data_set/bbc.zip, which "
+                             "is read without extracting it.")
+    parser.add_argument('--index', dest='index_backend', choices=['dict', 'csr'], default='dict',
+                        help="backend of the tfidf/tfidfie index. 'csr' keeps the weights in numpy CSR arrays.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of processes used to tokenize the documents, to build the rank classifier topic "
+                             "indexes and to assign mini-batch k-means clusters.")
+    parser.add_argument('--chunk-size', type=int, default=16,
+                        help="number of documents sent to a tokenizer process at once.")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="seed of the train/test split, to make the results reproducible.")
+    parser.add_argument('--token-cache', default=None,
+                        help="file of cached document tokens. Unchanged documents are not tokenized again.")
+    parser.add_argument('--normalize', choices=TokenPipeline.modes, default='lemmatize',
+                        help="token normalization: no normalization, stemmer, lemmatizer or both.")
+    parser.add_argument('--compact', action='store_true',
+                        help="keep the documents as token id arrays and read the article text from disk on demand.")
+    parser.add_argument('--kmeans', dest='kmeans_backend', choices=['loop', 'sparse', 'minibatch'],
+                        default='loop',
+                        help="k-means implementation. 'sparse' computes the distances as sparse matrix products and "
+                             "trains until convergence, 'minibatch' streams the documents in batches.")
+    parser.add_argument('--model-dir', default=None,
+                        help="directory of the trained models. Missing models are trained and saved into it, existing "
+                             "ones are loaded instead of training them. Use with the same --seed.")
+    parser.add_argument('--hash-bits', type=int, default=None,
+                        help="hash the terms into 2^N features, so the size of the models does not grow with the "
+                             "vocabulary. Use the same value with --model-dir.")
+    parser.add_argument('--unsigned-hash', dest='signed_hash', action='store_false',
+                        help="do not give the hashed terms random signs.")
+    parser.add_argument('--article-store', default=None,
+                        help="file of the packed article texts. It is created from the corpus if it does not exist, "
+                             "and the new or changed articles are appended to it otherwise. The documents read their "
+                             "text from it.")
+
+
+def model_options(args):
+    """
+    :return: keyword arguments of prepare_models from the parsed arguments
+    """
+
+    return dict(index_backend=args.index_backend, workers=args.workers, chunk_size=args.chunk_size, seed=args.seed,
+                token_cache=args.token_cache, normalize=args.normalize, compact=args.compact,
+                kmeans_backend=args.kmeans_backend, model_dir=args.model_dir, t_path=args.corpus,
+                hash_bits=args.hash_bits, signed_hash=args.signed_hash, article_store=args.article_store)
+
+
+def add_knn_arguments(parser):
+    """
+    Add the options of the nearest neighbour search to the argument parser.
+    """
+
+    parser.add_argument('--knn', choices=['exact', 'pruned', 'lsh'], default='exact',
+                        help="nearest neighbour search. 'pruned' scores only the strongest terms and postings, 'lsh' "
+                             "scores only the docs in the same random hyperplane hash buckets.")
+    parser.add_argument('--max-terms', type=int, default=20,
+                        help="number of target terms scored by the pruned search.")
+    parser.add_argument('--max-postings', type=int, default=100,
+                        help="number of postings kept per term by the pruned search.")
+    parser.add_argument('--lsh-tables', type=int, default=16,
+                        help="number of lsh hash tables.")
+    parser.add_argument('--lsh-bits', type=int, default=6,
+                        help="number of hyperplanes of a lsh hash table.")
+    parser.add_argument('--lsh-probes', type=int, default=2,
+                        help="number of neighbouring lsh buckets searched per table.")
+    parser.add_argument('--neighbours', dest='neighbour_path', default=None,
+                        help="file of the precomputed neighbour table. It is computed if it does not exist, and the "
+                             "new documents are added to it otherwise. Use with --model-dir and the same --seed.")
+    parser.add_argument('--neighbours-k', dest='neighbour_k', type=int, default=20,
+                        help="number of precomputed neighbours per document.")
+
+
+def add_ensemble_arguments(parser):
+    """
+    Add the options of the ensemble of the classifiers to the argument parser.
+    """
+
+    parser.add_argument('--concurrent-ensemble', action='store_true',
+                        help="run the classifiers of the ensemble concurrently in threads, instead of one after the "
+                             "other until a majority agrees.")
+    parser.add_argument('--latency-budget', type=float, default=None,
+                        help="milliseconds the concurrent ensemble waits for a majority, before it falls back to the "
+                             "best classifier, which is always waited for. By default it waits for all the "
+                             "classifiers.")
+
+
+def ensemble_options(args):
+    """
+    :return: keyword arguments of the ensemble from the parsed arguments
+    """
+
+    budget = args.latency_budget / 1000.0 if args.latency_budget is not None else None
+
+    return dict(concurrent=args.concurrent_ensemble, budget=budget)
+
+
+def neighbour_options(args):
+    """
+    :return: keyword arguments of the neighbour table from the parsed arguments
+    """
+
+    return dict(neighbour_path=args.neighbour_path, neighbour_k=args.neighbour_k)
+
+
+def knn_factory(args):
+    """
+    :return: function which creates the nearest neighbour index of a list of documents from the parsed arguments
+    """
+
+    if args.knn == 'pruned':
+        return functools.partial(KNN, max_terms=args.max_terms, max_postings=args.max_postings)
+
+    if args.knn == 'lsh':
+        return functools.partial(LSHIndex, n_tables=args.lsh_tables, n_bits=args.lsh_bits, probes=args.lsh_probes)
+
+    return KNN
 
 
 if __name__ == '__main__':
-    main()
+
+    parser = argparse.ArgumentParser(description="News recommendation system.")
+    add_model_arguments(parser)
+    add_knn_arguments(parser)
+    add_ensemble_arguments(parser)
+    parser.add_argument('--metrics', default=None,
+                        help="instrument the hot paths and write the timings and the counters to the file at exit, in "
+                             "the Prometheus text format if the file name ends with .prom, as JSON otherwise. The "
+                             "articles tokenized by the --workers processes are neither timed nor counted.")
+    parser.add_argument('--profile', default=None,
+                        help="profile the run with cProfile and dump the statistics to the file at exit.")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="trace the memory peak of every instrumented stage with tracemalloc (python 3.9+).")
+    parser.add_argument('--stream', action='store_true',
+                        help="only train and test naive bayes and mini-batch k-means, streaming the documents in "
+                             "batches of --batch-size, for corpora which do not fit in memory.")
+    parser.add_argument('--batch-size', type=int, default=256,
+                        help="number of documents per batch of --stream.")
+    parser.add_argument('--folds', type=int, default=None,
+                        help="only evaluate the classifiers with k-fold cross-validation, the folds run in --workers "
+                             "processes.")
+    args = parser.parse_args()
+
+    instrumented = args.metrics or args.profile or args.trace_memory
+
+    if instrumented:
+        instrument.install(profile=args.profile is not None, trace_memory=args.trace_memory)
+
+    try:
+        if args.folds:
+            options = model_options(args)
+            del options['model_dir'], options['article_store']
+            cross_validation(args.folds, **options)
+        elif args.stream:
+            train_stream(args.corpus, args.token_cache, args.normalize, args.compact, args.batch_size, args.model_dir,
+                         args.hash_bits, args.signed_hash)
+        else:
+            options = dict(model_options(args), **ensemble_options(args))
+            options.update(neighbour_options(args))
+            main(knn_factory=knn_factory(args), **options)
+    finally:
+        if instrumented:
+            instrument.uninstall()
+            instrument.registry.print_summary()
+
+            if args.metrics:
+                instrument.registry.save(args.metrics)
+            if args.profile:
+                instrument.registry.save_profile(args.profile)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script defines the on-disk format of the trained models. A model file is an array file (see arrayfile.py) of
+flat numpy arrays plus string tables, e.g. the vocabulary, with the model name and the format version in the header,
+so a model is loaded by memory-mapping the file instead of training it again. The header can hold a fingerprint of the
+training documents, so a model is not loaded for other documents.
+
+"""
+
+__author__ = 'vivek'
+
+import hashlib
+import numbers
+import numpy as np
+from arrayfile import read_arrays, write_arrays, pack_strings, unpack_strings
+
+MODEL_FORMAT = 'nrs-model'
+MODEL_VERSION = 1
+
+
+class ModelMismatchError(ValueError):
+    """
+    The model file was trained on other documents than the ones it is loaded for.
+    """
+
+
+def fingerprint(doc_ids, seed=None):
+    """
+    :param doc_ids: ids of the training documents, in the training order
+    :param seed: seed of the train/test split
+    :return: hex digest of the ids and the seed
+    """
+
+    digest = hashlib.sha1(str(seed).encode('utf-8'))
+
+    for doc_id in doc_ids:
+        digest.update(b'\n' + doc_id.encode('utf-8'))
+
+    return digest.hexdigest()
+
+
+def save_model(path, model_name, arrays, meta=None, strings=None, fingerprint=None):
+    """
+    Write the model file.
+    :param path: path of the file
+    :param model_name: name of the model class
+    :param arrays: dict of (name, numpy array)
+    :param meta: json serializable dict, e.g. statistics of the model
+    :param strings: dict of (name, list of strings), e.g. the vocabulary. The vocabulary of hashed features is a list
+    of integers, which is stored as an array.
+    :param fingerprint: fingerprint of the training documents, see fingerprint()
+    """
+
+    arrays = dict(arrays)
+
+    for name, values in (strings or dict()).items():
+        if values and all(isinstance(value, numbers.Integral) for value in values):
+            arrays[name + '.ints'] = np.array(values, dtype=np.int64)
+        else:
+            arrays[name + '.offsets'], arrays[name + '.blob'] = pack_strings(values)
+
+    header = {'format': MODEL_FORMAT, 'version': MODEL_VERSION, 'model': model_name, 'meta': meta or dict(),
+              'fingerprint': fingerprint}
+
+    write_arrays(path, arrays, header)
+
+
+def load_model(path, model_name, use_mmap=True, fingerprint=None):
+    """
+    Read the model file.
+    :param path: path of the file
+    :param model_name: expected name of the model class
+    :param use_mmap: memory-map the arrays instead of reading them
+    :param fingerprint: expected fingerprint of the training documents, None accepts any model.
+    :return: meta dict, dict of (name, numpy array) and dict of (name, list of strings)
+    """
+
+    header, arrays = read_arrays(path, use_mmap)
+
+    if header.get('format') != MODEL_FORMAT or header.get('model') != model_name:
+        raise ValueError("{} is not a {} model file".format(path, model_name))
+
+    if header.get('version') != MODEL_VERSION:
+        raise ValueError("Unsupported model version {}: {}".format(header.get('version'), path))
+
+    if fingerprint is not None and header.get('fingerprint') != fingerprint:
+        raise ModelMismatchError("{} was trained on other documents or another split".format(path))
+
+    strings = dict()
+
+    for name in list(arrays.keys()):
+        if name.endswith('.offsets'):
+            key = name[:-len('.offsets')]
+            strings[key] = unpack_strings(arrays.pop(name), arrays.pop(key + '.blob'))
+        elif name.endswith('.ints'):
+            strings[name[:-len('.ints')]] = arrays.pop(name).tolist()
+
+    return header['meta'], arrays, strings
+
+
+def stats_to_meta(stats):
+    """
+    :return: the statistics dict of a classifier in a json serializable form
+    """
+
+    return dict(stats) if stats else None
+
+
+def dicts_to_matrix(dicts, vocab, dtype=np.float64):
+    """
+    Convert a list of (term, value) dicts to a dense array of shape (len(dicts), len(vocab)). Terms which are not in
+    the vocabulary are skipped if their value is 0, ValueError is raised otherwise.
+    """
+
+    matrix = np.zeros((len(dicts), len(vocab)), dtype=dtype)
+
+    for i in range(len(dicts)):
+        for term, value in dicts[i].items():
+            j = vocab.get(term)
+
+            if j is None:
+                if value != 0:
+                    raise ValueError("Term {!r} is not in the vocabulary".format(term))
+                continue
+
+            matrix[i, j] = value
+
+    return matrix
+
+
+def matrix_to_dicts(matrix, terms):
+    """
+    Inverse of dicts_to_matrix, zero values are left out.
+    """
+
+    dicts = list()
+
+    for row in matrix:
+        non_zero = np.nonzero(row)[0]
+        dicts.append(dict(zip([terms[i] for i in non_zero], row[non_zero].tolist())))
+
+    return dicts
@@ -12,12 +12,36 @@ __author__ = 'vivek'
 
 import operator
 import math
-from collections import defaultdict
+import numpy as np
+from collections import defaultdict, Counter
+from sparse import Vocabulary, CsrMatrix
+from hashing import FeatureHasher
+from model_io import save_model, load_model, stats_to_meta, dicts_to_matrix, matrix_to_dicts
 
 
 class NaiveBayes(object):
 
-    def __init__(self):
+    def __init__(self, hasher=None):
+        """
+        :param hasher: FeatureHasher of the tokens. The tokens are hashed without their signs, so the count of a feature
+        is the sum of the counts of its tokens.
+        """
+
+        self.hasher = hasher
+
+        # incremented whenever the model changes, so results cached for an older model are not used.
+        self.version = 0
+
+        self.reset()
+
+        self.confusion_matrix = None
+        self.stats = None
+
+    def reset(self):
+        """
+        Clear the class statistics and the compiled tables.
+        """
+
         # stores (class, #documents)
         self.class_doc_count = defaultdict(lambda: 0)
         # stores (class, prior)
@@ -28,34 +52,152 @@ class NaiveBayes(object):
         self.class_term_freq = defaultdict(lambda: defaultdict(lambda: 0))
         # stores (class, token_count)
         self.class_token_count = defaultdict(lambda: 0)
+        # stores (term, #documents) of entire data-set
+        self.term_doc_count = defaultdict(lambda: 0)
+        # stores #documents of entire data-set
+        self.doc_count = 0
 
-        self.confusion_matrix = None
-        self.stats = None
+        # compiled tables used by classify_batch: topics, vocabulary, (topics) log10 priors, (topics, vocab) log10 of
+        # the smoothed term frequencies and (topics) log10 of the smoothing denominators.
+        self.topics = None
+        self.vocab = None
+        self.log_priors = None
+        self.log_term_freqs = None
+        self.log_denominators = None
+        # stores (class, term) pairs updated after the tables were compiled
+        self.dirty_terms = set()
 
     def train(self, documents):
         """
         Given a list of labeled Document objects, compute the class priors and class feature stats.
         """
 
-        vocab_list = list()
+        self.reset()
+        self.partial_fit(documents)
+        self.compile()
+
+    def partial_fit(self, documents):
+        """
+        Add the labeled documents to the class statistics. The compiled tables are updated lazily, for the updated terms
+        only, at the next classification.
+        """
+
+        self.update_counts(documents, 1)
+
+    def remove_documents(self, documents):
+        """
+        Remove the labeled documents, which were added before, from the class statistics.
+        """
+
+        self.update_counts(documents, -1)
+
+    def update_counts(self, documents, sign):
+
+        self.version += 1
+        vocab_count = self.vocab_count or 0
 
         for document in documents:
 
             topic = document.topic
-            tf = document.tf
+            tf = self.term_counts(document)
 
             # count documents per class
-            self.class_doc_count[topic] += 1
+            self.class_doc_count[topic] += sign
+            self.doc_count += sign
 
             for term in tf.keys():
-                self.class_term_freq[topic][term] = self.class_term_freq[topic][term] + 1
-                self.class_token_count[topic] = self.class_token_count[topic] + 1
-                vocab_list.append(term)
+                self.class_term_freq[topic][term] = self.class_term_freq[topic][term] + sign
+                self.class_token_count[topic] = self.class_token_count[topic] + sign
+                self.dirty_terms.add((topic, term))
 
-        self.vocab_count = len(set(vocab_list))
+                count = self.term_doc_count[term] + sign
+                self.term_doc_count[term] = count
+
+                if count == 0:
+                    del self.term_doc_count[term]
+                    vocab_count -= 1
+                elif count == 1 and sign > 0:
+                    vocab_count += 1
+
+        self.vocab_count = vocab_count
+
+        self.class_priors = defaultdict(lambda: 0)
 
         for key in self.class_doc_count.keys():
-            self.class_priors[key] = float(self.class_doc_count[key])/float(len(documents))
+            if self.class_doc_count[key] > 0:
+                self.class_priors[key] = float(self.class_doc_count[key])/float(self.doc_count)
+
+    def compile(self):
+        """
+        Precompute the log likelihood tables from the class statistics.
+        log10((freq + 1)/(token_count + vocab_count)) is kept as log10(freq + 1) per (topic, term) and
+        log10(token_count + vocab_count) per topic, so a term which is not in the vocabulary only costs the denominator.
+        """
+
+        self.topics = sorted(self.class_priors.keys())
+        self.vocab = Vocabulary()
+
+        for topic in self.topics:
+            for term in self.class_term_freq[topic].keys():
+                self.vocab.add(term)
+
+        self.log_priors = np.log10([self.class_priors[topic] for topic in self.topics])
+
+        term_freqs = np.zeros((len(self.topics), len(self.vocab)))
+        for i in range(len(self.topics)):
+            term_freq = self.class_term_freq[self.topics[i]]
+            for term, freq in term_freq.items():
+                term_freqs[i, self.vocab.get(term)] = freq
+
+        self.log_term_freqs = np.log10(term_freqs + 1)
+        self.log_denominators = np.log10([self.class_token_count[topic] + self.vocab_count for topic in self.topics])
+        self.dirty_terms = set()
+
+    def update_tables(self):
+        """
+        Bring the compiled tables up to date after partial_fit/remove_documents. Only the cells of the updated terms
+        are recomputed, unless the set of classes changed.
+        """
+
+        topics = sorted(self.class_priors.keys())
+
+        if self.log_term_freqs is None or topics != self.topics:
+            self.compile()
+            return
+
+        if self.dirty_terms:
+            # tables loaded from a model file are read only memory-maps.
+            if not self.log_term_freqs.flags.writeable:
+                self.log_term_freqs = self.log_term_freqs.copy()
+
+            for topic, term in self.dirty_terms:
+                term_id = self.vocab.add(term)
+
+                # grow the table by doubling, when new terms do not fit.
+                if term_id >= self.log_term_freqs.shape[1]:
+                    grown = np.zeros((len(topics), 2 * term_id + 1))
+                    grown[:, :self.log_term_freqs.shape[1]] = self.log_term_freqs
+                    self.log_term_freqs = grown
+
+                if topic in self.class_priors:
+                    freq = self.class_term_freq[topic].get(term, 0)
+                    self.log_term_freqs[topics.index(topic), term_id] = np.log10(freq + 1)
+
+            self.dirty_terms = set()
+
+        self.log_priors = np.log10([self.class_priors[topic] for topic in topics])
+        self.log_denominators = np.log10([self.class_token_count[topic] + self.vocab_count for topic in topics])
+
+    def term_counts(self, document):
+        """
+        :return: term counts of the text of the document. The tf of a hashed document has signed counts, which cancel
+        out when tokens of opposite signs collide, so the features of its tokens are counted again without the signs.
+        """
+
+        if self.hasher is None:
+            return document.tf
+
+        return Counter(self.hasher.features(document.text_tokens))
 
     def classify(self, documents):
         """
@@ -64,23 +206,119 @@ class NaiveBayes(object):
         :return: a list of strings, the class topics, for each document.
         """
 
+        return self.classify_batch(documents)
+
+    def classify_batch(self, documents, return_scores=False):
+        """
+        Classify the list of documents at once, as one sparse (documents, vocab) x (vocab, topics) product.
+        :param documents: The list of documents.
+        :param return_scores: return the class log10 probabilities of the documents as well.
+        :return: a list of strings, the class topics, for each document. If return_scores is set, also an array of shape
+        (documents, topics) with the log10 probabilities of the classes in the order of self.topics.
+        """
+
+        self.update_tables()
+
+        rows = [self.term_counts(document) for document in documents]
+        tf = CsrMatrix.from_rows(rows, self.vocab, add=False)
+        token_counts = np.array([sum(row.values()) for row in rows], dtype=np.float64)
+
+        scores = tf.dot(self.log_term_freqs.T) - np.outer(token_counts, self.log_denominators) + self.log_priors
+
+        predictions = [self.topics[i] for i in np.argmax(scores, axis=1)]
+
+        if not return_scores:
+            return predictions
+
+        # normalize the joint scores into class probabilities, in log10 space.
+        top = scores.max(axis=1)[:, None]
+        log_probabilities = scores - (top + np.log10(np.power(10.0, scores - top).sum(axis=1))[:, None])
+
+        return predictions, log_probabilities
+
+    def classify_loop(self, documents):
+        """
+        Classify the documents one token at a time, without the compiled tables.
+        """
+
         predictions = list()
         scores = defaultdict(lambda: 0)
 
         for document in documents:
-            tf = document.tf
+            tf = self.term_counts(document)
 
             for topic, prior in self.class_priors.items():
                 scores[topic] = math.log10(prior)
+                term_freq = self.class_term_freq[topic]
 
                 for token in tf.keys():
-                    token_score = tf[token] * math.log10((self.class_term_freq[topic][token] + 1)*1.0/
+                    token_score = tf[token] * math.log10((term_freq.get(token, 0) + 1)*1.0/
                                                          (self.class_token_count[topic] + self.vocab_count))
                     scores[topic] += token_score
 
-            predictions.append(max(scores.iteritems(), key=operator.itemgetter(1))[0])
+            predictions.append(max(scores.items(), key=operator.itemgetter(1))[0])
 
             scores = dict.fromkeys(scores, 0)
 
         return predictions
 
+    def save(self, path, fingerprint=None):
+        """
+        Save the class statistics and the compiled tables into a model file.
+        :param fingerprint: fingerprint of the training documents, see model_io.fingerprint
+        """
+
+        self.update_tables()
+
+        terms = self.vocab.terms
+        term_freqs = dicts_to_matrix([self.class_term_freq[topic] for topic in self.topics], self.vocab, np.int64)
+
+        arrays = {
+            'class_doc_count': np.array([self.class_doc_count[topic] for topic in self.topics], dtype=np.int64),
+            'class_token_count': np.array([self.class_token_count[topic] for topic in self.topics], dtype=np.int64),
+            'term_freqs': term_freqs,
+            'log_priors': self.log_priors,
+            'log_term_freqs': self.log_term_freqs[:, :len(terms)],
+            'log_denominators': self.log_denominators
+        }
+        meta = {'vocab_count': self.vocab_count, 'doc_count': self.doc_count, 'stats': stats_to_meta(self.stats)}
+
+        if self.hasher is not None:
+            meta['hasher'] = {'n_bits': self.hasher.n_bits, 'signed': self.hasher.signed}
+
+        save_model(path, 'NaiveBayes', arrays, meta, {'topics': self.topics, 'terms': terms}, fingerprint)
+
+    @classmethod
+    def load(cls, path, fingerprint=None):
+        """
+        Load a model saved by save(). The compiled tables are memory-mapped from the file.
+        :param fingerprint: fingerprint of the training documents, ModelMismatchError is raised if the model was trained
+        on others.
+        """
+
+        meta, arrays, strings = load_model(path, 'NaiveBayes', fingerprint=fingerprint)
+
+        model = cls(FeatureHasher(**meta['hasher']) if meta.get('hasher') else None)
+        model.topics = strings['topics']
+        model.vocab = Vocabulary(strings['terms'])
+        model.vocab_count = meta['vocab_count']
+        model.doc_count = meta['doc_count']
+        model.stats = meta['stats']
+
+        model.log_priors = arrays['log_priors']
+        model.log_term_freqs = arrays['log_term_freqs']
+        model.log_denominators = arrays['log_denominators']
+
+        term_freqs = matrix_to_dicts(arrays['term_freqs'], model.vocab.terms)
+
+        for i in range(len(model.topics)):
+            topic = model.topics[i]
+            model.class_doc_count[topic] = int(arrays['class_doc_count'][i])
+            model.class_token_count[topic] = int(arrays['class_token_count'][i])
+            model.class_priors[topic] = float(model.class_doc_count[topic])/model.doc_count
+            model.class_term_freq[topic].update(term_freqs[i])
+
+            for term, freq in term_freqs[i].items():
+                model.term_doc_count[term] += freq
+
+        return model
@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script precomputes the k nearest neighbours of every document of the corpus offline, so a recommendation is a
+lookup of k ids instead of a knn search. The neighbours of a document are searched among the documents of its topic,
+with the same similarity and the same order as KNN, the dot product of the document vectors with ties broken by the
+position of the document.
+
+The similarities are computed in blocks of documents: the vectors of a block are expanded into a dense (vocabulary,
+block size) matrix, and sparse products with the vectors of the topic, a chunk of documents at a time, score the block
+against the whole topic. The memory of a block is bounded by the vocabulary and the size of the topic, and the chunks
+keep the intermediate products bounded by the block size and the length of the documents, not by the corpus. Large
+tables are computed in a pool of forked processes, which share the vectors of the corpus copy-on-write. The neighbour
+table, the ids and the scores of the neighbours of every document, is saved into a model file and memory-mapped when
+it is loaded. Newly added documents are added to the table incrementally, only their similarities to the documents of
+their topic are computed. When documents were removed, the table is computed again.
+
+"""
+
+__author__ = 'vivek'
+
+import multiprocessing
+import numpy as np
+from sparse import Vocabulary, CsrMatrix
+from model_io import save_model, load_model
+from recommender import doc_id
+
+# vector matrices of the topics and k of the running build, inherited by the forked workers.
+shared = None
+
+# tables of fewer documents are computed in process, forking a pool takes longer than scoring them.
+min_pool_docs = 1000
+
+
+def topic_matrix(docs):
+    """
+    :return: CsrMatrix of the vectors of the docs
+    """
+
+    return CsrMatrix.from_rows([doc.vector for doc in docs], Vocabulary())
+
+
+def block_scores(matrix, start, end, chunk_size=128):
+    """
+    :param chunk_size: number of rows of the matrix multiplied at once. A product takes an array of the stored values of
+    the chunk times the rows of the block.
+    :return: array of shape (end - start, rows of the matrix) with the similarities of the rows start to end to all the
+    rows of the matrix.
+    """
+
+    rows = matrix.row_slice(start, end)
+
+    block = np.zeros((matrix.shape[1], end - start))
+    block[rows.indices, rows.row_ids()] = rows.data
+
+    scores = np.empty((end - start, matrix.shape[0]))
+
+    for chunk in range(0, matrix.shape[0], chunk_size):
+        chunk_end = min(chunk + chunk_size, matrix.shape[0])
+        scores[:, chunk:chunk_end] = matrix.row_slice(chunk, chunk_end).dot(block).T
+
+    return scores
+
+
+def top_k(scores, positions, k):
+    """
+    :param scores: array of the similarities of a document to the candidates
+    :param positions: array of the positions of the candidates in their topic, which break the ties
+    :param k: number of neighbours
+    :return: arrays of the indices (into scores) and the scores of the k most similar candidates, in order.
+    """
+
+    if len(scores) > k:
+        # the candidates which tie with the k-th score are all kept, so the positions decide between them.
+        kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+        candidates = np.flatnonzero(scores >= kth)
+    else:
+        candidates = np.arange(len(scores))
+
+    order = candidates[np.lexsort((positions[candidates], -scores[candidates]))][:k]
+
+    return order, scores[order]
+
+
+def run_block(task):
+    """
+    Find the neighbours of a block of documents of a topic. This runs in the workers.
+    :return: topic number, first row of the block, and arrays of the positions and the scores of the neighbours
+    """
+
+    t, start, end = task
+    matrices, k = shared
+    matrix = matrices[t]
+    n = matrix.shape[0]
+
+    scores = block_scores(matrix, start, end)
+    positions = np.arange(n)
+    neighbours = np.full((end - start, k), -1, dtype=np.int32)
+    neighbour_scores = np.zeros((end - start, k), dtype=np.float64)
+
+    for i in range(end - start):
+        # a document is not its own neighbour.
+        others = np.concatenate([positions[:start + i], positions[start + i + 1:]])
+        order, top_scores = top_k(scores[i][others], others, k)
+
+        neighbours[i, :len(order)] = others[order]
+        neighbour_scores[i, :len(order)] = top_scores
+
+    return t, start, neighbours, neighbour_scores
+
+
+class NeighbourTable(object):
+
+    def __init__(self, ids, neighbours, scores, k):
+        """
+        :param ids: list of the document ids of the rows
+        :param neighbours: array of shape (documents, k) with the rows of the neighbours of every row, -1 where a topic
+        has less than k + 1 documents.
+        :param scores: array of shape (documents, k) with the similarities of the neighbours
+        """
+
+        self.ids = list(ids)
+        self.rows = dict((self.ids[i], i) for i in range(len(self.ids)))
+        self.neighbours = neighbours
+        self.scores = scores
+        self.k = k
+
+    def __len__(self):
+
+        return len(self.ids)
+
+    def __contains__(self, d_id):
+
+        return d_id in self.rows
+
+    @classmethod
+    def build(cls, all_docs, k=20, block_size=128, workers=1):
+        """
+        Find the k nearest neighbours of all the documents.
+        :param all_docs: dict of (topic, list of documents). Their vectors must be set.
+        :param k: number of neighbours per document
+        :param block_size: number of documents scored at once. A block takes a dense (vocabulary of the topic,
+        block_size) matrix of floats, and its (block_size, documents of the topic) scores.
+        :param workers: number of processes, 1 scores the blocks serially. Tables of less than min_pool_docs documents
+        are always scored serially.
+        :return: NeighbourTable
+        """
+
+        global shared
+
+        topics = sorted(all_docs.keys())
+        docs = [doc for topic in topics for doc in all_docs[topic]]
+        matrices = [topic_matrix(all_docs[topic]) for topic in topics]
+
+        # rows of the table are the docs topic by topic, offsets are the first row of every topic.
+        offsets = np.cumsum([0] + [len(all_docs[topic]) for topic in topics])
+        tasks = [(t, start, min(start + block_size, matrices[t].shape[0]))
+                 for t in range(len(topics)) for start in range(0, matrices[t].shape[0], block_size)]
+
+        shared = (matrices, k)
+
+        try:
+            if workers > 1 and len(tasks) > 1 and len(docs) >= min_pool_docs:
+                # the workers must be forked to inherit the matrices, python 3 may default to spawning them.
+                context = multiprocessing.get_context('fork') if hasattr(multiprocessing, 'get_context') else \
+                    multiprocessing
+                pool = context.Pool(workers)
+
+                try:
+                    results = pool.map(run_block, tasks, 1)
+                finally:
+                    pool.close()
+                    pool.join()
+            else:
+                results = [run_block(task) for task in tasks]
+        finally:
+            shared = None
+
+        neighbours = np.full((len(docs), k), -1, dtype=np.int32)
+        scores = np.zeros((len(docs), k), dtype=np.float64)
+
+        for t, start, block_neighbours, neighbour_scores in results:
+            rows = slice(offsets[t] + start, offsets[t] + start + len(block_neighbours))
+            neighbours[rows] = np.where(block_neighbours >= 0, block_neighbours + offsets[t], -1)
+            scores[rows] = neighbour_scores
+
+        return cls([doc_id(doc) for doc in docs], neighbours, scores, k)
+
+    def rebuild(self, all_docs, block_size=128, workers=1):
+        """
+        Find the neighbours of all the documents again, e.g. after their vectors changed. k stays the same.
+        """
+
+        table = self.build(all_docs, self.k, block_size, workers)
+
+        self.ids, self.rows, self.neighbours, self.scores = table.ids, table.rows, table.neighbours, table.scores
+
+    def lookup(self, d_id, k=None):
+        """
+        :param d_id: id of a document
+        :param k: number of neighbours, at most self.k
+        :return: list of the ids of the k nearest neighbours of the document, None if it is not in the table.
+        """
+
+        row = self.rows.get(d_id)
+
+        if row is None:
+            return None
+
+        ids = self.ids
+
+        return [ids[j] for j in self.neighbours[row, :k or self.k] if j >= 0]
+
+    def refresh(self, all_docs, workers=1):
+        """
+        Add the documents which are not in the table yet. Their neighbours are found among the documents of their topic,
+        and they become neighbours of the documents of their topic which they are closer to than the current ones. The
+        vectors of the documents already in the table must not have changed. If documents of the table are not in
+        all_docs any more, they may be neighbours of the others, and the whole table is computed again.
+        :param all_docs: dict of (topic, list of documents), with the new documents after the old ones of their topic.
+        :param workers: number of processes which compute the table again, see build()
+        :return: number of added documents, or of all the documents if the table was computed again.
+        """
+
+        current = set(doc_id(doc) for docs in all_docs.values() for doc in docs)
+
+        if any(d_id not in current for d_id in self.ids):
+            self.rebuild(all_docs, workers=workers)
+
+            return len(self.ids)
+
+        k = self.k
+        neighbours = np.array(self.neighbours)
+        scores = np.array(self.scores)
+        added = 0
+
+        for topic in sorted(all_docs.keys()):
+            docs = all_docs[topic]
+            ids = [doc_id(doc) for doc in docs]
+            new = [i for i in range(len(docs)) if ids[i] not in self.rows]
+
+            if not new:
+                continue
+
+            old = [i for i in range(len(docs)) if ids[i] in self.rows]
+
+            for i in new:
+                self.rows[ids[i]] = len(self.ids)
+                self.ids.append(ids[i])
+
+            # rows of the topic docs in the table, and the positions of the rows in the topic.
+            rows = np.array([self.rows[d_id] for d_id in ids], dtype=np.int64)
+            positions = dict((rows[i], i) for i in range(len(rows)))
+
+            matrix = topic_matrix(docs)
+            new_neighbours = np.full((len(new), k), -1, dtype=np.int32)
+            new_scores = np.zeros((len(new), k), dtype=np.float64)
+            # similarities of the new docs to all the docs of the topic.
+            new_similarities = np.zeros((len(new), len(docs)))
+
+            for j in range(len(new)):
+                new_similarities[j] = block_scores(matrix, new[j], new[j] + 1)[0]
+
+                others = np.array([i for i in range(len(docs)) if i != new[j]], dtype=np.int64)
+                order, top_scores = top_k(new_similarities[j][others], others, k)
+
+                new_neighbours[j, :len(order)] = rows[others[order]]
+                new_scores[j, :len(order)] = top_scores
+
+            neighbours = np.vstack([neighbours, new_neighbours])
+            scores = np.vstack([scores, new_scores])
+
+            # the similarities of the old docs to the new ones are the transposed rows of the new docs.
+            new_similarities = new_similarities.T
+            new_positions = np.array(new, dtype=np.int64)
+
+            for i in old:
+                row = rows[i]
+                current = [j for j in range(k) if neighbours[row, j] >= 0]
+                candidate_positions = np.concatenate([np.array([positions[neighbours[row, j]] for j in current],
+                                                               dtype=np.int64), new_positions])
+                candidate_scores = np.concatenate([scores[row, current], new_similarities[i]])
+                order, top_scores = top_k(candidate_scores, candidate_positions, k)
+
+                neighbours[row, :] = -1
+                neighbours[row, :len(order)] = rows[candidate_positions[order]]
+                scores[row, :] = 0.0
+                scores[row, :len(order)] = top_scores
+
+            added += len(new)
+
+        self.neighbours, self.scores = neighbours, scores
+
+        return added
+
+    def save(self, path, fingerprint=None):
+        """
+        :param fingerprint: fingerprint of the training documents whose index weighed the vectors, see
+        model_io.fingerprint
+        """
+
+        save_model(path, 'NeighbourTable', {'neighbours': self.neighbours, 'scores': self.scores}, {'k': self.k},
+                   {'ids': self.ids}, fingerprint)
+
+    @classmethod
+    def load(cls, path, fingerprint=None):
+        """
+        Load a table saved by save(). The neighbour arrays are memory-mapped from the file.
+        :param fingerprint: fingerprint of the training documents, ModelMismatchError is raised if the vectors of the
+        table were weighed by the index of others.
+        """
+
+        meta, arrays, strings = load_model(path, 'NeighbourTable', fingerprint=fingerprint)
+
+        return cls(strings['ids'], arrays['neighbours'], arrays['scores'], meta['k'])
@@ -11,25 +11,101 @@ This script is an implementation of rank classifier which depends on the tfidfie
 __author__ = 'vivek'
 
 from collections import Counter, defaultdict
+from multiprocessing import Pool
+from sparse import Vocabulary, CsrMatrix
+from model_io import save_model, load_model, stats_to_meta
+from hashing import FeatureHasher
+import numpy as np
 import operator
 import math
 
 
+class HashedDocument(object):
+    """
+    Topic and hashed title and text tokens of a document, which is all the rank classifier reads of it.
+    """
+
+    __slots__ = ('topic', 'title_tokens', 'text_tokens')
+
+    def __init__(self, doc, hasher):
+        self.topic = doc.topic
+        self.title_tokens = hasher.features(doc.title_tokens)
+        self.text_tokens = hasher.features(doc.text_tokens)
+
+
 class RankClassifier(object):
 
-    def __init__(self):
+    def __init__(self, workers=1, hasher=None):
+        """
+        :param workers: number of processes which build the topic indexes
+        :param hasher: FeatureHasher of the tokens. The tokens are hashed without their signs, the topic tfidf of the
+        features is a sum over their tokens.
+        """
+
+        self.workers = workers
+        self.hasher = hasher
         self.train_docs = None
         self.topic_list = None
         self.topic_set = None
         self.index_dict = None
+
+        # compiled tables used by classify_batch: topics, vocabulary, and (vocab, topics) weights of a token when it
+        # occurs in the title and in the text of a document.
+        self.topics = None
+        self.vocab = None
+        self.title_weights = None
+        self.text_weights = None
+
+        # incremented whenever the model changes, so results cached for an older model are not used.
+        self.version = 0
+
         self.confusion_matrix = None
         self.stats = None
 
     def train(self, train_docs):
-        self.train_docs = train_docs
+        self.train_docs = self.hash_documents(train_docs)
         self.topic_list = list(set([d.topic for d in self.train_docs]))
         self.topic_set = TopicSet(self.train_docs, self.topic_list)
         self.index_dict = self.create_index_dict()
+        self.compile()
+
+    def compile(self):
+        """
+        Compile the topic tfidf of all the topic indexes into (vocab, topics) weight matrices, following cal_score:
+        a title token scores 2 * its title tfidf, or else 1.5 * its text tfidf, and a text token scores its text tfidf.
+        """
+
+        self.version += 1
+        self.topics = sorted(self.index_dict.keys())
+        self.vocab = Vocabulary()
+
+        for topic in self.topics:
+            index = self.index_dict[topic]
+            for token in index.topic_title_tfidf.keys():
+                self.vocab.add(token)
+            for token in index.topic_text_tfidf.keys():
+                self.vocab.add(token)
+
+        self.title_weights = np.zeros((len(self.vocab), len(self.topics)))
+        self.text_weights = np.zeros((len(self.vocab), len(self.topics)))
+
+        for j in range(len(self.topics)):
+            index = self.index_dict[self.topics[j]]
+
+            for token, score in index.topic_text_tfidf.items():
+                self.text_weights[self.vocab.get(token), j] = score
+                self.title_weights[self.vocab.get(token), j] = 1.5*score
+
+            # title tfidf takes precedence over the text tfidf for the title tokens.
+            for token, score in index.topic_title_tfidf.items():
+                self.title_weights[self.vocab.get(token), j] = 2*score
+
+    def hash_documents(self, documents):
+
+        if self.hasher is None:
+            return documents
+
+        return [HashedDocument(doc, self.hasher) for doc in documents]
 
     def create_index_dict(self):
 
@@ -39,21 +115,104 @@ class RankClassifier(object):
             topic_train_docs[doc.topic].append(doc)
 
         index_dict = defaultdict(lambda: None)
-
-        for topic, docs in topic_train_docs.items():
-            index_dict[topic] = LocalIndex(docs, self.topic_set.text_common_tokens)
+        topics = list(topic_train_docs.keys())
+        exclude_tokens = frozenset(self.topic_set.text_common_tokens)
+
+        if self.workers > 1:
+            # the topic tables are built in parallel, from the plain token lists of the docs of each topic.
+            payloads = [([d.title_tokens for d in topic_train_docs[topic]],
+                         [d.text_tokens for d in topic_train_docs[topic]], exclude_tokens, None) for topic in topics]
+
+            pool = Pool(min(self.workers, len(topics)))
+            try:
+                tables = pool.map(build_topic_tables, payloads)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            tables = [None] * len(topics)
+
+        for topic, topic_tables in zip(topics, tables):
+            index_dict[topic] = LocalIndex(topic_train_docs[topic], exclude_tokens, tables=topic_tables)
 
         return index_dict
 
     def classify(self, documents):
 
+        return self.classify_batch(documents)
+
+    def classify_batch(self, documents):
+        """
+        Classify the list of documents at once. The scores of all the topics are a gather and sum of the compiled
+        weights over the token ids of each document.
+        :param documents: The list of documents.
+        :return: a list of strings, the class topics, for each document.
+        """
+
+        documents = self.hash_documents(documents)
+
+        title_tokens = [doc.title_tokens for doc in documents]
+        text_tokens = [doc.text_tokens for doc in documents]
+
+        title_counts = CsrMatrix.from_tokens(title_tokens, self.vocab)
+        text_counts = CsrMatrix.from_tokens(text_tokens, self.vocab)
+
+        title_lengths = np.array([max(len(tokens), 1) for tokens in title_tokens], dtype=np.float64)
+        text_lengths = np.array([max(len(tokens), 1) for tokens in text_tokens], dtype=np.float64)
+
+        scores = (title_counts.dot(self.title_weights) / title_lengths[:, None] +
+                  text_counts.dot(self.text_weights) / text_lengths[:, None])
+
+        return [self.topics[i] for i in np.argmax(scores, axis=1)]
+
+    def save(self, path, fingerprint=None):
+        """
+        Save the compiled tables into a model file. The topic indexes are not saved, they are only needed to compile.
+        :param fingerprint: fingerprint of the training documents, see model_io.fingerprint
+        """
+
+        arrays = {'title_weights': self.title_weights, 'text_weights': self.text_weights}
+
+        meta = {'stats': stats_to_meta(self.stats)}
+
+        if self.hasher is not None:
+            meta['hasher'] = {'n_bits': self.hasher.n_bits, 'signed': self.hasher.signed}
+
+        save_model(path, 'RankClassifier', arrays, meta, {'topics': self.topics, 'terms': self.vocab.terms},
+                   fingerprint)
+
+    @classmethod
+    def load(cls, path, fingerprint=None):
+        """
+        Load a model saved by save(). The weight matrices are memory-mapped from the file.
+        :param fingerprint: fingerprint of the training documents, ModelMismatchError is raised if the model was trained
+        on others.
+        """
+
+        meta, arrays, strings = load_model(path, 'RankClassifier', fingerprint=fingerprint)
+
+        model = cls(hasher=FeatureHasher(**meta['hasher']) if meta.get('hasher') else None)
+        model.topics = strings['topics']
+        model.topic_list = list(model.topics)
+        model.vocab = Vocabulary(strings['terms'])
+        model.title_weights = arrays['title_weights']
+        model.text_weights = arrays['text_weights']
+        model.stats = meta['stats']
+
+        return model
+
+    def classify_loop(self, documents):
+        """
+        Classify the documents one topic index and one token at a time, without the compiled tables.
+        """
+
         predictions = list()
-        for doc in documents:
+        for doc in self.hash_documents(documents):
             score_dict = defaultdict(lambda: 0)
             for topic, index in self.index_dict.items():
                 score_dict[topic] = self.cal_score(doc, index)
 
-            predictions.append(max(score_dict.iteritems(), key=operator.itemgetter(1))[0])
+            predictions.append(max(score_dict.items(), key=operator.itemgetter(1))[0])
 
         return predictions
 
@@ -73,7 +232,7 @@ class RankClassifier(object):
                 title_score += (1.5*text_tfidf[token])
 
         for token in doc.text_tokens:
-            if token in text_tfidf.keys():
+            if token in text_tfidf:
                 text_score += text_tfidf[token]
 
         total_score = (title_score/title_len) + (text_score/text_len)
@@ -141,30 +300,105 @@ class TopicSet(object):
         return common_tokens
 
 
-class LocalIndex(object):
+def count_tokens(token_l):
+    """
+    Count the tokens in a single pass.
+    :param token_l: A list of lists of tokens, one per document.
+    :return: dict of (token, #documents), dict of (token, #occurrences) and the total number of tokens.
+    """
+
+    doc_freqs = defaultdict(lambda: 0)
+    token_counts = defaultdict(lambda: 0)
+    total_len = 0
+
+    for doc in token_l:
+        total_len += len(doc)
+
+        for token, count in Counter(doc).items():
+            doc_freqs[token] += 1
+            token_counts[token] += count
+
+    return doc_freqs, token_counts, total_len
+
+
+def topic_tfidf(doc_freqs, token_counts, doc_count, all_token_count):
+
+    tfidf = dict()
+
+    for token, token_count in token_counts.items():
+        token_idf = doc_freqs[token]*1.0/doc_count
+        tfidf[token] = (1 + token_count*1.0/all_token_count) * (1 + token_idf)
 
-    def __init__(self, docs, text_exclude_tokens=None, title_exclude_tokens=None):
+    return tfidf
 
-        if not text_exclude_tokens:
-            text_exclude_tokens = list()
-        if not title_exclude_tokens:
-            title_exclude_tokens = list()
+
+def build_topic_tables(args):
+    """
+    Build the topic tables of a LocalIndex. This also runs in the worker processes, so it takes and returns plain data.
+    :param args: title token lists, text token lists, text exclude tokens and title exclude tokens
+    :return: dict of the topic tables
+    """
+
+    title_l, text_l, text_exclude_tokens, title_exclude_tokens = args
+
+    text_exclude = frozenset(text_exclude_tokens or ())
+    title_exclude = text_exclude | frozenset(title_exclude_tokens or ())
+
+    tables = dict()
+
+    for field, token_l, exclude in (('title', title_l, title_exclude), ('text', text_l, text_exclude)):
+        doc_freqs, token_counts, total_len = count_tokens([[t for t in d if t not in exclude] for d in token_l])
+
+        tables[field + '_doc_freqs'] = dict(doc_freqs)
+        tables[field + '_mean_length'] = total_len/len(token_l)
+        tables['topic_' + field + '_tfidf'] = topic_tfidf(doc_freqs, token_counts, len(token_l), total_len)
+
+    return tables
+
+
+class LocalIndex(object):
+
+    def __init__(self, docs, text_exclude_tokens=None, title_exclude_tokens=None, doc_tfidf=False, tables=None):
+        """
+        :param docs: docs of the topic
+        :param text_exclude_tokens: tokens excluded from the title and the text
+        :param title_exclude_tokens: tokens excluded from the title
+        :param doc_tfidf: also build the postings and the per document tfidf tables, which classification does not use
+        :param tables: topic tables already built by build_topic_tables
+        """
 
         self.docs = docs
 
-        self.title_tokens = [[t for t in d.title_tokens if t not in (title_exclude_tokens+text_exclude_tokens)] for d in self.docs]
-        self.title_doc_freqs = self.count_doc_frequencies(self.title_tokens)
-        self.title_index = self.create_tf_index(self.title_tokens)
-        self.title_lengths, self.mean_title_length = self.compute_doc_lengths(self.title_tokens)
-        self.title_tfidf = self.create_tfidf_index(self.title_tokens, self.title_index, self.title_lengths, self.title_doc_freqs)
-        self.topic_title_tfidf = self.create_topic_tfidf_index(self.title_tokens, self.title_index, self.title_doc_freqs)
-
-        self.text_tokens = [[t for t in d.text_tokens if t not in text_exclude_tokens] for d in self.docs]
-        self.text_doc_freqs = self.count_doc_frequencies(self.text_tokens)
-        self.text_index = self.create_tf_index(self.text_tokens)
-        self.text_lengths, self.mean_text_length = self.compute_doc_lengths(self.text_tokens)
-        self.text_tfidf = self.create_tfidf_index(self.text_tokens, self.text_index, self.text_lengths, self.text_doc_freqs)
-        self.topic_text_tfidf = self.create_topic_tfidf_index(self.text_tokens, self.text_index, self.text_doc_freqs)
+        if tables is None:
+            tables = build_topic_tables(([d.title_tokens for d in self.docs], [d.text_tokens for d in self.docs],
+                                         text_exclude_tokens, title_exclude_tokens))
+
+        self.title_doc_freqs = tables['title_doc_freqs']
+        self.mean_title_length = tables['title_mean_length']
+        self.topic_title_tfidf = tables['topic_title_tfidf']
+
+        self.text_doc_freqs = tables['text_doc_freqs']
+        self.mean_text_length = tables['text_mean_length']
+        self.topic_text_tfidf = tables['topic_text_tfidf']
+
+        self.title_tokens, self.title_index, self.title_lengths, self.title_tfidf = None, None, None, None
+        self.text_tokens, self.text_index, self.text_lengths, self.text_tfidf = None, None, None, None
+
+        if doc_tfidf:
+            text_exclude = frozenset(text_exclude_tokens or ())
+            title_exclude = text_exclude | frozenset(title_exclude_tokens or ())
+
+            self.title_tokens = [[t for t in d.title_tokens if t not in title_exclude] for d in self.docs]
+            self.title_index = self.create_tf_index(self.title_tokens)
+            self.title_lengths, self.mean_title_length = self.compute_doc_lengths(self.title_tokens)
+            self.title_tfidf = self.create_tfidf_index(self.title_tokens, self.title_index, self.title_lengths,
+                                                       self.title_doc_freqs)
+
+            self.text_tokens = [[t for t in d.text_tokens if t not in text_exclude] for d in self.docs]
+            self.text_index = self.create_tf_index(self.text_tokens)
+            self.text_lengths, self.mean_text_length = self.compute_doc_lengths(self.text_tokens)
+            self.text_tfidf = self.create_tfidf_index(self.text_tokens, self.text_index, self.text_lengths,
+                                                      self.text_doc_freqs)
 
     def count_doc_frequencies(self, token_l):
         """
@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script implements the recommendation engine, without any user interaction. The topic of an article is predicted
+by the ensemble of the trained classifiers, and the k closest articles of that topic are recommended. The classifier
+order and the knn index of every topic are prepared once, so a recommendation is only the prediction and one knn
+search. The results of the articles which are requested again and again can be cached, and the neighbours of the
+articles of the corpus can be looked up in a precomputed neighbour table (see neighbours.py) instead of searched.
+
+"""
+
+__author__ = 'vivek'
+
+from cache import LRUCache
+from ensemble import EnsemblePredictor
+from document import Document, article_id
+from knn import KNN
+
+# article texts and document ids, on python 2 they may be unicode as well.
+string_types = (str, type(u''))
+
+
+def doc_id(doc):
+    """
+    :return: id of the document, 'topic/file name', e.g. 'tech/001.txt'
+    """
+
+    return article_id(doc.topic, doc.f_path)
+
+
+class Recommender(object):
+
+    def __init__(self, all_docs, classifier_list, pipeline=None, index=None, cache_size=0, cache_ttl=None,
+                 knn_factory=KNN, concurrent=False, budget=None, neighbour_table=None):
+        """
+        :param all_docs: dict of (topic, list of documents) which are recommended. Their vectors must be set.
+        :param classifier_list: trained classifiers with their stats
+        :param pipeline: TokenPipeline of the articles given as text, Document.pipeline by default
+        :param index: tfidf index of the documents, a refresh of the index invalidates the cached results.
+        :param cache_size: number of cached predictions and of cached recommendations, 0 disables the caches.
+        :param cache_ttl: seconds a cached result stays valid, None keeps it until it is evicted or invalidated.
+        :param knn_factory: function which creates the nearest neighbour index of a list of documents, e.g. KNN, a
+        pruned KNN or lsh.LSHIndex
+        :param concurrent: run the classifiers of the ensemble concurrently
+        :param budget: seconds a concurrent prediction waits for a majority of the classifiers, see EnsemblePredictor.
+        :param neighbour_table: NeighbourTable of the documents. The neighbours of a document of the table whose topic
+        is predicted correctly are looked up in it, the knn index is searched for the others.
+        """
+
+        self.ensemble = EnsemblePredictor(classifier_list, concurrent, budget)
+        self.classifier_list = self.ensemble.classifier_list
+        self.pipeline = pipeline or Document.pipeline
+        self.all_docs = all_docs
+        self.index = index
+        self.knn_factory = knn_factory
+        self.neighbour_table = neighbour_table
+
+        # incremented by refresh(), together with the versions of the models it is a part of the cache keys.
+        self.version = 0
+        self.create_knn()
+
+        # (doc id, model version) -> topic, and (doc id, k, model version) -> (recommendations, topic). Only the
+        # documents with an id are cached, not the articles given as text.
+        self.prediction_cache = LRUCache(cache_size, cache_ttl) if cache_size else None
+        self.recommendation_cache = LRUCache(cache_size, cache_ttl) if cache_size else None
+
+    def create_knn(self):
+
+        self.knn = dict()
+        self.docs = dict()
+
+        for topic, docs in self.all_docs.items():
+            self.knn[topic] = self.knn_factory(docs)
+
+            for doc in docs:
+                self.docs[doc_id(doc)] = doc
+
+    def refresh(self):
+        """
+        Build the knn indexes again, after documents were added or their vectors changed, and add the new documents to
+        the neighbour table. Cached results are not used any more.
+        """
+
+        self.version += 1
+        self.create_knn()
+
+        if self.neighbour_table is not None:
+            self.neighbour_table.refresh(self.all_docs)
+
+    def reindex(self):
+        """
+        Recompute the weights of the index after documents were added to it or removed from it, and refresh the knn
+        indexes with the new vectors. The index version changes, so the cached results are not used any more.
+        """
+
+        if self.index is None:
+            raise ValueError("The recommender has no index.")
+
+        self.index.refresh()
+
+        # the indexed (training) documents are compared by their tfidfie weights, which refresh() replaced.
+        for doc in self.index.docs:
+            doc.vector = doc.tfidfie
+
+        # the neighbours of the table were found with the old vectors.
+        if self.neighbour_table is not None:
+            self.neighbour_table.rebuild(self.all_docs)
+
+        self.refresh()
+
+    def find_k_neighbours(self, doc, topic, k):
+        """
+        :return: the k nearest documents of the topic, from the neighbour table if possible.
+        """
+
+        table = self.neighbour_table
+
+        if table is not None and doc.f_path is not None and doc.topic == topic and k <= table.k:
+            ids = table.lookup(doc_id(doc), k)
+
+            if ids is not None and len(ids) == min(k, len(self.all_docs[topic]) - 1):
+                neighbours = [self.docs.get(d_id) for d_id in ids]
+
+                # a table of other documents is not used.
+                if None not in neighbours:
+                    return neighbours
+
+        return self.knn[topic].find_k_neighbours(doc, k)
+
+    def model_version(self):
+        """
+        :return: versions of the classifiers, the index and the knn indexes. It changes whenever one of them is trained
+        or updated.
+        """
+
+        index_version = self.index.version if self.index is not None else None
+
+        return tuple(classifier.version for classifier in self.classifier_list) + (index_version, self.version)
+
+    def cache_key(self, cache, doc, *parts):
+        """
+        :return: key of the doc in the cache, None if the cache is disabled or the doc has no id.
+        """
+
+        if cache is None or doc.f_path is None:
+            return None
+
+        return (doc_id(doc),) + parts
+
+    def cache_stats(self):
+        """
+        :return: counters of the prediction and the recommendation caches
+        """
+
+        if self.prediction_cache is None:
+            return dict()
+
+        return {'predictions': self.prediction_cache.stats(), 'recommendations': self.recommendation_cache.stats()}
+
+    def document(self, doc_or_text):
+        """
+        :param doc_or_text: a document, the id of a document, or the text of an article
+        :return: the document
+        """
+
+        if not isinstance(doc_or_text, string_types):
+            return doc_or_text
+
+        doc = self.docs.get(doc_or_text)
+
+        if doc is None:
+            doc = Document.from_text(doc_or_text, pipeline=self.pipeline)
+
+        return doc
+
+    def predict(self, doc_or_text):
+
+        return self.predict_batch([doc_or_text])[0]
+
+    def predict_batch(self, docs_or_texts):
+        """
+        :param docs_or_texts: list of documents, document ids or article texts
+        :return: list of the predicted topics
+        """
+
+        docs = [self.document(item) for item in docs_or_texts]
+        cache = self.prediction_cache
+        version = self.model_version()
+
+        keys = [self.cache_key(cache, doc, version) for doc in docs]
+        topics = [cache.get(key) if key is not None else None for key in keys]
+        missing = [i for i in range(len(docs)) if topics[i] is None]
+
+        if not missing:
+            return topics
+
+        # every classifier classifies all the open documents at once.
+        predictions = self.ensemble.predict_batch([docs[i] for i in missing])
+
+        for i, prediction in zip(missing, predictions):
+            topics[i] = prediction
+
+            if keys[i] is not None:
+                cache.put(keys[i], topics[i])
+
+        return topics
+
+    def recommend(self, doc_or_text, k):
+        """
+        Recommend the k closest documents of the predicted topic.
+        :param doc_or_text: a document, the id of a document, or the text of an article
+        :param k: number of recommendations
+        :return: list of k documents
+        """
+
+        return self.recommend_batch([doc_or_text], k)[0]
+
+    def recommend_batch(self, docs_or_texts, k, return_topics=False):
+        """
+        :param docs_or_texts: list of documents, document ids or article texts
+        :param k: number of recommendations per document
+        :param return_topics: return the predicted topics as well.
+        :return: list of recommendations, a list of k documents for every item. If return_topics is set, also the list
+        of the predicted topics.
+        """
+
+        docs = [self.document(item) for item in docs_or_texts]
+        cache = self.recommendation_cache
+        version = self.model_version()
+
+        keys = [self.cache_key(cache, doc, k, version) for doc in docs]
+        results = [cache.get(key) if key is not None else None for key in keys]
+        missing = [i for i in range(len(docs)) if results[i] is None]
+
+        if missing:
+            predictions = self.predict_batch([docs[i] for i in missing])
+
+            for i, prediction in zip(missing, predictions):
+                results[i] = (self.find_k_neighbours(docs[i], prediction, k), prediction)
+
+                if keys[i] is not None:
+                    cache.put(keys[i], results[i])
+
+        # the lists are copied, so the callers can not change the cached ones.
+        recommendations = [list(neighbours) for neighbours, topic in results]
+
+        if return_topics:
+            return recommendations, [topic for neighbours, topic in results]
+
+        return recommendations
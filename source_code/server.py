@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+
+
+"""
+Problem Definition :
+
+This script serves the recommendations over HTTP with JSON requests and responses, using asyncio. The models are
+prepared once at the start (see main.prepare_models, use --model-dir to load them instead of training). Concurrent
+requests are coalesced into micro batches, so the classifiers and the knn search run once per batch instead of once per
+request. Requires python 3.
+
+Endpoints:
+
+POST /recommend  {"id": "tech/001.txt", "k": 5} or {"text": "title\\narticle text", "k": 5}
+POST /article    {"id": "tech/001.txt"}
+GET  /health
+GET  /stats
+
+"""
+
+__author__ = 'vivek'
+
+import json
+import time
+import asyncio
+import argparse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from document import Document
+from recommender import Recommender, doc_id
+from knn import KNN
+from main import prepare_models, add_model_arguments, model_options, add_knn_arguments, knn_factory, \
+    add_ensemble_arguments, ensemble_options, neighbour_options, prepare_neighbours, open_article_store
+
+reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+           500: 'Internal Server Error'}
+
+
+class MicroBatcher(object):
+    """
+    Collects the submitted items into batches of at most max_batch_size items. A batch is handled as soon as it is full,
+    or max_wait seconds after its first item arrived. The handler runs in a single worker thread, so the event loop keeps
+    accepting requests, which form the next batch, while a batch is handled.
+    """
+
+    def __init__(self, handler, max_batch_size=32, max_wait=0.002):
+        """
+        :param handler: function of a list of items, which returns the list of their results. An exception returned as
+        the result of an item is raised to the submitter of that item only, an exception raised by the handler to all
+        the submitters of the batch.
+        :param max_batch_size: maximum number of items of a batch
+        :param max_wait: maximum seconds the first item of a batch waits for more items
+        """
+
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.executor = ThreadPoolExecutor(1)
+
+        self.queue = None
+        self.task = None
+
+        self.batch_count = 0
+        self.item_count = 0
+        self.handle_time = 0.0
+
+    def start(self):
+
+        self.queue = asyncio.Queue()
+        self.task = asyncio.ensure_future(self.run())
+
+    async def stop(self):
+
+        self.task.cancel()
+
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+        self.executor.shutdown()
+
+    async def submit(self, item):
+        """
+        :return: result of the item, once its batch is handled
+        """
+
+        future = asyncio.get_event_loop().create_future()
+        await self.queue.put((item, future))
+
+        return await future
+
+    async def next_batch(self):
+
+        loop = asyncio.get_event_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+
+            timeout = deadline - loop.time()
+
+            if timeout <= 0:
+                break
+
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def run(self):
+
+        loop = asyncio.get_event_loop()
+
+        while True:
+            batch = await self.next_batch()
+            items = [item for item, future in batch]
+            start_time = time.time()
+
+            try:
+                results = await loop.run_in_executor(self.executor, self.handler, items)
+            except Exception as e:
+                for item, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for (item, future), result in zip(batch, results):
+                    if future.done():
+                        continue
+
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+
+            self.batch_count += 1
+            self.item_count += len(batch)
+            self.handle_time += time.time() - start_time
+
+    def stats(self):
+
+        return {
+            'batches': self.batch_count,
+            'items': self.item_count,
+            'mean_batch_size': float(self.item_count) / self.batch_count if self.batch_count else 0.0,
+            'handle_time': self.handle_time
+        }
+
+
+class HTTPError(Exception):
+
+    def __init__(self, status, message):
+        super(HTTPError, self).__init__(message)
+        self.status = status
+
+
+class RecommendationServer(object):
+
+    def __init__(self, recommender, max_batch_size=32, max_wait=0.002, max_k=100, max_body_size=1 << 20):
+
+        self.recommender = recommender
+        self.batcher = MicroBatcher(self.recommend_batch, max_batch_size, max_wait)
+        self.max_k = max_k
+        self.max_body_size = max_body_size
+
+        self.request_count = 0
+        self.error_count = 0
+
+    def recommend_batch(self, items):
+        """
+        Handle a batch of (document id, document, k) items. This runs in the worker thread of the batcher.
+        :return: list of (topic, recommended documents) pairs, or of the exceptions of the items which failed.
+        """
+
+        try:
+            return self.recommend_items(items)
+        except Exception:
+            # the whole batch fails with one bad item, so the items are handled again one by one, and only the bad
+            # ones fail.
+            results = list()
+
+            for item in items:
+                try:
+                    results.append(self.recommend_items([item])[0])
+                except Exception as e:
+                    results.append(e)
+
+            return results
+
+    def recommend_items(self, items):
+
+        recommender = self.recommender
+        docs = [recommender.docs[d_id] if d_id is not None else doc for d_id, doc, k in items]
+
+        # items are grouped by k, as k is a part of the keys of the cached recommendations.
+        positions = defaultdict(list)
+        for i in range(len(items)):
+            positions[items[i][2]].append(i)
+
+        results = [None] * len(items)
+
+        for k, k_positions in positions.items():
+            recommendations, topics = recommender.recommend_batch([docs[i] for i in k_positions], k, return_topics=True)
+
+            for i, neighbours, topic in zip(k_positions, recommendations, topics):
+                results[i] = (topic, neighbours)
+
+        return results
+
+    def parse_recommend_request(self, body):
+        """
+        :return: (document id, document, k) item of the request body, the document is None for an article id.
+        """
+
+        try:
+            request = json.loads(body.decode('utf-8'))
+        except ValueError:
+            raise HTTPError(400, "request body is not valid json")
+
+        if not isinstance(request, dict):
+            raise HTTPError(400, "request must be a json object")
+
+        k = request.get('k', 5)
+
+        if not isinstance(k, int) or isinstance(k, bool) or k < 1 or k > self.max_k:
+            raise HTTPError(400, "k must be an integer from 1 to {}".format(self.max_k))
+
+        if 'id' in request:
+            if request['id'] not in self.recommender.docs:
+                raise HTTPError(404, "unknown article id: {}".format(request['id']))
+            return request['id'], None, k
+
+        if isinstance(request.get('text'), str) and request['text'].strip():
+            doc = Document.from_text(request['text'], pipeline=self.recommender.pipeline)
+
+            # the first line is the title, the vector is made of the words of the lines after it.
+            if not doc.vector:
+                raise HTTPError(400, "text has no words after its first (title) line")
+
+            return None, doc, k
+
+        raise HTTPError(400, "request must have an article 'id' or a non empty 'text'")
+
+    def parse_article_request(self, body):
+        """
+        :return: the document of the article id of the request body
+        """
+
+        try:
+            request = json.loads(body.decode('utf-8'))
+        except ValueError:
+            raise HTTPError(400, "request body is not valid json")
+
+        if not isinstance(request, dict) or 'id' not in request:
+            raise HTTPError(400, "request must have an article 'id'")
+
+        doc = self.recommender.docs.get(request['id'])
+
+        if doc is None:
+            raise HTTPError(404, "unknown article id: {}".format(request['id']))
+
+        return doc
+
+    async def dispatch(self, method, path, body):
+        """
+        :return: status code and json payload of the response
+        """
+
+        if path == '/recommend':
+            if method != 'POST':
+                raise HTTPError(405, "use POST")
+
+            topic, neighbours = await self.batcher.submit(self.parse_recommend_request(body))
+
+            return 200, {
+                'topic': topic,
+                'recommendations': [{'id': doc_id(doc), 'title': doc.title.strip()} for doc in neighbours]
+            }
+
+        if path == '/article':
+            if method != 'POST':
+                raise HTTPError(405, "use POST")
+
+            doc = self.parse_article_request(body)
+
+            # the text is read from the article store or the file, not held by the server.
+            return 200, {'id': doc_id(doc), 'topic': doc.topic, 'title': doc.title.strip(), 'text': doc.text}
+
+        if method != 'GET':
+            raise HTTPError(405, "use GET")
+
+        if path == '/health':
+            return 200, {'status': 'ok', 'docs': len(self.recommender.docs)}
+
+        if path == '/stats':
+            stats = self.batcher.stats()
+            stats.update(requests=self.request_count, errors=self.error_count, cache=self.recommender.cache_stats(),
+                         ensemble=self.recommender.ensemble.stats())
+            return 200, stats
+
+        raise HTTPError(404, "unknown path: {}".format(path))
+
+    async def read_request(self, reader):
+        """
+        :return: method, path, headers and body of the next request of the connection, None once it is closed.
+        """
+
+        line = await reader.readline()
+
+        if not line.strip():
+            return None
+
+        try:
+            method, path, version = line.decode('latin-1').split()
+        except ValueError:
+            raise HTTPError(400, "malformed request line")
+
+        headers = dict()
+
+        while True:
+            line = await reader.readline()
+
+            if line in (b'\r\n', b'\n', b''):
+                break
+
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get('content-length', 0) or 0)
+        except ValueError:
+            raise HTTPError(400, "invalid content-length")
+
+        if length < 0:
+            raise HTTPError(400, "invalid content-length")
+
+        if length > self.max_body_size:
+            raise HTTPError(413, "request body is larger than {} bytes".format(self.max_body_size))
+
+        body = await reader.readexactly(length) if length else b''
+
+        return method, path.split('?')[0], headers, body
+
+    def write_response(self, writer, status, payload, keep_alive):
+
+        body = json.dumps(payload).encode('utf-8')
+        head = ("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\nConnection: {}\r\n\r\n"
+                .format(status, reasons[status], len(body), 'keep-alive' if keep_alive else 'close'))
+
+        writer.write(head.encode('latin-1') + body)
+
+    async def handle_connection(self, reader, writer):
+
+        try:
+            while True:
+                keep_alive = False
+
+                try:
+                    request = await self.read_request(reader)
+
+                    if request is None:
+                        break
+
+                    method, path, headers, body = request
+                    keep_alive = headers.get('connection', '').lower() != 'close'
+                    self.request_count += 1
+
+                    status, payload = await self.dispatch(method, path, body)
+                except HTTPError as e:
+                    self.error_count += 1
+                    status, payload = e.status, {'error': str(e)}
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except Exception as e:
+                    self.error_count += 1
+                    status, payload = 500, {'error': repr(e)}
+
+                self.write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8080):
+
+        self.batcher.start()
+        server = await asyncio.start_server(self.handle_connection, host, port)
+
+        print("Serving recommendations on http://{}:{}/".format(host, port))
+
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.batcher.stop()
+
+
+def main(host='127.0.0.1', port=8080, max_batch_size=32, max_wait=0.002, cache_size=10000, cache_ttl=None,
+         knn_factory=KNN, concurrent=False, budget=None, neighbour_path=None, neighbour_k=20, article_store=None,
+         **options):
+
+    store = open_article_store(article_store, options['t_path']) if article_store else None
+
+    try:
+        all_docs, test_docs, classifier_list, pipeline, index, train_fingerprint = prepare_models(article_store=store,
+                                                                                                  **options)
+
+        table = prepare_neighbours(all_docs, neighbour_path, neighbour_k, options.get('workers', 1),
+                                   train_fingerprint) if neighbour_path else None
+
+        recommender = Recommender(all_docs, classifier_list, pipeline, index, cache_size=cache_size,
+                                  cache_ttl=cache_ttl, knn_factory=knn_factory, concurrent=concurrent, budget=budget,
+                                  neighbour_table=table)
+        server = RecommendationServer(recommender, max_batch_size, max_wait)
+
+        try:
+            asyncio.run(server.serve(host, port))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            recommender.ensemble.close()
+    finally:
+        if store is not None:
+            store.close()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="News recommendation HTTP server.")
+    add_model_arguments(parser)
+    add_knn_arguments(parser)
+    add_ensemble_arguments(parser)
+    parser.add_argument('--host', default='127.0.0.1',
+                        help="address to listen on.")
+    parser.add_argument('--port', type=int, default=8080,
+                        help="port to listen on.")
+    parser.add_argument('--max-batch-size', type=int, default=32,
+                        help="maximum number of requests handled in one batch.")
+    parser.add_argument('--max-wait', type=float, default=2.0,
+                        help="maximum milliseconds a request waits for more requests to form a batch.")
+    parser.add_argument('--cache-size', type=int, default=10000,
+                        help="number of cached recommendations of article ids, 0 disables the cache.")
+    parser.add_argument('--cache-ttl', type=float, default=None,
+                        help="seconds a cached recommendation stays valid. By default until it is evicted.")
+    args = parser.parse_args()
+
+    main(host=args.host, port=args.port, max_batch_size=args.max_batch_size, max_wait=args.max_wait / 1000.0,
+         cache_size=args.cache_size, cache_ttl=args.cache_ttl, knn_factory=knn_factory(args),
+         **dict(model_options(args), **dict(ensemble_options(args), **neighbour_options(args))))
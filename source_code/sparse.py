@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script provides a vocabulary which interns terms into integer ids, and a compact CSR (compressed sparse row)
+matrix built on numpy arrays. They are shared by the array based indexes and classifiers.
+
+"""
+
+__author__ = 'vivek'
+
+import numpy as np
+
+
+class Vocabulary(object):
+
+    def __init__(self, terms=None):
+        # stores (term, id)
+        self.term_ids = dict()
+        # stores terms in the order of their ids
+        self.terms = list()
+
+        if terms:
+            for term in terms:
+                self.add(term)
+
+    def __len__(self):
+
+        return len(self.terms)
+
+    def __contains__(self, term):
+
+        return term in self.term_ids
+
+    def add(self, term):
+        """
+        Intern the term.
+        :param term: term string
+        :return: id of the term
+        """
+
+        term_id = self.term_ids.get(term)
+
+        if term_id is None:
+            term_id = len(self.terms)
+            self.term_ids[term] = term_id
+            self.terms.append(term)
+
+        return term_id
+
+    def get(self, term, default=None):
+
+        return self.term_ids.get(term, default)
+
+    def ids(self, tokens, add=False):
+        """
+        Convert the tokens to term ids.
+        :param tokens: list of tokens
+        :param add: add the unknown tokens to the vocabulary, otherwise skip them
+        :return: list of term ids
+        """
+
+        if add:
+            return [self.add(token) for token in tokens]
+
+        term_ids = self.term_ids
+
+        return [term_ids[token] for token in tokens if token in term_ids]
+
+
+class CsrMatrix(object):
+
+    def __init__(self, data, indices, indptr, shape):
+        self.data = data
+        self.indices = indices
+        self.indptr = indptr
+        self.shape = shape
+
+    @classmethod
+    def from_rows(cls, rows, vocab, add=True, dtype=np.float64):
+        """
+        Create a matrix from the list of (term, value) dicts, one per row.
+        :param rows: list of dicts
+        :param vocab: Vocabulary used to map the terms to column ids
+        :param add: add the unknown terms to the vocabulary, otherwise skip them
+        :param dtype: type of the values
+        :return: CsrMatrix
+        """
+
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        indices, data = list(), list()
+
+        for i in range(len(rows)):
+            row = rows[i]
+
+            if add:
+                terms = list(row.keys())
+                indices.extend(vocab.ids(terms, add=True))
+            else:
+                terms = [term for term in row.keys() if term in vocab]
+                indices.extend(vocab.ids(terms))
+
+            data.extend(row[term] for term in terms)
+            indptr[i + 1] = len(indices)
+
+        return cls(np.array(data, dtype=dtype), np.array(indices, dtype=np.int32), indptr,
+                   (len(rows), len(vocab)))
+
+    @classmethod
+    def from_tokens(cls, token_lists, vocab, dtype=np.float64):
+        """
+        Create a count matrix from the token lists, one per row. Unknown tokens are skipped, and a repeated token is
+        stored once per occurrence, which the products sum up like a count.
+        :param token_lists: list of lists of tokens
+        :param vocab: Vocabulary used to map the tokens to column ids
+        :return: CsrMatrix
+        """
+
+        indptr = np.zeros(len(token_lists) + 1, dtype=np.int64)
+        indices = list()
+
+        for i in range(len(token_lists)):
+            indices.extend(vocab.ids(token_lists[i]))
+            indptr[i + 1] = len(indices)
+
+        return cls(np.ones(len(indices), dtype=dtype), np.array(indices, dtype=np.int32), indptr,
+                   (len(token_lists), len(vocab)))
+
+    @property
+    def nnz(self):
+
+        return len(self.data)
+
+    def with_data(self, data):
+        """
+        New matrix with the same structure and the given values. The index arrays are shared, not copied.
+        """
+
+        return CsrMatrix(data, self.indices, self.indptr, self.shape)
+
+    def append_rows(self, other):
+        """
+        :return: matrix with the rows of other below the rows of this one. The column count is the larger of both.
+        """
+
+        indptr = np.concatenate([self.indptr, other.indptr[1:] + self.indptr[-1]])
+
+        return CsrMatrix(np.concatenate([self.data, other.data]), np.concatenate([self.indices, other.indices]),
+                         indptr, (self.shape[0] + other.shape[0], max(self.shape[1], other.shape[1])))
+
+    def row_slice(self, start, end):
+        """
+        :return: matrix of the rows start to end. The value arrays are views, not copies.
+        """
+
+        first, last = self.indptr[start], self.indptr[end]
+
+        return CsrMatrix(self.data[first:last], self.indices[first:last], self.indptr[start:end + 1] - first,
+                         (end - start, self.shape[1]))
+
+    def take_rows(self, rows):
+        """
+        :param rows: sorted array of row ids
+        :return: matrix of the given rows
+        """
+
+        lengths = np.diff(self.indptr)[rows]
+        keep = np.zeros(self.shape[0], dtype=bool)
+        keep[rows] = True
+        values = keep[self.row_ids()]
+
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+
+        return CsrMatrix(self.data[values], self.indices[values], indptr, (len(rows), self.shape[1]))
+
+    def row(self, i):
+        """
+        :return: (column ids, values) of the row i
+        """
+
+        start, end = self.indptr[i], self.indptr[i + 1]
+
+        return self.indices[start:end], self.data[start:end]
+
+    def row_ids(self):
+        """
+        :return: row id of every stored value
+        """
+
+        return np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+
+    def row_sums(self, data=None):
+
+        if data is None:
+            data = self.data
+
+        return np.bincount(self.row_ids(), weights=data, minlength=self.shape[0])
+
+    def row_norms(self):
+
+        return np.sqrt(self.row_sums(self.data ** 2))
+
+    def normalize_rows(self):
+        """
+        :return: matrix with every row divided by its l2 norm. Rows with zero norm are left unchanged.
+        """
+
+        norms = self.row_norms()
+        norms[norms == 0] = 1.0
+
+        return self.with_data(self.data / norms[self.row_ids()])
+
+    def dot(self, dense):
+        """
+        Product with a dense matrix.
+        :param dense: array of shape (columns, m)
+        :return: array of shape (rows, m)
+        """
+
+        dense = np.asarray(dense)
+        result = np.zeros((self.shape[0], dense.shape[1]), dtype=np.result_type(self.data, dense))
+
+        if self.nnz == 0:
+            return result
+
+        products = dense[self.indices] * self.data[:, None]
+
+        # reduceat can not handle empty rows, so only the non empty rows are reduced.
+        non_empty = np.diff(self.indptr) > 0
+        result[non_empty] = np.add.reduceat(products, self.indptr[:-1][non_empty], axis=0)
+
+        return result
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script tests the array file format: the round trip of the arrays and the meta data, memory-mapped or read, and the
+packed strings.
+
+"""
+
+__author__ = 'vivek'
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from arrayfile import write_arrays, read_arrays, pack_strings, unpack_strings, ALIGNMENT
+
+
+class ArrayFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'test.arrays')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        arrays = {
+            'floats': np.linspace(0, 1, 15).reshape(3, 5),
+            'ints': np.array([1, -2, 3], dtype=np.int32),
+            'bytes': np.arange(7, dtype=np.uint8),
+            'empty': np.zeros((0, 2), dtype=np.int64),
+            'scalar': np.array(2.5),
+            'strided': np.arange(20, dtype=np.int64)[::3]
+        }
+        meta = {'version': 3, 'name': u'caf\xe9', 'stats': {'f_measure': 0.9}}
+
+        for use_mmap in (True, False):
+            write_arrays(self.path, arrays, meta)
+            loaded_meta, loaded = read_arrays(self.path, use_mmap)
+
+            self.assertEqual(loaded_meta, meta)
+            self.assertEqual(sorted(loaded.keys()), sorted(arrays.keys()))
+
+            for name, array in arrays.items():
+                self.assertEqual(loaded[name].dtype, array.dtype)
+                self.assertEqual(loaded[name].shape, array.shape)
+                np.testing.assert_array_equal(loaded[name], array)
+                self.assertFalse(loaded[name].flags.writeable)
+
+    def test_alignment(self):
+        write_arrays(self.path, {'a': np.arange(3, dtype=np.uint8), 'b': np.arange(5, dtype=np.float64)})
+        meta, arrays = read_arrays(self.path)
+
+        for array in arrays.values():
+            self.assertEqual(array.__array_interface__['data'][0] % ALIGNMENT, 0)
+
+    def test_replace(self):
+        write_arrays(self.path, {'a': np.arange(4)})
+        meta, old = read_arrays(self.path)
+
+        # the file is replaced, the arrays mapped from the old one stay readable.
+        write_arrays(self.path, {'a': np.arange(4) * 10})
+        meta, new = read_arrays(self.path)
+
+        np.testing.assert_array_equal(old['a'], np.arange(4))
+        np.testing.assert_array_equal(new['a'], np.arange(4) * 10)
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+
+    def test_not_an_array_file(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not an array file')
+
+        self.assertRaises(ValueError, read_arrays, self.path)
+
+    def test_strings(self):
+        strings = ['alpha', '', 'beta', u'caf\xe9']
+        offsets, blob = pack_strings(strings)
+
+        self.assertEqual(len(offsets), len(strings) + 1)
+        self.assertEqual(unpack_strings(offsets, blob), [s.encode('utf-8') if str is bytes else s for s in strings])
+
+        offsets, blob = pack_strings([])
+        self.assertEqual(unpack_strings(offsets, blob), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
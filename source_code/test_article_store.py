@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script tests the article store: the round trip of the articles through the data file and its index, appending to
+a reopened store, and articles whose content changed.
+
+"""
+
+__author__ = 'vivek'
+
+import os
+import shutil
+import tempfile
+import unittest
+from article_store import ArticleStore
+from document import Document, TokenPipeline
+
+articles = [
+    ('tech/001.txt', b'Phones get faster\n\nThe new chips double the speed of phones.\n'),
+    ('sport/001.txt', b'Team wins the cup\n\nThe final ended two to one.\n'),
+    ('tech/002.txt', b'')
+]
+
+
+class ArticleStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'articles')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assert_articles(self, store, expected):
+
+        self.assertEqual(len(store), len(expected))
+
+        for a_id, data in expected:
+            self.assertIn(a_id, store)
+            self.assertEqual(store.read(a_id), data)
+
+    def test_round_trip(self):
+        store = ArticleStore(self.path)
+        self.assertEqual(store.add_articles(articles), 3)
+        self.assert_articles(store, articles)
+        store.close()
+
+        store = ArticleStore(self.path)
+        self.assert_articles(store, articles)
+        self.assertEqual(store.title('tech/001.txt'), 'Phones get faster\n')
+        self.assertEqual(store.text('sport/001.txt'), '\n The final ended two to one.\n')
+        self.assertEqual(store.title('tech/002.txt'), '')
+        store.close()
+
+    def test_append(self):
+        store = ArticleStore(self.path)
+        store.add_articles(articles[:2])
+        store.close()
+
+        store = ArticleStore(self.path)
+        self.assertEqual(store.add_articles(articles), 1)
+        store.close()
+
+        self.assert_articles(ArticleStore(self.path), articles)
+
+    def test_changed_article(self):
+        store = ArticleStore(self.path)
+        store.add_articles(articles)
+        store.close()
+
+        changed = b'Phones get slower\n\nThe old chips halve the speed of phones.\n'
+        store = ArticleStore(self.path)
+        size = store.size
+
+        self.assertFalse(store.append('sport/001.txt', articles[1][1]))
+        self.assertTrue(store.append('tech/001.txt', changed))
+        self.assertEqual(store.read('tech/001.txt'), changed)
+        self.assertEqual(store.size, size + len(changed))
+        store.close()
+
+        expected = [('tech/001.txt', changed)] + articles[1:]
+        store = ArticleStore(self.path)
+        self.assert_articles(store, expected)
+        self.assertEqual(store.add_articles(expected), 0)
+        store.close()
+
+    def test_unsaved_bytes(self):
+        store = ArticleStore(self.path)
+        store.add_articles(articles[:1])
+        store.close()
+
+        # a run which appended an article, but stopped before it saved the index.
+        store = ArticleStore(self.path)
+        store.append('sport/001.txt', articles[1][1])
+        store.writer.close()
+        store.writer = None
+
+        store = ArticleStore(self.path)
+        store.append('tech/002.txt', b'Chips\n')
+        store.close()
+
+        self.assert_articles(ArticleStore(self.path), [articles[0], ('tech/002.txt', b'Chips\n')])
+
+    def test_document_content(self):
+        store = ArticleStore(self.path)
+        store.add_articles(articles)
+
+        # the document is made from the content it is given, even if the store holds another one.
+        content = ['Phones get slower\n', '\n', 'The old chips halve the speed.\n']
+        doc = Document(os.path.join(self.directory, '001.txt'), 'tech', pipeline=TokenPipeline('none'),
+                       content=content, store=store)
+
+        self.assertEqual(doc.title, 'Phones get slower\n')
+        self.assertIn('slower', doc.title_tokens)
+        self.assertIn('halve', doc.text_tokens)
+        store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script tests the reading of the corpus: the documents tokenized by the worker processes, and the documents
+streamed from the corpus directory or from a zip archive of it, are the same, and in the same order, as the documents
+read serially.
+
+"""
+
+__author__ = 'vivek'
+
+import os
+import shutil
+import tempfile
+import zipfile
+import unittest
+from corpus import read_corpus, iter_directory, iter_zip, iter_corpus
+from token_cache import TokenCache
+from document import Document
+from test_recommender import articles
+
+
+def write_corpus(t_path):
+    """
+    Write the test articles as a corpus directory, one subdirectory per topic.
+    """
+
+    for topic, texts in articles.items():
+        os.makedirs(os.path.join(t_path, topic))
+
+        for i in range(len(texts)):
+            with open(os.path.join(t_path, topic, '%03d.txt' % (i + 1)), 'w') as f:
+                f.write(texts[i])
+
+
+def write_zip(z_path, t_path):
+    """
+    Archive the corpus directory, its members are named like bbc/tech/001.txt.
+    """
+
+    archive = zipfile.ZipFile(z_path, 'w')
+
+    try:
+        for topic in sorted(os.listdir(t_path)):
+            for f in sorted(os.listdir(os.path.join(t_path, topic))):
+                archive.write(os.path.join(t_path, topic, f), '/'.join(['bbc', topic, f]))
+    finally:
+        archive.close()
+
+
+def tokens(docs):
+
+    return [(doc.topic, doc.title, doc.title_tokens, doc.text_tokens, dict(doc.tf)) for doc in docs]
+
+
+def summary(all_docs):
+
+    return dict((topic, [(doc.f_path, doc.title, doc.title_tokens, doc.text_tokens, dict(doc.tf)) for doc in docs])
+                for topic, docs in all_docs.items())
+
+
+class CorpusTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.t_path = os.path.join(self.directory, 'bbc')
+        write_corpus(self.t_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_read_corpus(self):
+        all_docs, topic_list = read_corpus(self.t_path)
+
+        self.assertEqual(topic_list, ['sport', 'tech'])
+        self.assertEqual([doc.f_path for doc in all_docs['tech']],
+                         [os.path.join(self.t_path, 'tech', '%03d.txt' % i) for i in (1, 2, 3)])
+        self.assertEqual(all_docs['tech'][1].title_tokens, ['chip', 'maker'])
+
+    def test_workers(self):
+        for compact in (False, True):
+            serial, topic_list = read_corpus(self.t_path, compact=compact)
+            parallel, parallel_topics = read_corpus(self.t_path, workers=2, chunk_size=2, compact=compact)
+
+            self.assertEqual(parallel_topics, topic_list)
+            self.assertEqual(summary(parallel), summary(serial))
+
+    def test_iter_directory(self):
+        all_docs, topic_list = read_corpus(self.t_path)
+        expected = [doc for topic in topic_list for doc in all_docs[topic]]
+
+        stream = iter_corpus(self.t_path)
+        first = next(stream)
+
+        self.assertEqual(first.f_path, expected[0].f_path)
+        self.assertEqual(tokens([first] + list(stream)), tokens(expected))
+        self.assertEqual([doc.f_path for doc in iter_directory(self.t_path, compact=True)],
+                         [doc.f_path for doc in expected])
+
+    def test_iter_zip(self):
+        z_path = os.path.join(self.directory, 'bbc.zip')
+        write_zip(z_path, self.t_path)
+        all_docs, topic_list = read_corpus(self.t_path)
+        expected = [doc for topic in topic_list for doc in all_docs[topic]]
+
+        docs = list(iter_corpus(z_path))
+
+        self.assertEqual(tokens(docs), tokens(expected))
+        self.assertEqual(docs[0].f_path, os.path.join(z_path, 'bbc', 'sport', '001.txt'))
+        self.assertEqual(tokens(iter_zip(z_path, compact=True)), tokens(expected))
+
+        zip_docs, zip_topics = read_corpus(z_path)
+        self.assertEqual(zip_topics, topic_list)
+        self.assertEqual(summary(zip_docs), summary(dict((topic, [doc for doc in docs if doc.topic == topic])
+                                                         for topic in topic_list)))
+
+    def test_cache(self):
+        path = os.path.join(self.directory, 'tokens.cache')
+        config = Document.pipeline.config
+
+        stream = iter_directory(self.t_path, cache=TokenCache(path, config))
+        next(stream)
+
+        # the cache is saved once the stream is consumed.
+        self.assertFalse(os.path.exists(path))
+        list(stream)
+        self.assertTrue(os.path.exists(path))
+
+        cached = list(iter_directory(self.t_path, cache=TokenCache(path, config)))
+        self.assertEqual(tokens(cached), tokens(iter_directory(self.t_path)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script tests the token pipeline of the documents: every normalization mode gives the same tokens as the stemmer
+and the lemmatizer applied to each token directly, also when the tokens come from the cache. It also tests that a
+CompactDocument has the same tokens, terms and tf as a Document of the same article.
+
+"""
+
+__author__ = 'vivek'
+
+import os
+import shutil
+import tempfile
+import unittest
+from nltk.stem import PorterStemmer, WordNetLemmatizer
+from document import Document, CompactDocument, TokenPipeline
+from hashing import FeatureHasher
+
+text = 'Runners were running quickly through the cities, and the geese followed the runners.'
+
+
+class TokenPipelineTest(unittest.TestCase):
+
+    def test_tokenize(self):
+        pipeline = TokenPipeline('none')
+
+        self.assertEqual(pipeline(text), ['runners', 'running', 'quickly', 'cities', 'geese', 'followed', 'runners'])
+        self.assertEqual(pipeline('An ox is by the'), [])
+
+    def test_modes(self):
+        stemmer, lemmatizer = PorterStemmer(), WordNetLemmatizer()
+        tokens = TokenPipeline('none')(text)
+
+        expected = {
+            'none': tokens,
+            'stem': [stemmer.stem(t) for t in tokens],
+            'lemmatize': [lemmatizer.lemmatize(t) for t in tokens],
+            'both': [stemmer.stem(lemmatizer.lemmatize(t)) for t in tokens]
+        }
+
+        for mode in TokenPipeline.modes:
+            pipeline = TokenPipeline(mode)
+
+            self.assertEqual(pipeline(text), expected[mode], mode)
+            # the second time the tokens come from the cache.
+            self.assertEqual(pipeline(text), expected[mode], mode)
+
+    def test_cache_size(self):
+        pipeline = TokenPipeline('stem', cache_size=2)
+
+        self.assertEqual(pipeline(text), TokenPipeline('stem')(text))
+        self.assertEqual(len(pipeline.cache), 2)
+
+    def test_unknown_mode(self):
+        self.assertRaises(ValueError, TokenPipeline, 'porter')
+
+
+class CompactDocumentTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.f_path = os.path.join(self.directory, '001.txt')
+
+        with open(self.f_path, 'w') as f:
+            f.write('Geese in the cities\n' + text + '\nThe runners saw the geese again.\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assertSameDocument(self, compact, doc):
+
+        self.assertEqual(compact.title, doc.title)
+        self.assertEqual(compact.title_tokens, doc.title_tokens)
+        self.assertEqual(compact.text_tokens, doc.text_tokens)
+        self.assertEqual(compact.tf, dict(doc.tf))
+        self.assertEqual(compact.terms, doc.terms)
+        self.assertEqual(compact.content, doc.content)
+
+    def test_round_trip(self):
+        doc = Document(self.f_path, 'tech')
+
+        self.assertSameDocument(CompactDocument(self.f_path, 'tech'), doc)
+        self.assertSameDocument(CompactDocument.from_document(doc), doc)
+
+    def test_hashed(self):
+        pipeline = TokenPipeline('lemmatize', hasher=FeatureHasher(8))
+        doc = Document(self.f_path, 'tech', pipeline=pipeline)
+
+        self.assertSameDocument(CompactDocument(self.f_path, 'tech', pipeline=pipeline), doc)
+        self.assertSameDocument(CompactDocument.from_document(doc), doc)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script tests the concurrent ensemble: the latency budget, the classifiers which are still busy with an earlier
+prediction, and the classifiers which raise an exception.
+
+"""
+
+__author__ = 'vivek'
+
+import time
+import unittest
+from ensemble import EnsemblePredictor
+
+
+class Classifier(object):
+
+    def __init__(self, f_measure, topic, delay=0.0, error=None):
+        self.stats = {'f_measure': f_measure}
+        self.topic = topic
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def classify(self, docs):
+        self.calls += 1
+        time.sleep(self.delay)
+
+        if self.error is not None:
+            raise self.error
+
+        return [self.topic] * len(docs)
+
+
+class ConcurrentEnsembleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ensemble = None
+
+    def tearDown(self):
+        self.ensemble.close()
+
+    def test_vote(self):
+        self.ensemble = EnsemblePredictor([Classifier(0.9, 'tech'), Classifier(0.8, 'sport'),
+                                           Classifier(0.7, 'sport')], concurrent=True)
+
+        self.assertEqual(self.ensemble.predict_batch(['a', 'b']), ['sport', 'sport'])
+
+    def test_error_of_other_classifier(self):
+        self.ensemble = EnsemblePredictor([Classifier(0.9, 'tech'), Classifier(0.8, 'sport', error=ValueError()),
+                                           Classifier(0.7, 'sport')], concurrent=True)
+
+        # the failed classifier drops out of the vote, and the two others differ.
+        self.assertEqual(self.ensemble.predict_batch(['a']), ['tech'])
+        self.assertEqual(self.ensemble.stats()['errors'], {'Classifier': 1})
+        self.assertEqual(self.ensemble.stats()['paths']['best'], 1)
+
+    def test_error_of_best_classifier(self):
+        self.ensemble = EnsemblePredictor([Classifier(0.9, 'tech', error=ValueError()), Classifier(0.8, 'sport'),
+                                           Classifier(0.7, 'tech')], concurrent=True)
+
+        self.assertRaises(ValueError, self.ensemble.predict_batch, ['a'])
+
+    def test_budget(self):
+        slow = [Classifier(0.8, 'sport', delay=0.3), Classifier(0.7, 'sport', delay=0.3)]
+        self.ensemble = EnsemblePredictor([Classifier(0.9, 'tech')] + slow, concurrent=True, budget=0.02)
+
+        for i in range(3):
+            start_time = time.time()
+
+            self.assertEqual(self.ensemble.predict_batch(['a']), ['tech'])
+            self.assertLess(time.time() - start_time, 0.2)
+
+        # the slow classifiers sat out the predictions which started while they were busy, which the best classifier
+        # decided without waiting for the budget.
+        self.assertEqual([classifier.calls for classifier in slow], [1, 1])
+        self.assertEqual(self.ensemble.stats()['paths']['budget'], 1)
+        self.assertEqual(self.ensemble.stats()['paths']['best'], 2)
+
+        time.sleep(0.4)
+        self.ensemble.budget = None
+
+        self.assertEqual(self.ensemble.predict_batch(['a']), ['sport'])
+        self.assertEqual([classifier.calls for classifier in slow], [2, 2])
+
+    def test_sat_out_without_budget(self):
+        slow = [Classifier(0.8, 'sport', delay=0.3), Classifier(0.7, 'sport', delay=0.3)]
+        self.ensemble = EnsemblePredictor([Classifier(0.9, 'tech')] + slow, concurrent=True, budget=0.02)
+
+        self.assertEqual(self.ensemble.predict_batch(['a']), ['tech'])
+
+        # without a budget nothing runs out, the slow classifiers still sit out while they are busy.
+        self.ensemble.budget = None
+
+        self.assertEqual(self.ensemble.predict_batch(['a']), ['tech'])
+        self.assertEqual(self.ensemble.stats()['paths']['budget'], 1)
+        self.assertEqual(self.ensemble.stats()['paths']['best'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
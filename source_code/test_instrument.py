@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script tests the timers and the counters of the instrumentation.
+
+"""
+
+__author__ = 'vivek'
+
+import unittest
+from cache import LRUCache
+from document import TokenPipeline
+from instrument import Registry, cache_counters
+from neighbours import NeighbourTable
+
+
+class TestInstrument(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+        self.methods = dict(TokenPipeline.__dict__), dict(LRUCache.__dict__)
+
+    def tearDown(self):
+        self.registry.uninstall()
+
+    def install(self):
+        self.registry.install(targets=['document.TokenPipeline.__call__'],
+                              counters=[('document.TokenPipeline.tokenize_article', 'documents_tokenized'),
+                                        ('cache.LRUCache.get', cache_counters('lru_cache'))])
+
+    def test_counters(self):
+        pipeline = TokenPipeline('none')
+        self.install()
+
+        pipeline.tokenize_article(['Markets rally\n', 'Shares rallied as markets opened higher.\n'])
+        pipeline.tokenize_article(['Markets fall\n', 'Shares fell as markets closed lower.\n'])
+
+        self.assertEqual(self.registry.counters['documents_tokenized'], 2)
+        self.assertEqual(self.registry.stages['TokenPipeline.__call__'].calls, 4)
+
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.get('a')
+        cache.get('b')
+        cache.get('c')
+
+        self.assertEqual(self.registry.counters['lru_cache_hits'], 1)
+        self.assertEqual(self.registry.counters['lru_cache_misses'], 2)
+        self.assertIn('nrs_documents_tokenized_total 2.0', self.registry.to_prometheus())
+
+    def test_classmethod(self):
+        self.registry.install(targets=['neighbours.NeighbourTable.load'], counters=[])
+
+        self.assertRaises(IOError, NeighbourTable.load, '/nonexistent/neighbours')
+        self.assertEqual(self.registry.stages['NeighbourTable.load'].calls, 1)
+
+    def test_uninstall(self):
+        self.install()
+        self.registry.uninstall()
+
+        self.assertEqual((dict(TokenPipeline.__dict__), dict(LRUCache.__dict__)), self.methods)
+
+        TokenPipeline('none').tokenize_article(['Title\n', 'Some text\n'])
+        self.assertEqual(self.registry.counters, dict())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script tests the k-means classifiers on small synthetic corpora.
+
+"""
+
+__author__ = 'vivek'
+
+import random
+import unittest
+from collections import Counter
+from kmeans import MiniBatchKMeans, SparseKMeans
+
+
+class Doc(object):
+
+    def __init__(self, topic, terms):
+        self.topic = topic
+        self.terms = Counter(terms)
+
+    def document_terms(self):
+
+        return self.terms
+
+
+def make_docs(topics, per_topic=40, seed=0):
+    """
+    :return: documents sorted by topic. Every topic has its own words, and all the topics share some common words.
+    """
+
+    rand = random.Random(seed)
+    common = ['common%d' % i for i in range(5)]
+    docs = list()
+
+    for topic in topics:
+        words = [topic + '%d' % i for i in range(50)]
+
+        for i in range(per_topic):
+            # the documents share few words with the mean of their topic, so they are closer to a zero mean.
+            docs.append(Doc(topic, rand.sample(words, 5) + [rand.choice(common)]))
+
+    return docs
+
+
+def accuracy(model, docs):
+
+    predictions = model.classify(docs)
+
+    return sum(p == doc.topic for p, doc in zip(predictions, docs)) * 1.0 / len(docs)
+
+
+class MiniBatchKMeansTest(unittest.TestCase):
+
+    topics = ['business', 'entertainment', 'politics', 'sport', 'tech']
+
+    def test_topic_sorted_batches(self):
+        docs = make_docs(self.topics)
+
+        model = MiniBatchKMeans(self.topics, batch_size=16, tol=0.0)
+        model.train(docs)
+
+        self.assertGreater(accuracy(model, docs), 0.9)
+
+    def test_unseeded_clusters_are_not_assigned(self):
+        docs = make_docs(self.topics)
+
+        model = MiniBatchKMeans(self.topics, batch_size=16, tol=0.0)
+        model.reset()
+
+        # the first batches have only business and entertainment documents.
+        model.partial_fit(docs[:32])
+        model.partial_fit(docs[32:64])
+
+        sizes = model.batch_stats[-1]['cluster_sizes']
+        self.assertEqual(sum(sizes[topic] for topic in self.topics[2:]), 0)
+
+
+class SparseKMeansTest(unittest.TestCase):
+
+    def test_train(self):
+        topics = ['business', 'sport', 'tech']
+        docs = make_docs(topics)
+
+        model = SparseKMeans(topics)
+        model.train(docs)
+
+        self.assertGreater(accuracy(model, docs), 0.9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script tests the approximate nearest neighbour searches: the random hyperplane lsh index and the pruned KNN.
+
+"""
+
+__author__ = 'vivek'
+
+import random
+import unittest
+import numpy as np
+from lsh import LSHIndex, recall_at_k
+from knn import KNN
+
+
+class Doc(object):
+
+    def __init__(self, vector):
+        self.vector = vector
+
+
+def make_docs(count, seed=0):
+    """
+    :return: docs of random terms, every doc brings new terms.
+    """
+
+    rand = random.Random(seed)
+
+    return [Doc(dict(('term%d' % rand.randint(0, 10 * count), rand.random()) for j in range(10)))
+            for i in range(count)]
+
+
+class LSHIndexTest(unittest.TestCase):
+
+    def test_planes(self):
+        docs = make_docs(200)
+        index = LSHIndex(docs, n_tables=4, n_bits=4, seed=3)
+
+        # the rows are drawn in the order of the terms, as if they were drawn at once.
+        expected = np.random.RandomState(3).standard_normal((len(index.vocab), 16)).astype(np.float32)
+
+        self.assertEqual(index.planes.dtype, np.float32)
+        self.assertEqual(index.plane_count, len(index.vocab))
+        self.assertLessEqual(len(index.planes), 2 * len(index.vocab))
+        np.testing.assert_array_equal(index.planes[:index.plane_count], expected)
+
+    def test_add_documents(self):
+        docs = make_docs(100)
+        index = LSHIndex(docs[:50], n_tables=4, n_bits=4)
+        index.add_documents(docs[50:])
+
+        full = LSHIndex(docs, n_tables=4, n_bits=4)
+
+        self.assertEqual([dict(table) for table in index.tables], [dict(table) for table in full.tables])
+
+    def test_find_duplicate(self):
+        docs = make_docs(100)
+        index = LSHIndex(docs, n_tables=8, n_bits=4)
+
+        for doc in docs[:10]:
+            self.assertIs(index.find_k_neighbours(Doc(dict(doc.vector)), 1)[0], doc)
+
+    def test_recall(self):
+        docs = make_docs(100)
+        exact = KNN(docs)
+
+        stats = recall_at_k(KNN(docs), docs[:10], 5, exact)
+        self.assertEqual(stats['recall'], 1.0)
+
+        stats = recall_at_k(LSHIndex(docs, n_tables=8, n_bits=4), docs[:10], 5, exact)
+        self.assertTrue(0.0 < stats['recall'] <= 1.0)
+        self.assertTrue(0 < stats['candidates'] < 100)
+
+
+class PrunedKNNTest(unittest.TestCase):
+
+    def test_max_postings(self):
+        # the postings with the largest weights are kept, whatever their sign.
+        docs = [Doc({'a': 0.1}), Doc({'a': -0.9}), Doc({'a': 0.5}), Doc({'a': -0.2})]
+        knn = KNN(docs, max_postings=2)
+
+        self.assertEqual(sorted(knn.index['a']), [(1, -0.9), (2, 0.5)])
+
+
+if __name__ == '__main__':
+    unittest.main()
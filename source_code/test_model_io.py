@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script tests the model file format: the round trip of the arrays, the strings and the meta data, and the
+fingerprint of the training documents.
+
+"""
+
+__author__ = 'vivek'
+
+import os
+import shutil
+import tempfile
+import unittest
+from collections import Counter
+import numpy as np
+from model_io import save_model, load_model, fingerprint, dicts_to_matrix, ModelMismatchError
+from kmeans import SparseKMeans
+from sparse import Vocabulary
+from tfidf import Index
+from test_kmeans import make_docs
+
+
+class Doc(object):
+
+    def __init__(self, topic, terms):
+        self.topic = topic
+        self.tf = dict(Counter(terms))
+
+
+def make_index_docs():
+
+    return [Doc('sport', ['ball', 'goal', 'goal']), Doc('sport', ['ball', 'match']),
+            Doc('tech', ['chip', 'match']), Doc('tech', ['chip', 'phone', 'ball']), Doc('tech', ['phone', 'rare'])]
+
+
+def nonzero(counts):
+
+    return dict((term, count) for term, count in counts.items() if count)
+
+
+class ModelIOTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'test.model')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        arrays = {'weights': np.arange(12, dtype=np.float64).reshape(3, 4), 'counts': np.array([3, 1, 2], np.int64)}
+        strings = {'terms': ['alpha', 'beta', u'caf\xe9'], 'features': [7, 1, 1 << 20]}
+
+        save_model(self.path, 'Test', arrays, {'doc_count': 3}, strings)
+        meta, loaded, loaded_strings = load_model(self.path, 'Test')
+
+        self.assertEqual(meta, {'doc_count': 3})
+        self.assertEqual(sorted(loaded.keys()), ['counts', 'weights'])
+        np.testing.assert_array_equal(loaded['weights'], arrays['weights'])
+        np.testing.assert_array_equal(loaded['counts'], arrays['counts'])
+        self.assertEqual(loaded_strings['terms'], ['alpha', 'beta', u'caf\xe9'.encode('utf-8') if str is bytes
+                                                   else u'caf\xe9'])
+        self.assertEqual(loaded_strings['features'], [7, 1, 1 << 20])
+
+    def test_model_name(self):
+        save_model(self.path, 'Test', {'a': np.zeros(1)})
+
+        self.assertRaises(ValueError, load_model, self.path, 'Other')
+
+    def test_fingerprint(self):
+        ids = ['business/001.txt', 'tech/002.txt']
+        fp = fingerprint(ids, 1)
+
+        self.assertEqual(fp, fingerprint(list(ids), 1))
+        self.assertNotEqual(fp, fingerprint(ids, 7))
+        self.assertNotEqual(fp, fingerprint(ids[::-1], 1))
+
+        save_model(self.path, 'Test', {'a': np.zeros(1)}, fingerprint=fp)
+
+        load_model(self.path, 'Test', fingerprint=fp)
+        load_model(self.path, 'Test')
+        self.assertRaises(ModelMismatchError, load_model, self.path, 'Test', fingerprint=fingerprint(ids, 7))
+
+    def test_classifier_fingerprint(self):
+        topics = ['business', 'sport', 'tech']
+        docs = make_docs(topics)
+        fp = fingerprint([str(i) for i in range(len(docs))], 1)
+
+        model = SparseKMeans(topics)
+        model.train(docs)
+        model.save(self.path, fp)
+
+        loaded = SparseKMeans.load(self.path, fp)
+
+        self.assertEqual(loaded.classify(docs), model.classify(docs))
+        self.assertRaises(ModelMismatchError, SparseKMeans.load, self.path, fingerprint(['0'], 1))
+
+    def test_dicts_to_matrix(self):
+        vocab = Vocabulary(['a', 'b'])
+
+        matrix = dicts_to_matrix([{'b': 2, 'gone': 0}, {'a': 1}], vocab, np.int64)
+
+        np.testing.assert_array_equal(matrix, [[0, 2], [1, 0]])
+        self.assertRaises(ValueError, dicts_to_matrix, [{'gone': 1}], vocab)
+
+    def test_index_after_removal(self):
+        docs = make_index_docs()
+        index = Index(docs)
+        index.remove_documents(docs[-2:])
+        index.save(self.path)
+
+        rest = docs[:3]
+        loaded = Index.load(self.path, rest)
+        fresh = Index(make_index_docs()[:3])
+
+        for topic in ('sport', 'tech'):
+            self.assertEqual(nonzero(loaded.topic_doc_freqs[topic]), nonzero(fresh.topic_doc_freqs[topic]))
+        self.assertEqual(dict(loaded.information_entropy), dict(fresh.information_entropy))
+
+        loaded.add_documents(docs[-2:])
+        loaded.refresh()
+        full = Index(make_index_docs())
+
+        self.assertEqual(dict(loaded.information_entropy), dict(full.information_entropy))
+        for doc, other in zip(loaded.docs, full.docs):
+            self.assertEqual(sorted(doc.tfidfie), sorted(other.tfidfie))
+            for term in doc.tfidfie:
+                self.assertAlmostEqual(doc.tfidfie[term], other.tfidfie[term])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script tests naive bayes on hashed documents, whose signed feature counts cancel out when tokens collide.
+
+"""
+
+__author__ = 'vivek'
+
+import os
+import shutil
+import tempfile
+import unittest
+from collections import Counter
+from hashing import FeatureHasher
+from nb import NaiveBayes
+
+
+class Doc(object):
+
+    def __init__(self, topic, text_tokens, hasher):
+        self.topic = topic
+        self.text_tokens = text_tokens
+        self.tf = hasher.transform(Counter(text_tokens))
+
+
+def colliding_tokens(hasher):
+    """
+    :return: two tokens with the same feature and opposite signs
+    """
+
+    seen = dict()
+
+    for i in range(10000):
+        token = 'token' + str(i)
+        feature, sign = hasher.feature(token)
+
+        if (feature, -sign) in seen:
+            return seen[(feature, -sign)], token
+
+        seen[(feature, sign)] = token
+
+
+class NaiveBayesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_colliding_tokens(self):
+        hasher = FeatureHasher(8)
+        first, second = colliding_tokens(hasher)
+        feature = hasher.feature(first)[0]
+
+        doc = Doc('sport', [first, second], hasher)
+        self.assertNotIn(feature, doc.tf)
+
+        nb = NaiveBayes(hasher)
+        self.assertEqual(nb.term_counts(doc), {feature: 2})
+
+        # the feature of the sport docs is counted, even though their signed counts cancel out.
+        other = [t for t in ('token' + str(i) for i in range(100)) if hasher.feature(t)[0] != feature][:3]
+        nb.train([Doc('sport', [first, second], hasher), Doc('tech', other, hasher)])
+
+        self.assertEqual(nb.classify([Doc('sport', [first, first], hasher)]), ['sport'])
+        self.assertEqual(nb.classify_loop([Doc('sport', [first, first], hasher)]), ['sport'])
+
+    def test_save_load(self):
+        hasher = FeatureHasher(12)
+        docs = [Doc('sport', ['match', 'goal', 'team', 'goal'], hasher),
+                Doc('tech', ['phone', 'chip', 'software'], hasher),
+                Doc('sport', ['team', 'coach', 'match'], hasher),
+                Doc('tech', ['chip', 'network', 'phone'], hasher)]
+        tests = [Doc('sport', ['goal', 'coach'], hasher), Doc('tech', ['software', 'network'], hasher)]
+
+        nb = NaiveBayes(hasher)
+        nb.train(docs)
+        path = os.path.join(self.directory, 'nb.model')
+        nb.save(path)
+
+        loaded = NaiveBayes.load(path)
+
+        self.assertEqual(loaded.hasher.n_bits, 12)
+        self.assertEqual(loaded.classify(tests), nb.classify(tests))
+        self.assertEqual(loaded.classify(tests), ['sport', 'tech'])
+
+
+if __name__ == '__main__':
+    unittest.main()
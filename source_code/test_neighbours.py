@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script tests the neighbour table against the knn search: built serially or by a pool of processes, saved and
+loaded, and refreshed after documents were added or removed.
+
+"""
+
+__author__ = 'vivek'
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from knn import KNN
+from model_io import ModelMismatchError
+import neighbours
+from neighbours import NeighbourTable, block_scores, topic_matrix
+from recommender import doc_id
+
+
+class Doc(object):
+
+    def __init__(self, f_path, topic, vector):
+        self.f_path = f_path
+        self.topic = topic
+        self.vector = vector
+
+
+def make_docs(topics=('sport', 'tech'), per_topic=12, seed=0):
+    """
+    :return: dict of (topic, list of docs) with random vectors over a few terms
+    """
+
+    rand = random.Random(seed)
+    terms = ['term%d' % i for i in range(8)]
+
+    return dict((topic, [Doc('%s/%03d.txt' % (topic, i), topic,
+                             dict((term, rand.random()) for term in rand.sample(terms, 5)))
+                         for i in range(per_topic)]) for topic in topics)
+
+
+class NeighbourTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'neighbours.model')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assert_neighbours(self, table, all_docs, k):
+        """
+        Compare the neighbours of every document in the table with the knn search of its topic.
+        """
+
+        for docs in all_docs.values():
+            knn = KNN(docs)
+
+            for doc in docs:
+                self.assertEqual(table.lookup(doc_id(doc), k), [doc_id(d) for d in knn.find_k_neighbours(doc, k)])
+
+        self.assertEqual(len(table), sum(len(docs) for docs in all_docs.values()))
+
+    def test_build(self):
+        all_docs = make_docs()
+
+        self.assert_neighbours(NeighbourTable.build(all_docs, 4, block_size=5), all_docs, 4)
+
+    def test_block_scores(self):
+        docs = make_docs(per_topic=30)['tech']
+        matrix = topic_matrix(docs)
+
+        # the products of the chunks are the similarities of the knn search.
+        scores = block_scores(matrix, 4, 9, chunk_size=7)
+
+        for i in range(5):
+            for j in range(len(docs)):
+                expected = sum(w * docs[j].vector.get(term, 0) for term, w in docs[4 + i].vector.items())
+                self.assertAlmostEqual(scores[i, j], expected)
+
+    def test_workers(self):
+        all_docs = make_docs()
+        table = NeighbourTable.build(all_docs, 4, block_size=5)
+        min_pool_docs = neighbours.min_pool_docs
+
+        try:
+            for size in (min_pool_docs, 0):
+                # the small table is computed in process, unless the threshold is lowered.
+                neighbours.min_pool_docs = size
+                other = NeighbourTable.build(all_docs, 4, block_size=5, workers=2)
+
+                np.testing.assert_array_equal(other.neighbours, table.neighbours)
+                np.testing.assert_array_equal(other.scores, table.scores)
+        finally:
+            neighbours.min_pool_docs = min_pool_docs
+
+    def test_save_load(self):
+        all_docs = make_docs()
+        table = NeighbourTable.build(all_docs, 4)
+        table.save(self.path, 'abc')
+
+        loaded = NeighbourTable.load(self.path, 'abc')
+
+        self.assertEqual(loaded.ids, table.ids)
+        self.assertEqual(loaded.k, 4)
+        np.testing.assert_array_equal(loaded.neighbours, table.neighbours)
+        np.testing.assert_array_equal(loaded.scores, table.scores)
+        self.assertRaises(ModelMismatchError, NeighbourTable.load, self.path, 'other')
+
+    def test_refresh_added(self):
+        all_docs = make_docs()
+        table = NeighbourTable.build(dict((topic, docs[:8]) for topic, docs in all_docs.items()), 4)
+
+        self.assertEqual(table.refresh(all_docs), 8)
+        self.assert_neighbours(table, all_docs, 4)
+
+    def test_refresh_removed(self):
+        all_docs = make_docs()
+        table = NeighbourTable.build(dict((topic, docs[:8]) for topic, docs in all_docs.items()), 4)
+
+        # the removed document is a neighbour of another one of its topic, which also has new documents.
+        removed = table.lookup(doc_id(all_docs['tech'][0]))[0]
+        all_docs['tech'] = [doc for doc in all_docs['tech'] if doc_id(doc) != removed]
+
+        self.assertEqual(table.refresh(all_docs), 23)
+        self.assertNotIn(removed, table)
+        self.assert_neighbours(table, all_docs, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
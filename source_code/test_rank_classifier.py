@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script tests the rank classifier: the compiled tables of classify_batch classify the documents the same as the
+topic indexes, one token at a time, and the topic tables built by the worker processes are the same as the tables
+built serially.
+
+"""
+
+__author__ = 'vivek'
+
+import unittest
+from document import Document
+from hashing import FeatureHasher
+from rank_classifier import RankClassifier, LocalIndex
+from test_recommender import articles, make_docs
+
+queries = ['Cup match\nThe striker of the team scored a late goal.\n',
+           'Phone camera\nThe new chip makes the camera of the phone faster.\n',
+           'Chip goal\nThe team has a goal: a faster chip for the camera.\n']
+
+
+def make_corpus():
+    """
+    :return: training documents of all the topics, and documents to classify.
+    """
+
+    train_docs = [doc for topic in sorted(articles) for doc in make_docs(topic, articles[topic])]
+    test_docs = [Document(None, content=text.splitlines(True)) for text in queries]
+
+    return train_docs, test_docs
+
+
+class RankClassifierTest(unittest.TestCase):
+
+    def test_classify_batch(self):
+        train_docs, test_docs = make_corpus()
+
+        for hasher in (None, FeatureHasher(6)):
+            model = RankClassifier(hasher=hasher)
+            model.train(train_docs)
+
+            for docs in (train_docs, test_docs):
+                self.assertEqual(model.classify_batch(docs), model.classify_loop(docs))
+
+        self.assertEqual(model.classify(train_docs), [doc.topic for doc in train_docs])
+
+    def test_compile(self):
+        train_docs, test_docs = make_corpus()
+        model = RankClassifier()
+        model.train(train_docs)
+        version = model.version
+
+        index = model.index_dict['tech']
+        for token in index.topic_text_tfidf:
+            index.topic_text_tfidf[token] *= 10
+        model.compile()
+
+        self.assertEqual(model.version, version + 1)
+        self.assertEqual(model.classify_batch(test_docs), model.classify_loop(test_docs))
+
+    def test_workers(self):
+        train_docs, test_docs = make_corpus()
+        serial, parallel = RankClassifier(), RankClassifier(workers=2)
+        serial.train(train_docs)
+        parallel.train(train_docs)
+
+        self.assertEqual(sorted(parallel.index_dict), sorted(serial.index_dict))
+
+        for topic, index in serial.index_dict.items():
+            other = parallel.index_dict[topic]
+
+            self.assertEqual(other.topic_title_tfidf, index.topic_title_tfidf)
+            self.assertEqual(other.topic_text_tfidf, index.topic_text_tfidf)
+            self.assertEqual(other.title_doc_freqs, index.title_doc_freqs)
+            self.assertEqual(other.text_doc_freqs, index.text_doc_freqs)
+
+        self.assertEqual(parallel.classify(test_docs), serial.classify_loop(test_docs))
+
+    def test_topic_tables(self):
+        docs = make_docs('sport', articles['sport'])
+        exclude = ['goal', 'match']
+        index = LocalIndex(docs, exclude, ['cup'], doc_tfidf=True)
+
+        self.assertTrue(all('goal' not in tokens and 'cup' not in tokens for tokens in index.title_tokens))
+        self.assertEqual(dict(index.topic_text_tfidf),
+                         dict(index.create_topic_tfidf_index(index.text_tokens, index.text_index,
+                                                             index.count_doc_frequencies(index.text_tokens))))
+        self.assertEqual(dict(index.topic_title_tfidf),
+                         dict(index.create_topic_tfidf_index(index.title_tokens, index.title_index,
+                                                             index.count_doc_frequencies(index.title_tokens))))
+
+
+if __name__ == '__main__':
+    unittest.main()
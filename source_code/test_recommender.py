@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script tests the recommender on a few small articles, with a stub classifier which predicts the topic of the
+article.
+
+"""
+
+__author__ = 'vivek'
+
+import unittest
+from document import Document
+from tfidf import Index, SparseIndex
+from recommender import Recommender, doc_id
+
+articles = {
+    'sport': ['Cup final\nThe team won the cup final with a late goal.\n',
+              'League match\nThe striker scored a goal in the league match.\n',
+              'Transfer news\nThe club signed a striker before the match.\n'],
+    'tech': ['New phone\nThe phone has a faster chip and a better camera.\n',
+             'Chip maker\nThe chip maker sold more chips for phones.\n',
+             'Camera sensor\nThe camera sensor of the phone is larger.\n']
+}
+
+
+class TopicClassifier(object):
+
+    stats = {'f_measure': 1.0}
+    version = 0
+
+    def classify(self, docs):
+
+        return [doc.topic for doc in docs]
+
+
+def make_docs(topic, texts, start=1):
+
+    return [Document('%s/%03d.txt' % (topic, start + i), topic, content=texts[i].splitlines(True))
+            for i in range(len(texts))]
+
+
+class RecommenderTest(unittest.TestCase):
+
+    index_class = Index
+
+    def setUp(self):
+        self.all_docs = dict((topic, make_docs(topic, texts)) for topic, texts in articles.items())
+        self.index = self.index_class([doc for topic in sorted(self.all_docs) for doc in self.all_docs[topic]])
+
+        for docs in self.all_docs.values():
+            for doc in docs:
+                doc.vector = doc.tfidfie
+
+        self.recommender = Recommender(self.all_docs, [TopicClassifier()] * 3, index=self.index, cache_size=16)
+
+    def test_recommend(self):
+        doc = self.all_docs['tech'][0]
+        neighbours = self.recommender.recommend(doc, 2)
+
+        self.assertEqual(len(neighbours), 2)
+        self.assertTrue(all(n.topic == 'tech' and n is not doc for n in neighbours))
+        self.assertEqual(self.recommender.recommend(doc_id(doc), 2), neighbours)
+        self.assertEqual(self.recommender.recommendation_cache.hits, 1)
+
+    def test_reindex(self):
+        doc = self.all_docs['sport'][0]
+        self.recommender.recommend(doc, 2)
+
+        new_text = 'Goal of the season\nA late goal won the cup final for the team.\n'
+        new_docs = make_docs('sport', [new_text], 4)
+        self.all_docs['sport'] += new_docs
+        self.index.add_documents(new_docs)
+        self.recommender.reindex()
+
+        # the index version changed, so the cached recommendation is not used.
+        neighbours = self.recommender.recommend(doc, 2)
+
+        self.assertEqual(self.recommender.recommendation_cache.hits, 0)
+        self.assertIs(neighbours[0], new_docs[0])
+        self.assertIs(new_docs[0].vector, new_docs[0].tfidfie)
+
+        # the weights are the same as the ones of an index built from all the docs at once.
+        texts = dict(articles, sport=articles['sport'] + [new_text])
+        fresh = self.index_class([doc for topic in sorted(texts) for doc in make_docs(topic, texts[topic])])
+
+        self.assertWeights(self.index.docs, fresh.docs)
+
+    def test_reindex_removed(self):
+        doc = self.all_docs['tech'][2]
+        self.all_docs['tech'].remove(doc)
+        self.index.remove_documents([doc])
+        self.recommender.reindex()
+
+        self.assertEqual(self.recommender.recommend(self.all_docs['tech'][0], 2), [self.all_docs['tech'][1]])
+
+        texts = dict(articles, tech=articles['tech'][:2])
+        fresh = self.index_class([doc for topic in sorted(texts) for doc in make_docs(topic, texts[topic])])
+
+        self.assertWeights(self.index.docs, fresh.docs)
+
+    def assertWeights(self, docs, expected):
+
+        docs, expected = [sorted(doc_list, key=doc_id) for doc_list in (docs, expected)]
+        self.assertEqual([doc_id(doc) for doc in docs], [doc_id(doc) for doc in expected])
+
+        for doc, other in zip(docs, expected):
+            self.assertEqual(sorted(doc.tfidfie), sorted(other.tfidfie))
+
+            for term in doc.tfidfie:
+                self.assertAlmostEqual(doc.tfidfie[term], other.tfidfie[term])
+
+
+class SparseRecommenderTest(RecommenderTest):
+
+    index_class = SparseIndex
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+
+"""
+Problem Definition :
+
+This script tests the request handling of the recommendation server with a stub recommender, without a socket.
+Requires python 3, like the server.
+
+"""
+
+__author__ = 'vivek'
+
+import json
+import unittest
+
+import asyncio
+from server import RecommendationServer, MicroBatcher, HTTPError
+
+
+class StubRecommender(object):
+    """
+    Recommends one stored document for every document, and fails for the documents titled 'bad'.
+    """
+
+    pipeline = None
+
+    def __init__(self):
+        self.docs = {'tech/001.txt': Stored('tech', 'tech/001.txt', 'Stored title\n')}
+
+    def recommend_batch(self, docs, k, return_topics=False):
+
+        if any(doc.title.strip() == 'bad' for doc in docs):
+            raise RuntimeError("bad document")
+
+        return [[self.docs['tech/001.txt']] for doc in docs], ['tech' for doc in docs]
+
+
+class Stored(object):
+
+    def __init__(self, topic, f_path, title):
+        self.topic = topic
+        self.f_path = f_path
+        self.title = title
+
+
+class Reader(object):
+
+    def __init__(self, data):
+        self.lines = data.splitlines(True)
+
+    async def readline(self):
+
+        return self.lines.pop(0) if self.lines else b''
+
+    async def readexactly(self, n):
+
+        return b''.join(self.lines)[:n]
+
+
+def body(text):
+
+    return json.dumps({'text': text, 'k': 1}).encode('utf-8')
+
+
+class ServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = RecommendationServer(StubRecommender(), max_batch_size=8, max_wait=0.05)
+
+    def run_requests(self, bodies):
+
+        async def requests():
+            self.server.batcher.start()
+
+            try:
+                return await asyncio.gather(*[self.server.dispatch('POST', '/recommend', b) for b in bodies],
+                                            return_exceptions=True)
+            finally:
+                await self.server.batcher.stop()
+
+        return asyncio.run(requests())
+
+    def test_bad_item_fails_alone(self):
+        results = self.run_requests([body('good\nsome words here'), body('bad\nsome words here'),
+                                     body('fine\nother words here')])
+
+        self.assertEqual(results[0], (200, {'topic': 'tech', 'recommendations': [{'id': 'tech/001.txt',
+                                                                                  'title': 'Stored title'}]}))
+        self.assertIsInstance(results[1], RuntimeError)
+        self.assertEqual(results[2][0], 200)
+        self.assertEqual(self.server.batcher.batch_count, 1)
+
+    def test_text_without_terms(self):
+        with self.assertRaises(HTTPError) as context:
+            self.server.parse_recommend_request(body('hi'))
+
+        self.assertEqual(context.exception.status, 400)
+
+    def test_content_length(self):
+        for length in (b'-5', b'abc'):
+            reader = Reader(b'POST /recommend HTTP/1.1\r\nContent-Length: ' + length + b'\r\n\r\n')
+
+            with self.assertRaises(HTTPError) as context:
+                asyncio.run(self.server.read_request(reader))
+
+            self.assertEqual(context.exception.status, 400)
+
+
+class MicroBatcherTest(unittest.TestCase):
+
+    def test_batches(self):
+        batcher = MicroBatcher(lambda items: [item * 2 for item in items], max_batch_size=4, max_wait=0.05)
+
+        async def submit():
+            batcher.start()
+
+            try:
+                return await asyncio.gather(*[batcher.submit(i) for i in range(10)])
+            finally:
+                await batcher.stop()
+
+        self.assertEqual(asyncio.run(submit()), [2 * i for i in range(10)])
+        self.assertEqual(batcher.batch_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script tests the persistent token cache: the round trip of the tokenized articles through the cache file, entries
+added to a loaded cache, and the tokenizer configuration the entries are reused for.
+
+"""
+
+__author__ = 'vivek'
+
+import os
+import shutil
+import tempfile
+import unittest
+from token_cache import TokenCache
+
+config = "pattern=\\w+;normalize=none"
+
+articles = [
+    (b'Phones get faster\nThe new chips double the speed.\n',
+     (['phones', 'faster'], ['new', 'chips', 'double', 'speed'])),
+    (b'Team wins\nThe team wins the cup again.\n', (['team', 'wins'], ['team', 'wins', 'cup', 'again'])),
+    (b'\n', ([], []))
+]
+
+
+class TokenCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'tokens.cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def fill(self, entries):
+        cache = TokenCache(self.path, config)
+
+        for raw, (title_tokens, text_tokens) in entries:
+            cache.put(raw, title_tokens, text_tokens)
+
+        cache.save()
+
+    def test_round_trip(self):
+        self.fill(articles)
+        cache = TokenCache(self.path, config)
+
+        for raw, tokens in articles:
+            self.assertEqual(cache.get(raw), tokens)
+
+        self.assertIsNone(cache.get(b'Another article\n'))
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+    def test_add_to_loaded_cache(self):
+        self.fill(articles[:1])
+        self.fill(articles)
+
+        cache = TokenCache(self.path, config)
+
+        self.assertEqual(len(cache.keys), 3)
+
+        for raw, tokens in articles:
+            self.assertEqual(cache.get(raw), tokens)
+
+    def test_new_entries_before_save(self):
+        cache = TokenCache(self.path, config)
+        cache.put(articles[0][0], *articles[0][1])
+
+        self.assertEqual(cache.get(articles[0][0]), articles[0][1])
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_unicode_tokens(self):
+        entries = [(b'Caf\xe9 news\n', ([u'caf\xe9', u'news'], [u'na\xefve']))]
+        self.fill(entries)
+
+        title_tokens, text_tokens = TokenCache(self.path, config).get(entries[0][0])
+
+        if str is bytes:
+            self.assertEqual(title_tokens, [u'caf\xe9'.encode('utf-8'), 'news'])
+        else:
+            self.assertEqual((title_tokens, text_tokens), entries[0][1])
+
+    def test_other_config(self):
+        self.fill(articles)
+        cache = TokenCache(self.path, config + ";stem")
+
+        self.assertEqual(len(cache.keys), 0)
+        self.assertIsNone(cache.get(articles[0][0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
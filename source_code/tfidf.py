@@ -11,15 +11,25 @@ Script to find tfidf and tfidfie from the tf of documents.
 __author__ = 'vivek'
 
 from collections import defaultdict
+from sparse import Vocabulary, CsrMatrix
+from model_io import save_model, load_model, dicts_to_matrix, matrix_to_dicts
+import numpy as np
 import math
-import operator
+
+
+def abs_weight(item):
+    """
+    Sort key of the (term, weight) items. The weights of signed hashed features can be negative.
+    """
+
+    return abs(item[1])
 
 
 class Index(object):
 
     def __init__(self, docs):
 
-        self.docs = docs
+        self.docs = list(docs)
         self.tf = [doc.tf for doc in self.docs]
 
         self.tf_index = self.create_tf_index(self.tf)
@@ -35,6 +45,184 @@ class Index(object):
         self.normal_tfidfie_list = self.normalize_vector_list(self.tfidfie_list)
         self.update_tfidfie(self.docs, self.normal_tfidfie_list)
 
+        self.doc_count = len(self.docs)
+        self.stale = False
+
+        # incremented whenever the weights change, so results cached for older weights are not used.
+        self.version = 0
+
+    def add_documents(self, docs):
+        """
+        Add the docs to the index. The doc frequencies and the information entropy of their terms are updated in place,
+        the weights of the docs are recomputed by refresh().
+        :param docs: list of docs
+        """
+
+        self.check_docs()
+        affected_terms = set()
+
+        for doc in docs:
+            i = len(self.docs)
+            self.docs.append(doc)
+            self.tf.append(doc.tf)
+
+            for term, freq in doc.tf.items():
+                self.tf_index[term].append([i, freq])
+                self.doc_freqs[term] += 1
+                self.topic_doc_freqs[doc.topic][term] += 1
+                affected_terms.add(term)
+
+        self.doc_count += len(docs)
+        self.update_information_entropy(affected_terms)
+        self.stale = True
+
+    def remove_documents(self, docs):
+        """
+        Remove the docs from the index. Their slots are left empty until the next refresh().
+        :param docs: list of docs which were added before
+        """
+
+        self.check_docs()
+        positions = dict((id(self.docs[i]), i) for i in range(len(self.docs)) if self.docs[i] is not None)
+        affected_terms = set()
+
+        for doc in docs:
+            i = positions.pop(id(doc))
+
+            for term in self.tf[i].keys():
+                self.tf_index[term] = [freq for freq in self.tf_index[term] if freq[0] != i]
+                self.doc_freqs[term] -= 1
+                self.topic_doc_freqs[doc.topic][term] -= 1
+                affected_terms.add(term)
+
+                if self.topic_doc_freqs[doc.topic][term] == 0:
+                    del self.topic_doc_freqs[doc.topic][term]
+
+                if self.doc_freqs[term] == 0:
+                    del self.doc_freqs[term]
+                    del self.tf_index[term]
+
+            self.docs[i] = None
+            self.tf[i] = None
+
+        self.doc_count -= len(docs)
+        self.update_information_entropy(affected_terms)
+        self.stale = True
+
+    def check_docs(self):
+
+        if self.docs is None:
+            raise ValueError("The index was loaded without its docs, it can not be updated.")
+
+    def update_information_entropy(self, terms):
+
+        for term in terms:
+            if term in self.doc_freqs:
+                self.information_entropy[term] = self.cal_term_entropy(term, self.doc_freqs, self.topic_doc_freqs)
+            elif term in self.information_entropy:
+                del self.information_entropy[term]
+
+    def refresh(self):
+        """
+        Recompute the tfidf and tfidfie weights from the current statistics and store them into the docs. Any change
+        of the doc count changes the idf of every term, so all the weights are recomputed, but nothing is counted
+        again. Empty slots of removed docs are compacted first.
+        """
+
+        self.check_docs()
+        self.version += 1
+
+        if self.doc_count != len(self.docs):
+            self.docs = [doc for doc in self.docs if doc is not None]
+            self.tf = [doc.tf for doc in self.docs]
+            self.tf_index = self.create_tf_index(self.tf)
+
+        self.tfidf_list = self.create_tfidf_index(self.tf, self.doc_freqs)
+        self.normal_tfidf_list = self.normalize_vector_list(self.tfidf_list)
+        self.update_tfidf(self.docs, self.normal_tfidf_list)
+
+        self.tfidfie_list = self.create_tfidfie_index(self.tfidf_list, self.information_entropy)
+        self.normal_tfidfie_list = self.normalize_vector_list(self.tfidfie_list)
+        self.update_tfidfie(self.docs, self.normal_tfidfie_list)
+
+        self.stale = False
+
+    def save(self, path, fingerprint=None):
+        """
+        Save the statistics and the normalized weights of the docs into a model file. The docs themselves are not
+        saved, load() attaches the weights to the same docs in the same order.
+        :param fingerprint: fingerprint of the docs, see model_io.fingerprint
+        """
+
+        if self.stale:
+            self.refresh()
+
+        topics = sorted(self.topic_doc_freqs.keys())
+        vocab = Vocabulary(self.doc_freqs.keys())
+        tfidf = CsrMatrix.from_rows(self.normal_tfidf_list, vocab, add=False)
+        tfidfie = CsrMatrix.from_rows(self.normal_tfidfie_list, vocab, add=False)
+
+        arrays = {
+            'doc_freqs': np.array([self.doc_freqs[term] for term in vocab.terms], dtype=np.int64),
+            'information_entropy': np.array([self.information_entropy[term] for term in vocab.terms]),
+            'topic_doc_freqs': dicts_to_matrix([self.topic_doc_freqs[topic] for topic in topics], vocab, np.int64),
+            'tfidf.data': tfidf.data, 'tfidf.indices': tfidf.indices, 'tfidf.indptr': tfidf.indptr,
+            'tfidfie.data': tfidfie.data, 'tfidfie.indices': tfidfie.indices, 'tfidfie.indptr': tfidfie.indptr
+        }
+
+        save_model(path, 'Index', arrays, {'doc_count': self.doc_count}, {'topics': topics, 'terms': vocab.terms},
+                   fingerprint)
+
+    @classmethod
+    def load(cls, path, docs=None, fingerprint=None):
+        """
+        Load an index saved by save().
+        :param path: path of the model file
+        :param docs: the indexed docs, in the indexing order. Their tfidf and tfidfie are updated. An index loaded
+        without its docs provides the statistics and weights, but can not be updated.
+        :param fingerprint: fingerprint of the docs, ModelMismatchError is raised if the index was saved for others.
+        :return: Index
+        """
+
+        meta, arrays, strings = load_model(path, 'Index', fingerprint=fingerprint)
+        terms, topics = strings['terms'], strings['topics']
+
+        if docs is not None and len(docs) != meta['doc_count']:
+            raise ValueError("{} indexes {} docs, {} given".format(path, meta['doc_count'], len(docs)))
+
+        index = cls.__new__(cls)
+        index.doc_count = meta['doc_count']
+        index.stale = False
+        index.version = 0
+
+        index.doc_freqs = defaultdict(lambda: 0, zip(terms, arrays['doc_freqs'].tolist()))
+        index.information_entropy = defaultdict(lambda: 0.0, zip(terms, arrays['information_entropy'].tolist()))
+        index.topic_doc_freqs = defaultdict(lambda: defaultdict(lambda: 0))
+        for topic, freqs in zip(topics, matrix_to_dicts(arrays['topic_doc_freqs'], terms)):
+            index.topic_doc_freqs[topic].update(freqs)
+
+        for name in ('tfidf', 'tfidfie'):
+            matrix = CsrMatrix(arrays[name + '.data'], arrays[name + '.indices'], arrays[name + '.indptr'],
+                               (index.doc_count, len(terms)))
+            weights = list()
+
+            for i in range(index.doc_count):
+                indices, data = matrix.row(i)
+                weights.append(dict(zip([terms[j] for j in indices], data.tolist())))
+
+            setattr(index, name + '_list', weights)
+            setattr(index, 'normal_' + name + '_list', weights)
+
+        if docs is None:
+            index.docs, index.tf, index.tf_index = None, None, None
+        else:
+            index.docs = list(docs)
+            index.tf = [doc.tf for doc in index.docs]
+            index.tf_index = index.create_tf_index(index.tf)
+            index.update_tfidf(index.docs, index.normal_tfidf_list)
+            index.update_tfidfie(index.docs, index.normal_tfidfie_list)
+
+        return index
 
     def count_doc_frequencies(self, tf_index):
         """
@@ -110,20 +298,25 @@ class Index(object):
         information_entropy = defaultdict(lambda: 0.0)
 
         for term in doc_freqs.keys():
-            score = 0.0
+            information_entropy[term] = self.cal_term_entropy(term, doc_freqs, topic_doc_freqs)
 
-            for topic in topic_doc_freqs.keys():
+        return information_entropy
 
-                if topic_doc_freqs[topic][term] != 0:
-                    temp = topic_doc_freqs[topic][term]*1.0/doc_freqs[term]
-                    score -= (temp * math.log(temp))
+    def cal_term_entropy(self, term, doc_freqs, topic_doc_freqs):
 
-            if score == 0:
-                score = 1.0
+        score = 0.0
 
-            information_entropy[term] = score
+        for topic in topic_doc_freqs.keys():
+            count = topic_doc_freqs[topic].get(term, 0)
 
-        return information_entropy
+            if count != 0:
+                temp = count*1.0/doc_freqs[term]
+                score -= (temp * math.log(temp))
+
+        if score == 0:
+            score = 1.0
+
+        return score
 
     def normalize_vector_list(self, vector_list):
 
@@ -144,9 +337,252 @@ class Index(object):
     def update_tfidf(self, docs, tfidf_list):
         
         for i in range(len(docs)):
-            docs[i].tfidf = dict(sorted(tfidf_list[i].iteritems(), key=operator.itemgetter(1), reverse=True)[:30])
+            docs[i].tfidf = dict(sorted(tfidf_list[i].items(), key=abs_weight, reverse=True)[:30])
 
     def update_tfidfie(self, docs, tfidfie_list):
         
         for i in range(len(docs)):
-            docs[i].tfidfie = dict(sorted(tfidfie_list[i].iteritems(), key=operator.itemgetter(1), reverse=True)[:30])
+            docs[i].tfidfie = dict(sorted(tfidfie_list[i].items(), key=abs_weight, reverse=True)[:30])
+
+
+class SparseIndex(object):
+    """
+    Array based alternative of Index. The vocabulary is interned into integer ids and tf, tfidf and tfidfie of all the
+    docs are kept as CSR matrices, so every weighting step is a single vectorized pass over the stored values.
+    """
+
+    def __init__(self, docs, vocab=None):
+
+        self.docs = list(docs)
+        self.vocab = vocab if vocab is not None else Vocabulary()
+
+        self.tf = CsrMatrix.from_rows([doc.tf for doc in self.docs], self.vocab)
+
+        self.doc_freqs = self.count_doc_frequencies(self.tf)
+        self.tfidf = self.create_tfidf_index(self.tf, self.doc_freqs)
+        self.normal_tfidf = self.tfidf.normalize_rows()
+        self.update_tfidf(self.docs, self.normal_tfidf)
+
+        self.topic_list = sorted(set(doc.topic for doc in self.docs))
+        self.topic_doc_freqs = self.count_topic_doc_frequencies(self.tf, self.docs, self.topic_list)
+        self.information_entropy = self.cal_information_entropy(self.doc_freqs, self.topic_doc_freqs)
+        self.tfidfie = self.create_tfidfie_index(self.normal_tfidf, self.information_entropy)
+        self.normal_tfidfie = self.tfidfie.normalize_rows()
+        self.update_tfidfie(self.docs, self.normal_tfidfie)
+
+        self.doc_count = len(self.docs)
+        self.stale = False
+        self.version = 0
+
+    def add_documents(self, docs):
+        """
+        Add the docs to the index. The vocabulary grows by their new terms, the tf matrix by their rows and the
+        statistics are updated, the weights of the docs are recomputed by refresh().
+        :param docs: list of docs
+        """
+
+        self.check_docs()
+        docs = list(docs)
+        tf = CsrMatrix.from_rows([doc.tf for doc in docs], self.vocab)
+        vocab_size = len(self.vocab)
+
+        self.docs.extend(docs)
+        self.tf = self.tf.append_rows(tf)
+
+        doc_freqs = np.zeros(vocab_size, dtype=np.int64)
+        doc_freqs[:len(self.doc_freqs)] = self.doc_freqs
+        self.doc_freqs = doc_freqs + self.count_doc_frequencies(tf)
+
+        topic_list = sorted(set(self.topic_list) | set(doc.topic for doc in docs))
+        topic_doc_freqs = np.zeros((len(topic_list), vocab_size), dtype=np.int64)
+        topic_doc_freqs[[topic_list.index(topic) for topic in self.topic_list], :self.topic_doc_freqs.shape[1]] = \
+            self.topic_doc_freqs
+        self.topic_list = topic_list
+        self.topic_doc_freqs = topic_doc_freqs + self.count_topic_doc_frequencies(tf, docs, topic_list)
+
+        self.information_entropy = self.cal_information_entropy(self.doc_freqs, self.topic_doc_freqs)
+        self.doc_count += len(docs)
+        self.stale = True
+
+    def remove_documents(self, docs):
+        """
+        Remove the docs from the index. Their rows are left in the tf matrix until the next refresh().
+        :param docs: list of docs which were added before
+        """
+
+        self.check_docs()
+        positions = dict((id(self.docs[i]), i) for i in range(len(self.docs)) if self.docs[i] is not None)
+        rows = np.array(sorted(positions.pop(id(doc)) for doc in docs), dtype=np.int64)
+        tf = self.tf.take_rows(rows)
+
+        self.doc_freqs = self.doc_freqs - self.count_doc_frequencies(tf)
+        self.topic_doc_freqs = self.topic_doc_freqs - self.count_topic_doc_frequencies(
+            tf, [self.docs[i] for i in rows], self.topic_list)
+        self.information_entropy = self.cal_information_entropy(self.doc_freqs, self.topic_doc_freqs)
+
+        for i in rows:
+            self.docs[i] = None
+
+        self.doc_count -= len(rows)
+        self.stale = True
+
+    def check_docs(self):
+
+        if self.docs is None:
+            raise ValueError("The index was loaded without its docs, it can not be updated.")
+
+    def refresh(self):
+        """
+        Recompute the tfidf and tfidfie weights from the current statistics and store them into the docs. The rows of
+        removed docs are dropped from the tf matrix first.
+        """
+
+        self.check_docs()
+        self.version += 1
+
+        if self.doc_count != len(self.docs):
+            rows = np.array([i for i in range(len(self.docs)) if self.docs[i] is not None], dtype=np.int64)
+            self.tf = self.tf.take_rows(rows)
+            self.docs = [self.docs[i] for i in rows]
+
+        self.tfidf = self.create_tfidf_index(self.tf, self.doc_freqs)
+        self.normal_tfidf = self.tfidf.normalize_rows()
+        self.update_tfidf(self.docs, self.normal_tfidf)
+
+        self.tfidfie = self.create_tfidfie_index(self.normal_tfidf, self.information_entropy)
+        self.normal_tfidfie = self.tfidfie.normalize_rows()
+        self.update_tfidfie(self.docs, self.normal_tfidfie)
+
+        self.stale = False
+
+    def save(self, path, fingerprint=None):
+        """
+        Save the vocabulary, the statistics and the tf and normalized weight matrices into a model file.
+        """
+
+        if self.stale:
+            self.refresh()
+
+        arrays = {
+            'doc_freqs': self.doc_freqs,
+            'information_entropy': self.information_entropy,
+            'topic_doc_freqs': self.topic_doc_freqs,
+            'indices': self.tf.indices,
+            'indptr': self.tf.indptr,
+            'tf': self.tf.data,
+            'tfidf': self.normal_tfidf.data,
+            'tfidfie': self.normal_tfidfie.data
+        }
+
+        save_model(path, 'SparseIndex', arrays, None, {'topics': self.topic_list, 'terms': self.vocab.terms},
+                   fingerprint)
+
+    @classmethod
+    def load(cls, path, docs=None, fingerprint=None):
+        """
+        Load an index saved by save(). The matrices are memory-mapped from the file.
+        :param path: path of the model file
+        :param docs: the indexed docs, in the indexing order. Their tfidf and tfidfie are updated. An index loaded
+        without its docs provides the statistics and weights, but can not be updated.
+        :param fingerprint: fingerprint of the docs, ModelMismatchError is raised if the index was saved for others.
+        :return: SparseIndex
+        """
+
+        meta, arrays, strings = load_model(path, 'SparseIndex', fingerprint=fingerprint)
+
+        if docs is not None and len(docs) != len(arrays['indptr']) - 1:
+            raise ValueError("{} indexes {} docs, {} given".format(path, len(arrays['indptr']) - 1, len(docs)))
+
+        index = cls.__new__(cls)
+        index.docs = list(docs) if docs is not None else None
+        index.doc_count = len(arrays['indptr']) - 1
+        index.stale = False
+        index.version = 0
+        index.vocab = Vocabulary(strings['terms'])
+        index.topic_list = strings['topics']
+        index.doc_freqs = arrays['doc_freqs']
+        index.information_entropy = arrays['information_entropy']
+        index.topic_doc_freqs = arrays['topic_doc_freqs']
+
+        shape = (len(arrays['indptr']) - 1, len(index.vocab))
+        index.tf = CsrMatrix(arrays['tf'], arrays['indices'], arrays['indptr'], shape)
+        index.tfidf = index.normal_tfidf = index.tf.with_data(arrays['tfidf'])
+        index.tfidfie = index.normal_tfidfie = index.tf.with_data(arrays['tfidfie'])
+
+        if docs is not None:
+            index.update_tfidf(index.docs, index.normal_tfidf)
+            index.update_tfidfie(index.docs, index.normal_tfidfie)
+
+        return index
+
+    def count_doc_frequencies(self, tf):
+        """
+        :param tf: tf matrix
+        :return: array with the number of documents that contain each term.
+        """
+
+        return np.bincount(tf.indices, minlength=len(self.vocab))
+
+    def count_topic_doc_frequencies(self, tf, docs, topic_list):
+        """
+        :return: array of shape (topics, terms) with the number of documents of each topic that contain each term.
+        """
+
+        vocab_size = len(self.vocab)
+        topic_ids = np.array([topic_list.index(doc.topic) for doc in docs], dtype=np.int64)
+        cells = topic_ids[tf.row_ids()] * vocab_size + tf.indices
+
+        return np.bincount(cells, minlength=len(topic_list) * vocab_size).reshape(len(topic_list), vocab_size)
+
+    def create_tfidf_index(self, tf, doc_freqs):
+
+        doc_count = tf.shape[0]
+
+        idf = np.zeros(len(doc_freqs))
+        present = doc_freqs > 0
+        idf[present] = np.log(doc_count * 1.0 / doc_freqs[present])
+
+        return tf.with_data(tf.data * idf[tf.indices])
+
+    def create_tfidfie_index(self, tfidf, information_entropy):
+
+        return tfidf.with_data(tfidf.data / information_entropy[tfidf.indices])
+
+    def cal_information_entropy(self, doc_freqs, topic_doc_freqs):
+
+        present = topic_doc_freqs > 0
+        prob = np.zeros(topic_doc_freqs.shape)
+        prob[present] = (topic_doc_freqs * 1.0 / np.maximum(doc_freqs, 1))[present]
+
+        plogp = np.zeros(topic_doc_freqs.shape)
+        plogp[present] = prob[present] * np.log(prob[present])
+
+        information_entropy = -plogp.sum(axis=0)
+        information_entropy[information_entropy == 0] = 1.0
+
+        return information_entropy
+
+    def top_terms(self, matrix, i, n=30):
+        """
+        :return: dict of the n highest weighted terms of the row i, by absolute weight.
+        """
+
+        indices, data = matrix.row(i)
+
+        if len(data) > n:
+            top = np.argpartition(-np.abs(data), n - 1)[:n]
+            indices, data = indices[top], data[top]
+
+        terms = self.vocab.terms
+
+        return dict((terms[j], float(w)) for j, w in zip(indices, data))
+
+    def update_tfidf(self, docs, tfidf):
+
+        for i in range(len(docs)):
+            docs[i].tfidf = self.top_terms(tfidf, i)
+
+    def update_tfidfie(self, docs, tfidfie):
+
+        for i in range(len(docs)):
+            docs[i].tfidfie = self.top_terms(tfidfie, i)
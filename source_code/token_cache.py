@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+
+
+"""
+Problem Definition :
+
+This script implements a persistent cache of the tokenized articles. Entries are keyed by the hash of the article
+content and the tokenizer configuration, so an article is tokenized again only when it or the tokenizer changes.
+The cache is a single array file, the token streams are memory-mapped on load.
+
+"""
+
+__author__ = 'vivek'
+
+import os
+import hashlib
+import numpy as np
+from arrayfile import read_arrays, write_arrays, pack_strings, unpack_strings
+
+CACHE_VERSION = 1
+
+
+class TokenCache(object):
+
+    def __init__(self, path, config):
+        """
+        :param path: path of the cache file
+        :param config: string which describes the tokenizer configuration
+        """
+
+        self.path = path
+        self.config = config
+        self.config_digest = hashlib.sha1(config.encode('utf-8')).digest()
+
+        # stores (key, entry number)
+        self.entry_ids = dict()
+        self.keys = list()
+        # stored token id streams, and (start, end) of title and text tokens of each entry
+        self.token_ids = np.zeros(0, dtype=np.uint32)
+        self.title_ptr = np.zeros((0, 2), dtype=np.int64)
+        self.text_ptr = np.zeros((0, 2), dtype=np.int64)
+        self.terms = list()
+        self.term_ids = dict()
+
+        # entries added in this run, stored as (title tokens, text tokens)
+        self.new_entries = list()
+
+        self.hits = 0
+        self.misses = 0
+
+        if os.path.exists(path):
+            self.load()
+
+    def load(self):
+
+        meta, arrays = read_arrays(self.path)
+
+        # entries of another cache version or tokenizer configuration can not be reused.
+        if meta.get('version') != CACHE_VERSION or meta.get('config') != self.config:
+            return
+
+        self.keys = [k.tobytes() for k in arrays['keys']]
+        self.entry_ids = dict((self.keys[i], i) for i in range(len(self.keys)))
+        self.token_ids = arrays['token_ids']
+        self.title_ptr = arrays['title_ptr']
+        self.text_ptr = arrays['text_ptr']
+        self.terms = unpack_strings(arrays['term_offsets'], arrays['term_blob'])
+        self.term_ids = dict((self.terms[i], i) for i in range(len(self.terms)))
+
+    def key(self, raw):
+        """
+        :param raw: content of the article, as bytes
+        :return: cache key of the article
+        """
+
+        return hashlib.sha1(self.config_digest + raw).digest()
+
+    def get(self, raw):
+        """
+        :param raw: content of the article, as bytes
+        :return: title tokens and text tokens, or None if the article is not cached.
+        """
+
+        entry = self.entry_ids.get(self.key(raw))
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+
+        return self.entry_tokens(entry)
+
+    def entry_tokens(self, entry):
+
+        stored = len(self.title_ptr)
+
+        if entry >= stored:
+            return self.new_entries[entry - stored]
+
+        terms = self.terms
+        title_start, title_end = self.title_ptr[entry]
+        text_start, text_end = self.text_ptr[entry]
+        title_ids = self.token_ids[title_start:title_end]
+        text_ids = self.token_ids[text_start:text_end]
+
+        return [terms[i] for i in title_ids.tolist()], [terms[i] for i in text_ids.tolist()]
+
+    def put(self, raw, title_tokens, text_tokens):
+
+        key = self.key(raw)
+
+        if key in self.entry_ids:
+            return
+
+        self.entry_ids[key] = len(self.keys)
+        self.keys.append(key)
+        self.new_entries.append((list(title_tokens), list(text_tokens)))
+
+    def save(self):
+        """
+        Write the cache file, if any entry was added.
+        """
+
+        if not self.new_entries:
+            return
+
+        terms = list(self.terms)
+        term_ids = dict(self.term_ids)
+        streams = [self.token_ids]
+        title_ptr = [self.title_ptr]
+        text_ptr = [self.text_ptr]
+        length = len(self.token_ids)
+
+        for title_tokens, text_tokens in self.new_entries:
+            ptr = list()
+
+            for tokens in (title_tokens, text_tokens):
+                ids = list()
+
+                for token in tokens:
+                    term_id = term_ids.get(token)
+                    if term_id is None:
+                        term_id = term_ids[token] = len(terms)
+                        terms.append(token)
+                    ids.append(term_id)
+
+                streams.append(np.array(ids, dtype=np.uint32))
+                ptr.append(np.array([[length, length + len(ids)]], dtype=np.int64))
+                length += len(ids)
+
+            title_ptr.append(ptr[0])
+            text_ptr.append(ptr[1])
+
+        term_offsets, term_blob = pack_strings(terms)
+
+        arrays = {
+            'keys': np.frombuffer(b''.join(self.keys), dtype=np.uint8).reshape(len(self.keys), 20),
+            'token_ids': np.concatenate(streams),
+            'title_ptr': np.concatenate(title_ptr),
+            'text_ptr': np.concatenate(text_ptr),
+            'term_offsets': term_offsets,
+            'term_blob': term_blob
+        }
+
+        write_arrays(self.path, arrays, {'version': CACHE_VERSION, 'config': self.config})
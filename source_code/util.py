@@ -184,3 +184,24 @@ def get_stats_table(stats):
         stats_table.append([key, str(value)])
 
     return stats_table
+
+
+def batched(iterable, batch_size):
+    """
+    Split the iterable into lists of batch_size items, the last one may be shorter.
+    :param iterable: any iterable, e.g. a generator of documents
+    :param batch_size: number of items per batch
+    :return: generator of lists
+    """
+
+    batch = list()
+
+    for item in iterable:
+        batch.append(item)
+
+        if len(batch) == batch_size:
+            yield batch
+            batch = list()
+
+    if batch:
+        yield batch